@@ -1,19 +1,40 @@
 import streamlit as st
 import os
 import sqlite3
-from collections import Counter
-import re, glob, docx
-from pdfminer.high_level import extract_text
 
-import spacy
-# Load French model once
-nlp = spacy.load("fr_core_news_sm")
+import stats
+import extraction_cache
+import paths
+import content_store
+import tombstones
+import metrics
+import profiling
+import reindex_jobs
+import token_filters
+import near_duplicates
+import time
 
 DB_PATH = "search_engine.db"
-UPLOAD_DIR = "documents"
+UPLOAD_DIR = paths.DOCUMENTS_DIR
 STOPWORDS_FILE = "stopwords.txt"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+
+@st.cache_resource(show_spinner=False)
+def prepare_database(db_path):
+    """Once per admin process, not on every Streamlit rerun."""
+    # Texts of databases indexed before the compressed store (see content_store.py)
+    content_store.migrate_documents_column(db_path)
+    # Unfiltered lemma counts, stopwords applied on top (see token_filters.py)
+    conn = sqlite3.connect(db_path)
+    token_filters.init_tables(conn)
+    near_duplicates.init_tables(conn)
+    conn.close()
+    return True
+
+
+prepare_database(DB_PATH)
+
 st.set_page_config(page_title="🔍 DocuFind — Admin Panel", layout="wide")
 
 # ---- Header with logo and app name ----
@@ -32,91 +53,10 @@ action = st.sidebar.radio(
     ["📤 Ajouter un document", "📊 Voir les statistiques", "🧹 Ré-indexer", "✏️ Gérer les stopwords"]
 )
 
-# ---- Function: normalize words
-
-# Load stopwords ONCE
-STOPWORDS = set()
-if os.path.exists(STOPWORDS_FILE):
-    with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
-        STOPWORDS = {w.strip().lower() for w in f.read().splitlines()}
-else:
-    STOPWORDS = {"le","la","les","un","une","et","de","du","des","à","au","aux"}
-
-def normalisation(text: str):
-    """
-    Full normalization for French:
-    - lowercase
-    - extract alphabetic tokens
-    - lemmatization (infinitive form)
-    - remove stopwords & short words
-    """
-    text = text.lower()
-
-    # Extract only alphabetic words
-    tokens = re.findall(r"[a-zA-ZÀ-ÿ'-]+", text)
-
-    if not tokens:
-        return []
-
-    # Process with spaCy for lemmatization
-    doc = nlp(" ".join(tokens))
-
-    normalized = []
-    for token in doc:
-        lemma = token.lemma_.lower().strip()
-
-        if (
-            lemma
-            and lemma.isalpha()
-            and len(lemma) > 2
-            and lemma not in STOPWORDS
-        ):
-            normalized.append(lemma)
-
-    return normalized
-
-# -------------------------- FILE READERS --------------------------
-def lire_pdf(filepath):
-    try:
-        return extract_text(filepath)
-    except Exception:
-        return ""
-
-
-def lire_docx(filepath):
-    try:
-        doc = docx.Document(filepath)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception:
-        return ""
-
-# ---- Function: read DOCX and PDF
-def lire_docx(filepath):
-    try:
-        doc = docx.Document(filepath)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except:
-        return ""
-
-def lire_pdf(filepath):
-    try:
-        return extract_text(filepath)
-    except:
-        return ""
-
-def lire_html(filepath):
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
-
-        # Remove HTML tags
-        text = re.sub(r"<[^>]+>", " ", text)
-
-        return text
-    except:
-        return ""
-
-
+# ---- Profiling of the reindex job (collapsed stacks, see profiling.py)
+profile_reindex = st.sidebar.checkbox(
+    "🔬 Profiler la prochaine ré-indexation", value=profiling.PROFILING_ENABLED
+)
 
 # =======================================================================================
 #  1. Upload new documents
@@ -194,11 +134,10 @@ elif action == "📊 Voir les statistiques":
 
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    stats.ensure_stats(conn)
 
-    # ---- 1️ Global overview
-    total_docs = cursor.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
-    total_words = cursor.execute("SELECT COUNT(*) FROM word_frequencies").fetchone()[0]
-    unique_words = cursor.execute("SELECT COUNT(DISTINCT word) FROM word_frequencies").fetchone()[0]
+    # ---- 1️ Global overview (read from the summary tables, see stats.py)
+    total_docs, total_words, unique_words = stats.corpus_overview(cursor)
 
     st.markdown("### 🌍 Vue d'ensemble")
 
@@ -220,14 +159,7 @@ elif action == "📊 Voir les statistiques":
 
     # ---- 2️ Top documents by word count
 # ---- 2️ Top documents by word count (WITH DELETE BUTTON)
-    cursor.execute("""
-        SELECT d.id, d.filename, COUNT(w.word) AS total_mots, COUNT(DISTINCT w.word) AS mots_uniques
-        FROM documents d
-        LEFT JOIN word_frequencies w ON d.id = w.document_id
-        GROUP BY d.id
-        ORDER BY total_mots DESC
-    """)
-    doc_stats = cursor.fetchall()
+    doc_stats = stats.document_overview(cursor)
 
     st.markdown("### 🏆 Top documents par nombre de mots")
 
@@ -262,9 +194,15 @@ elif action == "📊 Voir les statistiques":
                     if st.button("🗑️", key=f"delete_{row['ID']}"):
                         doc_id = row["ID"]
 
-                        # Delete DB entries
+                        # Delete DB entries (statistics first: they need the word rows)
+                        stats.forget_document(cursor, doc_id)
+                        token_filters.forget_document(cursor, doc_id)
+                        near_duplicates.forget(cursor, row["Document"])
                         cursor.execute("DELETE FROM word_frequencies WHERE document_id = ?", (doc_id,))
                         cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                        content_store.ContentStore(conn).pop(row["Document"], None)
+                        # The API drops it from /search on its next request
+                        tombstones.record(cursor, row["Document"])
                         conn.commit()
 
                         # Delete file
@@ -283,19 +221,17 @@ elif action == "📊 Voir les statistiques":
     # ---- 3️ Per-document breakdown
     if total_docs > 0:
         st.markdown("### 🔍 Analyse d’un document spécifique")
-        cursor.execute("SELECT filename, id FROM documents ORDER BY filename")
-        docs = cursor.fetchall()
+        docs = sorted((filename, doc_id) for doc_id, filename, _, _ in doc_stats)
         doc_names = [d[0] for d in docs]
         selected_doc = st.selectbox("Choisissez un document :", doc_names)
 
         if selected_doc:
             doc_id = [d[1] for d in docs if d[0] == selected_doc][0]
             cursor.execute("""
-                SELECT word, SUM(count) as freq
+                SELECT word, count
                 FROM word_frequencies
                 WHERE document_id = ?
-                GROUP BY word
-                ORDER BY freq DESC
+                ORDER BY count DESC
                 LIMIT 10
             """, (doc_id,))
             top_words = cursor.fetchall()
@@ -307,8 +243,59 @@ elif action == "📊 Voir les statistiques":
             else:
                 st.info("Aucun mot indexé pour ce document (filtré par les stopwords).")
 
+    st.markdown("---")
+
+    # ---- 4️ Rebuild the summary tables from scratch (full scan)
+    if st.button("🔁 Recalculer les statistiques"):
+        with st.spinner("Recalcul des statistiques…"):
+            stats.rebuild_stats(conn)
+        st.success("✅ Statistiques recalculées.")
+        st.rerun()
+
     conn.close()
 
+    st.markdown("---")
+
+    # ---- 5️ Extracted-text cache shared with the API (see extraction_cache.py)
+    st.markdown("### 🗃️ Cache d'extraction de texte")
+    cache_stats = extraction_cache.get_cache().stats()
+    if cache_stats:
+        st.dataframe([
+            {
+                "Extracteur": extractor,
+                "Hits": hits,
+                "Misses": misses,
+                "Taux de hit": f"{hits / max(hits + misses, 1):.0%}",
+                "Textes en cache": cached,
+            }
+            for extractor, hits, misses, cached in cache_stats
+        ], use_container_width=True)
+        st.caption(f"Taille du cache : {extraction_cache.get_cache().size_bytes() / 1e6:.1f} Mo (compressé)")
+    else:
+        st.info("Aucun PDF / DOCX / HTML extrait pour le moment.")
+
+    st.markdown("---")
+
+    # ---- 6️ Near-duplicates found by the last reindex (MinHash / LSH, see near_duplicates.py)
+    st.markdown("### 👯 Quasi-doublons")
+    conn = sqlite3.connect(DB_PATH)
+    duplicate_groups = near_duplicates.load_groups(conn)
+    conn.close()
+    if duplicate_groups:
+        st.caption(
+            f"{len(duplicate_groups)} groupes · "
+            f"{sum(len(members) - 1 for _, members in duplicate_groups)} documents redondants "
+            f"(similarité estimée ≥ {near_duplicates.THRESHOLD:.0%})"
+        )
+        for group_id, members in duplicate_groups:
+            with st.expander(f"📑 {group_id} ({len(members)} versions)"):
+                st.dataframe([
+                    {"Document": filename, "Similarité": f"{similarity:.0%}"}
+                    for filename, similarity in members
+                ], use_container_width=True)
+    else:
+        st.info("Aucun quasi-doublon détecté à la dernière ré-indexation.")
+
 
 # =======================================================================================
 # 🧹 3. Reindex documents
@@ -317,95 +304,86 @@ elif action == "📊 Voir les statistiques":
 elif action == "🧹 Ré-indexer":
     st.subheader("🔄 Ré-indexation complète")
 
-    # ---- 1️ Load stopwords
-    if os.path.exists(STOPWORDS_FILE):
-        with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
-            stopwords = set(word.strip().lower() for word in f.read().splitlines() if word.strip())
-    else:
-        stopwords = set()
-        st.warning("⚠️ Aucun fichier de stopwords trouvé. Tous les mots seront indexés.")
-
-
-    # ---- 2️ List all files
-    files = os.listdir(UPLOAD_DIR)
-    if not files:
+    # The job runs in a background worker (see reindex_jobs.py): this page
+    # only starts / resumes / cancels it and polls its row.
+    if not os.path.exists(STOPWORDS_FILE):
+        st.warning("⚠️ Aucun fichier de stopwords trouvé. Les stopwords par défaut seront utilisés.")
+    if not os.listdir(UPLOAD_DIR):
         st.warning("Aucun fichier trouvé dans le dossier 'documents'.")
         st.stop()
 
-    total_files = len(files)
-
-    # ---- Progress UI
-    progress_bar = st.progress(0)
-    spinner = st.spinner("📚 Indexation en cours, veuillez patienter…")
-    status_text = st.empty()
-
-    with spinner:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # ---- Reset database
-        cursor.execute("DELETE FROM documents")
-        cursor.execute("DELETE FROM word_frequencies")
-
-        # ---- 3️ Iterate through files
-        for i, file in enumerate(files, start=1):
-            path = os.path.join(UPLOAD_DIR, file)
-            ext = os.path.splitext(file)[1].lower()
-            content = ""
-
-            # ---- Read file content depending on type
-            if ext == ".txt":
-                with open(path, "r", encoding="utf-8") as f:
-                    content = f.read()
-
-            elif ext == ".docx":
-                content = lire_docx(path)
-
-            elif ext == ".pdf":
-                content = lire_pdf(path)
+    conn = sqlite3.connect(DB_PATH)
+    job = reindex_jobs.latest_job(conn)
+    active = job is not None and job["status"] in reindex_jobs.ACTIVE
 
-            elif ext in [".html", ".htm"]:
-                content = lire_html(path)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("▶️ Lancer une ré-indexation", disabled=active):
+            reindex_jobs.start_job(DB_PATH, profile_mode="sample" if profile_reindex else None)
+            st.rerun()
+    with col2:
+        if st.button("⏯️ Reprendre", disabled=not job or job["status"] not in ("interrupted", "failed")):
+            reindex_jobs.resume_job(job["id"], DB_PATH)
+            st.rerun()
+    with col3:
+        if st.button("⏹️ Annuler", disabled=not active):
+            reindex_jobs.cancel_job(job["id"], DB_PATH)
+            st.rerun()
 
-            else:
-                status_text.write(f"⚠️ Format non supporté : {file}")
-                continue
+    if job is None:
+        st.info("Aucune ré-indexation lancée pour le moment. L'index actuel reste utilisé pendant toute la ré-indexation.")
+        conn.close()
+        st.stop()
 
-            # ---- Insert document into DB
-            cursor.execute(
-                "INSERT INTO documents (filename, filetype, content) VALUES (?, ?, ?)",
-                (file, ext, content)
+    # ---- Progress of the latest job
+    fraction, rate, eta = reindex_jobs.progress(job)
+    labels = {
+        "queued": "⏳ En attente du worker",
+        "running": "📚 Indexation en cours",
+        "cancelling": "⏹️ Annulation après le fichier en cours",
+        "completed": "✅ Ré-indexation terminée avec succès !",
+        "failed": "❌ Échec de la ré-indexation",
+        "cancelled": "⏹️ Ré-indexation annulée (index précédent conservé)",
+        "interrupted": "⚠️ Ré-indexation interrompue — elle peut être reprise",
+    }
+    st.markdown(f"**Tâche #{job['id']}** — {labels.get(job['status'], job['status'])}")
+    st.progress(min(fraction, 1.0))
+    caption = (
+        f"📄 {job['done_files']} / {job['total_files']} fichiers"
+        f" · ❌ {job['failed_files']} erreurs"
+        f" · ⚡ {rate:.1f} fichiers/s"
+    )
+    if eta is not None:
+        caption += f" · ⏱️ reste ~{eta:.0f} s"
+    st.caption(caption)
+    if job["error"]:
+        st.error(job["error"])
+
+    errors = reindex_jobs.job_errors(conn, job["id"])
+    if errors:
+        with st.expander(f"Fichiers en erreur ({job['failed_files']})"):
+            st.dataframe([{"Fichier": f, "Erreur": e} for f, e in errors], use_container_width=True)
+
+    if job["status"] == "completed":
+        run = metrics.last_indexing_run(conn)
+        if run:
+            st.caption(
+                f"⏱️ {run['documents']} documents en {run['seconds']:.1f} s "
+                f"({run['documents'] / max(run['seconds'], 1e-9):.1f} docs/s) — "
+                f"acquisition : {run['acquisition']:.1f} s · normalisation : {run['normalisation']:.1f} s"
+                f" · db_write : {run['db_write']:.1f} s"
             )
-            doc_id = cursor.lastrowid
-
-            # ---- Normalize & index words
-            words = Counter(normalisation(content))
-            inserted = 0
-
-            for w, c in words.items():
-                w = w.lower().strip()
-                if w and w not in stopwords and len(w) > 2:
-                    cursor.execute("""
-                        INSERT INTO word_frequencies (document_id, word, count)
-                        VALUES (?, ?, ?)
-                        ON CONFLICT(document_id, word)
-                        DO UPDATE SET count = excluded.count;
-                    """, (doc_id, w, c))
-                    inserted += 1
-
-            # ---- Update progress UI
-            progress = i / total_files
-            progress_bar.progress(progress)
-
-            if inserted == 0:
-                status_text.write(f"ℹ️ Aucun mot utile trouvé dans : **{file}**")
-            else:
-                status_text.write(f"📄 Indexé : **{file}** ({inserted} mots utiles)")
-
-        conn.commit()
-        conn.close()
+        if job["profile_path"] and os.path.exists(job["profile_path"]):
+            st.info(f"🔬 Profil enregistré : `{job['profile_path']}` (format flamegraph « collapsed »)")
+            with open(job["profile_path"], "rb") as f:
+                st.download_button("⬇️ Télécharger le profil", f.read(),
+                                   file_name=os.path.basename(job["profile_path"]))
+    conn.close()
 
-    st.success("✅ Ré-indexation terminée avec succès !")
+    # ---- Poll while the worker runs
+    if active:
+        time.sleep(1)
+        st.rerun()
 
 
 # =======================================================================================
@@ -421,6 +399,18 @@ elif action == "✏️ Gérer les stopwords":
     with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
         stopwords = f.read().splitlines()
 
+    def sync_stopwords():
+        # No reindex: only the rows of the words added / removed are rewritten,
+        # and the API applies the new list on its next query
+        start = time.perf_counter()
+        conn = sqlite3.connect(DB_PATH)
+        removed, added = token_filters.sync_database(conn)
+        conn.close()
+        st.caption(
+            f"⚡ Index mis à jour en {time.perf_counter() - start:.2f} s "
+            f"({len(removed)} mots retirés · {len(added)} mots rétablis)"
+        )
+
     st.markdown("### 🔍 Liste actuelle des stopwords")
     st.write(", ".join(stopwords))
 
@@ -433,6 +423,7 @@ elif action == "✏️ Gérer les stopwords":
             with open(STOPWORDS_FILE, "w", encoding="utf-8") as f:
                 f.write("\n".join(stopwords))
             st.success(f"✅ '{new_word}' ajouté à la liste.")
+            sync_stopwords()
         else:
             st.warning(" Mot déjà présent ou vide.")
 
@@ -445,6 +436,7 @@ elif action == "✏️ Gérer les stopwords":
             with open(STOPWORDS_FILE, "w", encoding="utf-8") as f:
                 f.write("\n".join(stopwords))
             st.success(f"🗑️ '{remove_word}' supprimé de la liste.")
+            sync_stopwords()
         else:
             st.warning(" Sélectionnez un mot valide.")
 
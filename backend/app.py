@@ -2,7 +2,6 @@ import streamlit as st
 from collections import Counter, defaultdict
 import os, re, glob, base64, sqlite3
 from wordcloud import WordCloud
-from pdfminer.high_level import extract_text
 import docx
 
 import io
@@ -13,11 +12,17 @@ import streamlit as st
 import os, base64, docx
 import textwrap
 
+import stats
+import extraction_cache
+import paths
+import content_store
+import token_filters
+
 # ------------------- Viewer mode: open clean document window ----------------------------------
 params = st.query_params
 if "view" in params:
     selected_doc = params["view"]
-    file_path = os.path.join("documents", selected_doc)
+    file_path = os.path.join(paths.DOCUMENTS_DIR, selected_doc)
 
     # Minimal clean page
     st.set_page_config(page_title=selected_doc, layout="centered")
@@ -50,8 +55,7 @@ if "view" in params:
             )
 
         elif selected_doc.endswith(".docx"):
-            document = docx.Document(file_path)
-            text = "\n".join([p.text for p in document.paragraphs])
+            text = extraction_cache.extract(file_path)
             st.markdown(
                 f"""
                 <div style="
@@ -120,20 +124,12 @@ def normalisation(text):
     return tokens
 
 # --------------------------------  Lecture PDF / DOCX --------------------------------
+# Parsed once per file version, shared with the API and the admin (see extraction_cache.py)
 def lire_pdf(filepath):
-    try:
-        return extract_text(filepath)
-    except Exception as e:
-        print(f"Erreur lecture PDF {filepath}: {e}")
-        return ""
+    return extraction_cache.extract(filepath)
 
 def lire_docx(filepath):
-    try:
-        doc = docx.Document(filepath)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception as e:
-        print(f"Erreur lecture DOCX {filepath}: {e}")
-        return ""
+    return extraction_cache.extract(filepath)
 
 # --------------------------------  Database --------------------------------
 DB_PATH = "search_engine.db"
@@ -163,8 +159,15 @@ def init_db():
     """)
 
     conn.commit()
+
+    # Summary tables read by the admin dashboard
+    stats.ensure_stats(conn)
+    token_filters.init_tables(conn)
     conn.close()
 
+    # Texts of databases created before the compressed store
+    content_store.migrate_documents_column(DB_PATH)
+
 # Save all extracted data (documents + words)
 def save_to_db(corpus, freqs):
     conn = sqlite3.connect(DB_PATH)
@@ -176,23 +179,23 @@ def save_to_db(corpus, freqs):
         # Insert the document if it doesn't exist
         cursor.execute("""
             INSERT OR IGNORE INTO documents (filename, filetype, content)
-            VALUES (?, ?, ?)
-        """, (doc, ext, content))
+            VALUES (?, ?, NULL)
+        """, (doc, ext))
 
         # Get its ID
         cursor.execute("SELECT id FROM documents WHERE filename=?", (doc,))
         doc_id = cursor.fetchone()[0]
 
         # Remove previous word frequencies for this document
+        stats.forget_document(cursor, doc_id)
+        token_filters.forget_document(cursor, doc_id)
         cursor.execute("DELETE FROM word_frequencies WHERE document_id=?", (doc_id,))
 
-        # Insert new word frequencies
-        for word, count in freqs[doc].items():
-            cursor.execute("""
-                INSERT INTO word_frequencies (document_id, word, count)
-                VALUES (?, ?, ?)
-            """, (doc_id, word, count))
+        # Insert new word frequencies (stopwords applied on top, see token_filters.py)
+        token_filters.write_document(cursor, doc_id, doc, dict(freqs[doc]), token_filters.current())
 
+    # Texts are stored compressed (see content_store.py)
+    content_store.ContentStore(conn).update(corpus)
     conn.commit()
     conn.close()
 
@@ -201,8 +204,8 @@ def load_from_db():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    cursor.execute("SELECT filename, content FROM documents")
-    corpus = {row[0]: row[1] for row in cursor.fetchall()}
+    # Texts are decompressed on access only
+    corpus = content_store.ContentStore(DB_PATH)
 
     cursor.execute("""
         SELECT d.filename, wf.word, wf.count
@@ -218,7 +221,7 @@ def load_from_db():
     return corpus, freqs
 
 # --------------------------------  Acquisition --------------------------------
-def acquisition(path="documents"):
+def acquisition(path=paths.DOCUMENTS_DIR):
     docs = {}
     for filepath in glob.glob(os.path.join(path, "*")):
         filename = os.path.basename(filepath)
@@ -370,7 +373,7 @@ if query or search_clicked:
 
         # ---- Loop over search results ----
         for doc in sorted(resultats):
-            file_path = os.path.join("documents", doc)
+            file_path = os.path.join(paths.DOCUMENTS_DIR, doc)
 
             # ---- Create word cloud hover preview ----
             img_b64 = wordcloud_to_base64(freqs[doc]) if freqs.get(doc) else None
@@ -387,12 +390,9 @@ if query or search_clicked:
                         with open(file_path, "r", encoding="utf-8") as f:
                             text = f.read()
                     elif doc.endswith(".docx"):
-                        import docx
-                        document = docx.Document(file_path)
-                        text = " ".join([p.text for p in document.paragraphs])
+                        text = lire_docx(file_path)
                     elif doc.endswith(".pdf"):
-                        from pdfminer.high_level import extract_text
-                        text = extract_text(file_path)
+                        text = lire_pdf(file_path)
                     else:
                         text = ""
 
@@ -429,7 +429,7 @@ else:
 # ------------------- Display selected document -------------------
 if "selected_doc" in st.session_state:
     selected_doc = st.session_state["selected_doc"]
-    file_path = os.path.join("documents", selected_doc)
+    file_path = os.path.join(paths.DOCUMENTS_DIR, selected_doc)
 
     if os.path.exists(file_path):
         st.markdown("---")
@@ -460,9 +460,7 @@ if "selected_doc" in st.session_state:
 
         # ---- DOCX ----
         elif selected_doc.endswith(".docx"):
-            import docx
-            document = docx.Document(file_path)
-            text = "\n".join([p.text for p in document.paragraphs])
+            text = lire_docx(file_path)
             st.markdown(
                 f"""
                 <div style="
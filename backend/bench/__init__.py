@@ -0,0 +1,10 @@
+"""
+Benchmarks for the DocuFind backend.
+
+- bench.corpus  : synthetic French corpus generator (txt / pdf / docx / html)
+- bench.harness : timing helpers, JSON results and baseline comparison
+- bench.run     : the benchmark suite itself
+
+Run from the backend/ folder:
+    python -m bench.run --docs 300 --out bench/results/latest.json
+"""
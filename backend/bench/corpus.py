@@ -0,0 +1,251 @@
+"""
+Synthetic French corpus generator.
+
+Word frequencies follow a Zipf law over a vocabulary made of real French
+words (most frequent ranks) completed by pseudo-words built from French
+syllables, so that spaCy, the stopword filter and the index all see a
+realistic distribution. Generation is fully determined by the seed.
+
+Usage (from backend/):
+    python -m bench.corpus --out /tmp/corpus --docs 500 --mix txt=4,pdf=2,docx=2,html=2
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+
+
+# -------------------------- VOCABULARY --------------------------
+FRENCH_WORDS = """
+le de un être et à il avoir ne je son que se qui ce dans en du elle au pour
+pas que vous par sur faire plus dire me on mon lui nous comme mais pouvoir
+avec tout y aller voir en bien où sans tu ou leur homme si deux mari moi
+vouloir te femme venir quand grand celui notre devoir là jour prendre même
+votre tout rien petit encore aussi quelque dont tout mer trouver donner temps
+ça peu même falloir sous parler alors main chose te mettre vie savoir yeux
+passer autre après regarder toujours puis jamais cela aimer non heure croire
+cent monde donc enfant fois seul autre entre vers chez demander jeune jusque
+très moment rester répondre tout tête père fille mille premier car entendre
+eau terre ami nuit porte pays mère état maison roche minéral sédiment couche
+géologie cellule neurone réseau apprentissage biologie protéine organisme
+molécule énergie système donnée modèle fonction méthode analyse résultat
+théorie expérience structure processus évolution espèce génétique calcul
+algorithme mémoire information recherche document science étude université
+cours chapitre exemple question problème solution valeur nombre variable
+équation courbe surface volume température pression climat océan montagne
+volcan séisme plaque magma cristal fossile érosion rivière glacier désert
+forêt plante animal bactérie virus enzyme membrane noyau chromosome gène
+hormone tissu organe sang cerveau muscle nerf signal apprendre comprendre
+calculer mesurer observer décrire expliquer construire produire transformer
+développer utiliser représenter permettre former contenir montrer présenter
+important différent possible nécessaire général particulier naturel humain
+social économique politique historique scientifique technique numérique
+artificiel profond simple complexe rapide lent ancien nouveau moderne
+""".split()
+
+SYLLABLES = [
+    "ba", "be", "bi", "bo", "ca", "ce", "ci", "co", "da", "de", "di", "do",
+    "fa", "fé", "fi", "ga", "gé", "la", "lé", "li", "lo", "ma", "mé", "mi",
+    "mo", "na", "né", "ni", "no", "pa", "pé", "pi", "po", "ra", "ré", "ri",
+    "ro", "sa", "sé", "si", "so", "ta", "té", "ti", "to", "va", "vé", "vi",
+    "tion", "ment", "eur", "ique", "age", "ence", "ise", "oir", "elle", "ain",
+]
+
+
+def build_vocabulary(size, rng):
+    """Return `size` distinct words, real French words first."""
+    vocab = list(dict.fromkeys(FRENCH_WORDS))
+    seen = set(vocab)
+    while len(vocab) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+    return vocab[:size]
+
+
+def zipf_cumulative(size, exponent):
+    """Cumulative Zipf weights for ranks 1..size (for bisect sampling)."""
+    weights = (1.0 / (rank ** exponent) for rank in range(1, size + 1))
+    return list(itertools.accumulate(weights))
+
+
+class TextGenerator:
+    """Draws French-looking sentences from a Zipfian vocabulary."""
+
+    def __init__(self, vocab_size=20000, exponent=1.07, seed=42):
+        self.rng = random.Random(seed)
+        self.vocab = build_vocabulary(vocab_size, self.rng)
+        self.cumulative = zipf_cumulative(len(self.vocab), exponent)
+        self.total = self.cumulative[-1]
+
+    def word(self):
+        r = self.rng.random() * self.total
+        return self.vocab[bisect.bisect_left(self.cumulative, r)]
+
+    def sentence(self):
+        words = [self.word() for _ in range(self.rng.randint(6, 20))]
+        words[0] = words[0].capitalize()
+        return " ".join(words) + self.rng.choice([".", ".", ".", " ?", " !"])
+
+    def paragraph(self):
+        return " ".join(self.sentence() for _ in range(self.rng.randint(3, 8)))
+
+    def document(self, n_words):
+        """Return a list of paragraphs totalling about `n_words` words."""
+        paragraphs, count = [], 0
+        while count < n_words:
+            p = self.paragraph()
+            paragraphs.append(p)
+            count += p.count(" ") + 1
+        return paragraphs
+
+
+# -------------------------- WRITERS --------------------------
+def write_txt(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(paragraphs))
+
+
+def write_html(path, paragraphs):
+    body = "\n".join(f"<p>{p}</p>" for p in paragraphs)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html lang=\"fr\"><head><meta charset=\"utf-8\">"
+            f"<title>{os.path.basename(path)}</title></head>\n<body>\n{body}\n</body></html>\n"
+        )
+
+
+def write_docx(path, paragraphs):
+    import docx
+    document = docx.Document()
+    for p in paragraphs:
+        document.add_paragraph(p)
+    document.save(path)
+
+
+def _pdf_escape(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, paragraphs, chars_per_line=90, lines_per_page=50):
+    """
+    Minimal PDF writer (Helvetica, WinAnsiEncoding) so the generator does not
+    need any extra dependency. pdfminer / PyPDF2 read it like any other PDF.
+    """
+    lines = []
+    for p in paragraphs:
+        current = ""
+        for word in p.split():
+            if current and len(current) + len(word) + 1 > chars_per_line:
+                lines.append(current)
+                current = word
+            else:
+                current = f"{current} {word}" if current else word
+        lines.append(current)
+        lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for page in pages:
+        stream = "BT /F1 11 Tf 14 TL 50 800 Td\n" + "\n".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in page
+        ) + "\nET"
+        data = stream.encode("cp1252", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+WRITERS = {
+    "txt": write_txt,
+    "pdf": write_pdf,
+    "docx": write_docx,
+    "html": write_html,
+}
+
+
+# -------------------------- CORPUS --------------------------
+def parse_mix(mix):
+    """'txt=4,pdf=2' -> {'txt': 4, 'pdf': 2}"""
+    weights = {}
+    for part in mix.split(","):
+        ext, _, weight = part.partition("=")
+        ext = ext.strip().lower()
+        if ext not in WRITERS:
+            raise ValueError(f"Unsupported format: {ext}")
+        weights[ext] = float(weight or 1)
+    return weights
+
+
+def generate_corpus(out_dir, n_docs=200, mix="txt=4,pdf=2,docx=2,html=2",
+                    min_words=200, max_words=3000, vocab_size=20000,
+                    exponent=1.07, seed=42):
+    """
+    Write `n_docs` documents into `out_dir` and return their filenames.
+    Document lengths are log-uniform between min_words and max_words.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    gen = TextGenerator(vocab_size=vocab_size, exponent=exponent, seed=seed)
+    weights = parse_mix(mix) if isinstance(mix, str) else dict(mix)
+    formats, format_weights = list(weights), list(weights.values())
+
+    filenames = []
+    for i in range(n_docs):
+        ext = gen.rng.choices(formats, weights=format_weights)[0]
+        n_words = int(min_words * (max_words / min_words) ** gen.rng.random())
+        filename = f"synth_{i:05d}.{ext}"
+        WRITERS[ext](os.path.join(out_dir, filename), gen.document(n_words))
+        filenames.append(filename)
+
+    return filenames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic French corpus")
+    parser.add_argument("--out", required=True, help="output folder")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--mix", default="txt=4,pdf=2,docx=2,html=2")
+    parser.add_argument("--min-words", type=int, default=200)
+    parser.add_argument("--max-words", type=int, default=3000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--zipf", type=float, default=1.07, help="Zipf exponent")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    files = generate_corpus(
+        args.out, n_docs=args.docs, mix=args.mix, min_words=args.min_words,
+        max_words=args.max_words, vocab_size=args.vocab, exponent=args.zipf,
+        seed=args.seed,
+    )
+    print(f"✔️ {len(files)} documents written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
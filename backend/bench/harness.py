@@ -0,0 +1,147 @@
+"""
+Timing helpers, JSON results and comparison against a stored baseline.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+
+# -------------------------- TIMING --------------------------
+def summarize(samples):
+    """Summary statistics (seconds) of a list of timings."""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        "p95": p95,
+        "max": ordered[-1],
+    }
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Call `fn()` warmup + repeat times and summarize the timed calls."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def per_call(summary, calls):
+    """Scale a summary of batches of `calls` calls down to one call."""
+    return {k: (v if k == "n" else v / calls) for k, v in summary.items()}
+
+
+# -------------------------- RESULTS --------------------------
+def environment():
+    """Where the numbers come from (stored next to the results)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        commit = None
+
+    return {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+class Results:
+    """
+    Collection of benchmark measurements.
+    Each entry has a `value` (median for timings), a `unit` and whether
+    `lower` or `higher` is better, plus optional details.
+    """
+
+    def __init__(self, params=None):
+        self.meta = {"environment": environment(), "params": params or {}}
+        self.entries = {}
+
+    def add_timing(self, name, summary, **details):
+        self.entries[name] = {
+            "value": summary["median"], "unit": "s", "better": "lower",
+            "stats": summary, **details,
+        }
+
+    def add_rate(self, name, value, unit, **details):
+        self.entries[name] = {"value": value, "unit": unit, "better": "higher", **details}
+
+    def to_dict(self):
+        return {"meta": self.meta, "results": self.entries}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+
+def load_results(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -------------------------- BASELINE COMPARISON --------------------------
+def compare(current, baseline, tolerance=0.10):
+    """
+    Compare two result dicts (as saved by Results.save).
+    Returns [(name, baseline_value, current_value, change, status)] where
+    change is the relative change in the "worse" direction and status is
+    one of "ok", "improved", "regression", "new".
+    """
+    rows = []
+    base_entries = baseline.get("results", {})
+    for name, entry in current.get("results", {}).items():
+        base = base_entries.get(name)
+        if base is None or not base.get("value"):
+            rows.append((name, None, entry["value"], None, "new"))
+            continue
+
+        ratio = entry["value"] / base["value"]
+        change = ratio - 1 if entry.get("better") == "lower" else (1 / ratio - 1 if ratio else float("inf"))
+
+        if change > tolerance:
+            status = "regression"
+        elif change < -tolerance:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, base["value"], entry["value"], change, status))
+    return rows
+
+
+def print_report(results, comparison=None):
+    """Human readable summary on stdout."""
+    comparison = {row[0]: row for row in comparison or []}
+    print(f"\n{'benchmark':<40} {'value':>14}  {'baseline':>14}  {'change':>8}")
+    print("-" * 84)
+    for name, entry in results.to_dict()["results"].items():
+        line = f"{name:<40} {_fmt(entry['value'], entry['unit']):>14}"
+        row = comparison.get(name)
+        if row and row[1] is not None:
+            flag = {"regression": " ❌", "improved": " ✅"}.get(row[4], "")
+            line += f"  {_fmt(row[1], entry['unit']):>14}  {row[3]:>+7.1%}{flag}"
+        print(line)
+
+
+def _fmt(value, unit):
+    if unit == "s":
+        return f"{value * 1000:.3f} ms" if value < 1 else f"{value:.3f} s"
+    return f"{value:,.1f} {unit}"
@@ -0,0 +1,206 @@
+"""
+Replay a recorded query log (query_log.py) against a DocuFind API.
+
+Requests are sent at their recorded pace divided by --speedup (0 = as fast
+as possible) by --concurrency workers; /search entries become GET /search
+with their parameters, /search/batch entries POST their queries again.
+The report gives throughput, errors and latency percentiles, overall and
+per endpoint.
+
+Usage (from backend/):
+    python -m bench.replay logs/queries.log --url http://127.0.0.1:8000 --concurrency 8 --speedup 10
+    python -m bench.replay logs/queries.log --start --port 8765     # starts uvicorn main:app itself
+    python -m bench.replay logs/slow_queries.log --limit 200 --out bench/results/replay.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 95, 99)
+
+
+# -------------------------- LOG --------------------------
+def read_log(paths, limit=None):
+    """Entries of the log files (rotated files first), in time order."""
+    entries = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("endpoint") in ("/search", "/search/batch"):
+                    entries.append(entry)
+    entries.sort(key=lambda e: e.get("ts", 0))
+    return entries[:limit] if limit else entries
+
+
+def to_request(entry, base_url):
+    """(method, url, body) replaying one log entry."""
+    params = entry.get("params") or {}
+    if entry["endpoint"] == "/search/batch":
+        body = {"queries": params.get("queries", []), "limit": params.get("limit"),
+                "snippets": params.get("snippets", True)}
+        return "POST", base_url + "/search/batch", json.dumps(body).encode("utf-8")
+
+    query = [("query", entry["query"])]
+    for name in ("limit", "match", "collapse", "stream"):
+        value = params.get(name)
+        if value not in (None, False, "exact"):
+            query.append((name, str(value).lower() if isinstance(value, bool) else str(value)))
+    for facet, values in (params.get("filters") or {}).items():
+        query.extend((facet, v) for v in values)
+    return "GET", base_url + "/search?" + urllib.parse.urlencode(query), None
+
+
+# -------------------------- REPLAY --------------------------
+def send(method, url, body, timeout):
+    """(status, seconds); status 0 when the request failed."""
+    request = urllib.request.Request(url, data=body, method=method)
+    if body is not None:
+        request.add_header("Content-Type", "application/json")
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def replay(entries, base_url, concurrency=4, speedup=1.0, timeout=30.0):
+    """[(endpoint, status, seconds)] of every replayed entry."""
+    results = []
+    lock = threading.Lock()
+    first = entries[0].get("ts", 0) if entries else 0
+    start = time.perf_counter()
+
+    def run(entry):
+        status, seconds = send(*to_request(entry, base_url), timeout)
+        with lock:
+            results.append((entry["endpoint"], status, seconds))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for entry in entries:
+            if speedup > 0:
+                # Recorded pace: wait until this entry's (scaled) offset
+                delay = (entry.get("ts", first) - first) / speedup - (time.perf_counter() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(run, entry)
+    return results, time.perf_counter() - start
+
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(results, seconds):
+    def block(rows):
+        latencies = sorted(s for _, status, s in rows if 200 <= status < 400)
+        summary = {
+            "requests": len(rows),
+            "errors": sum(1 for _, status, _ in rows if not 200 <= status < 400),
+            "throughput": len(rows) / seconds if seconds else 0.0,
+        }
+        if latencies:
+            summary.update({f"p{p}_ms": percentile(latencies, p) * 1000 for p in PERCENTILES})
+            summary["max_ms"] = latencies[-1] * 1000
+        return summary
+
+    report = {"seconds": seconds, **block(results), "endpoints": {}}
+    for endpoint in sorted({e for e, _, _ in results}):
+        report["endpoints"][endpoint] = block([r for r in results if r[0] == endpoint])
+    return report
+
+
+def print_report(report):
+    def line(name, s):
+        cols = [f"{name:<16}", f"{s['requests']:>7} req", f"{s['errors']:>5} err", f"{s['throughput']:>9.1f} req/s"]
+        if "p50_ms" in s:
+            cols += [f"p{p} {s[f'p{p}_ms']:>8.1f} ms" for p in PERCENTILES] + [f"max {s['max_ms']:>8.1f} ms"]
+        print("  ".join(cols))
+
+    print(f"Replayed in {report['seconds']:.1f} s")
+    line("all", report)
+    for endpoint, s in report["endpoints"].items():
+        line(endpoint, s)
+
+
+# -------------------------- LOCAL SERVER --------------------------
+def start_server(port, host="127.0.0.1", wait=600):
+    """uvicorn main:app in backend/, returned once /ping answers."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    url = f"http://{host}:{port}"
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("uvicorn exited before being ready")
+        status, _ = send("GET", url + "/ping", None, timeout=2)
+        if status == 200:
+            return process, url
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start in time")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a DocuFind query log")
+    parser.add_argument("logs", nargs="+", help="query log file(s), e.g. logs/queries.log.1 logs/queries.log")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--start", action="store_true", help="start uvicorn main:app locally (--port)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay N times faster (0 = no pauses)")
+    parser.add_argument("--limit", type=int, help="only the first N entries")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--out", help="JSON report file")
+    args = parser.parse_args(argv)
+
+    entries = read_log(args.logs, args.limit)
+    if not entries:
+        print("No search entries in the log")
+        return 1
+
+    process = None
+    url = args.url.rstrip("/")
+    if args.start:
+        process, url = start_server(args.port)
+    try:
+        results, seconds = replay(entries, url, args.concurrency, args.speedup, args.timeout)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = summarize(results, seconds)
+    report["params"] = {"logs": args.logs, "url": url, "concurrency": args.concurrency, "speedup": args.speedup}
+    print_report(report)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+"""
+DocuFind benchmark suite.
+
+Generates a synthetic corpus in a scratch folder, loads the real backend
+modules against it (search_engine, main) and times:
+- file extraction per format (html files are generated but, like
+  search_engine.acquisition(), not extracted)
+- lemmatization (normalisation)
+- index build (extraction + build_index)
+- query latency for terms matching ~1, 10, 100, 1000 documents,
+  both recherche() alone and the full /search handler
+- ranking: per-hit SQL vs sparse matrix, batch scoring throughput
+- /suggest and /cloud
+
+Usage (from backend/):
+    python -m bench.run --docs 300 --out bench/results/latest.json
+    python -m bench.run --save-baseline          # store bench/baseline.json
+    python -m bench.run --fail-on-regression     # exit 1 if slower than baseline
+"""
+import argparse
+import importlib
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench import harness
+from bench.corpus import generate_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "bench", "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BACKEND_DIR, "bench", "results", "latest.json")
+
+HIT_TARGETS = (1, 10, 100, 1000)
+
+
+# -------------------------- WORKDIR --------------------------
+def prepare_workdir(workdir, args):
+    """
+    Scratch folder laid out like backend/: documents/ and stopwords.txt
+    (search_engine.db is written later by build_database).
+    """
+    docs_dir = os.path.join(workdir, "documents")
+    generate_corpus(
+        docs_dir, n_docs=args.docs, mix=args.mix, min_words=args.min_words,
+        max_words=args.max_words, vocab_size=args.vocab, seed=args.seed,
+    )
+    shutil.copy(os.path.join(BACKEND_DIR, "stopwords.txt"), workdir)
+
+
+def build_database(db_path, corpus, freqs):
+    """Same schema and content as the admin "Ré-indexer" action."""
+    import content_store
+    import stats
+    import token_filters
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT UNIQUE,
+            filetype TEXT,
+            content TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS word_frequencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            word TEXT,
+            count INTEGER,
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_word_per_doc
+        ON word_frequencies (document_id, word)
+    """)
+    stats.init_stats_tables(conn)
+    token_filters.init_tables(conn)
+    token_filter = token_filters.current()
+
+    for filename in corpus:
+        cursor.execute(
+            "INSERT INTO documents (filename, filetype, content) VALUES (?, ?, NULL)",
+            (filename, os.path.splitext(filename)[1].lower()),
+        )
+        token_filters.write_document(cursor, cursor.lastrowid, filename, dict(freqs[filename]), token_filter)
+    token_filters.record_filter(cursor, token_filter)
+    content_store.ContentStore(conn).update(corpus)
+
+    conn.commit()
+    conn.close()
+
+
+# -------------------------- BENCHMARKS --------------------------
+def read_txt(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def bench_extraction(results, se, repeat):
+    readers = {
+        ".txt": read_txt,
+        ".pdf": se.lire_pdf,
+        ".docx": se.lire_docx,
+    }
+    files = sorted(os.listdir(se.DOCUMENTS_DIR))
+    for ext, reader in readers.items():
+        sample = [os.path.join(se.DOCUMENTS_DIR, f) for f in files if f.endswith(ext)][:20]
+        if not sample:
+            continue
+        size = sum(os.path.getsize(p) for p in sample)
+        summary = harness.measure(lambda: [reader(p) for p in sample], repeat=repeat)
+        results.add_timing(f"extraction{ext}", summary, files=len(sample), bytes=size)
+        results.add_rate(f"extraction{ext}.throughput", size / summary["median"] / 1e6, "MB/s")
+
+
+def bench_lemmatization(results, se, repeat):
+    text = " ".join(list(se.CORPUS.values())[:50])
+    words = text.split()[:20000]
+    text = " ".join(words)
+    summary = harness.measure(lambda: se.lemmatisation(text), repeat=repeat)
+    results.add_timing("lemmatization", summary, words=len(words))
+    results.add_rate("lemmatization.throughput", len(words) / summary["median"], "words/s")
+
+
+def bench_index_build(results, se, repeat):
+    summary = harness.measure(lambda: se.extraction(se.CORPUS), repeat=max(1, repeat // 2), warmup=0)
+    results.add_timing("index.extraction", summary, documents=len(se.CORPUS))
+    summary = harness.measure(lambda: se.build_index(se.FREQS), repeat=repeat)
+    results.add_timing("index.build_index", summary, terms=len(se.INDEX))
+
+
+def pick_terms(index, targets):
+    """For each hit-count target, the term whose document frequency is closest."""
+    by_df = sorted(index.items(), key=lambda kv: (len(kv[1]), kv[0]))
+    picked = {}
+    for target in targets:
+        term, postings = min(by_df, key=lambda kv: abs(len(kv[1]) - target))
+        picked[target] = (term, len(postings))
+    return picked
+
+
+def call_search(main, query):
+    """main.search() called directly: its Query() / Header() defaults are not resolved, pass them all."""
+    return main.search(query=query, limit=None, match="exact", collapse=False, filetype=None, size=None,
+                       month=None, pages=None, stream=False, profile=None, x_admin_token=None)
+
+
+def bench_queries(results, se, main, repeat):
+    max_hits = max(len(p) for p in se.INDEX.values())
+    targets = [t for t in HIT_TARGETS if t < max_hits] + [max_hits]
+    for target, (term, hits) in pick_terms(se.INDEX, targets).items():
+        name = "hits_max" if target == max_hits else f"hits_{target}"
+        summary = harness.measure(lambda: se.recherche(term, se.INDEX), repeat=repeat * 20)
+        results.add_timing(f"query.recherche.{name}", summary, term=term, hits=hits)
+        summary = harness.measure(lambda: call_search(main, term), repeat=repeat)
+        results.add_timing(f"query.search.{name}", summary, term=term, hits=hits)
+
+    frequent = sorted(se.INDEX, key=lambda w: len(se.INDEX[w]), reverse=True)[:2]
+    if len(frequent) == 2:
+        for op in ("et", "ou"):
+            query = f" {op} ".join(frequent)
+            hits = len(se.recherche(query, se.INDEX))
+            summary = harness.measure(lambda: se.recherche(query, se.INDEX), repeat=repeat * 20)
+            results.add_timing(f"query.recherche.{op}", summary, query=query, hits=hits)
+            summary = harness.measure(lambda: call_search(main, query), repeat=repeat)
+            results.add_timing(f"query.search.{op}", summary, query=query, hits=hits)
+
+
+def bench_scoring(results, se, main, repeat):
+    scorer = main.get_scorer()
+    if scorer is None:
+        print("   (numpy / scipy not installed: matrix scoring skipped)")
+        return
+
+    terms = sorted(se.INDEX, key=lambda w: len(se.INDEX[w]), reverse=True)
+    query, hits = terms[:2], se.recherche(" ".join(terms[:2]), se.INDEX)
+    summary = harness.measure(lambda: main.sql_rank(se.DOC_IDS.filenames(hits), query), repeat=repeat)
+    results.add_timing("scoring.sql", summary, hits=len(hits))
+    summary = harness.measure(lambda: scorer.rank(query, hits), repeat=repeat * 20)
+    results.add_timing("scoring.matrix", summary, hits=len(hits))
+
+    batch = [[w] for w in terms[:1000]]
+    summary = harness.measure(lambda: scorer.rank_batch(batch, k=10), repeat=repeat)
+    results.add_rate("scoring.batch.throughput", len(batch) / summary["median"], "queries/s")
+
+
+def bench_suggest(results, main, se, repeat, seed):
+    rng = random.Random(seed)
+    vocab = sorted(w for w in se.INDEX if len(w) > 4)
+    typos = []
+    for word in rng.sample(vocab, min(10, len(vocab))):
+        i = rng.randrange(len(word))
+        typos.append(word[:i] + word[i + 1:])
+    summary = harness.measure(lambda: [main.suggest(t) for t in typos], repeat=repeat)
+    results.add_timing("suggest", harness.per_call(summary, len(typos)), queries=len(typos))
+
+
+def bench_cloud(results, main, se, repeat):
+    filenames = sorted(se.CORPUS)[:20]
+    summary = harness.measure(lambda: [main.cloud(f, limit=40) for f in filenames], repeat=repeat)
+    results.add_timing("cloud", harness.per_call(summary, len(filenames)), documents=len(filenames))
+
+
+# -------------------------- DRIVER --------------------------
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="docufind-bench-")
+    params = {k: v for k, v in vars(args).items() if k in ("docs", "mix", "min_words", "max_words", "vocab", "seed", "repeat")}
+    results = harness.Results(params)
+
+    print(f"📂 Generating corpus in {workdir} ...")
+    prepare_workdir(workdir, args)
+
+    # The backend modules use paths relative to the working directory
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    try:
+        start = time.perf_counter()
+        se = importlib.import_module("search_engine")
+        results.add_timing("startup.search_engine", harness.summarize([time.perf_counter() - start]),
+                           documents=len(se.CORPUS))
+
+        build_database(os.path.join(workdir, "search_engine.db"), se.CORPUS, se.FREQS)
+        main = importlib.import_module("main")
+
+        print("⏱️ extraction"); bench_extraction(results, se, args.repeat)
+        print("⏱️ lemmatization"); bench_lemmatization(results, se, args.repeat)
+        print("⏱️ index build"); bench_index_build(results, se, args.repeat)
+        print("⏱️ queries"); bench_queries(results, se, main, args.repeat)
+        print("⏱️ scoring"); bench_scoring(results, se, main, args.repeat)
+        print("⏱️ suggest"); bench_suggest(results, main, se, args.repeat, args.seed)
+        print("⏱️ cloud"); bench_cloud(results, main, se, args.repeat)
+    finally:
+        os.chdir(previous_cwd)
+        if not args.keep_workdir and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DocuFind benchmark suite")
+    parser.add_argument("--docs", type=int, default=300)
+    parser.add_argument("--mix", default="txt=4,pdf=2,docx=2,html=2")
+    parser.add_argument("--min-words", type=int, default=200)
+    parser.add_argument("--max-words", type=int, default=3000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", help="reuse this folder instead of a temporary one")
+    parser.add_argument("--keep-workdir", action="store_true")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="JSON results file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    results.save(args.out)
+
+    comparison = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        comparison = harness.compare(results.to_dict(), harness.load_results(args.baseline), args.tolerance)
+
+    harness.print_report(results, comparison)
+    print(f"\n💾 Results written to {args.out}")
+
+    if args.save_baseline:
+        results.save(args.baseline)
+        print(f"📌 Baseline updated: {args.baseline}")
+
+    regressions = [row for row in comparison or [] if row[4] == "regression"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) above {args.tolerance:.0%}: "
+              + ", ".join(row[0] for row in regressions))
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
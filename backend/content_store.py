@@ -0,0 +1,330 @@
+"""
+Compressed store of the extracted text of the documents.
+
+Texts are packed into blocks of about BLOCK_SIZE bytes and every block is
+compressed with zstd (when `zstandard` is installed) or zlib, both with a
+dictionary shared by the whole store and built from a sample of the first
+documents written (small documents compress much better with it).
+A text is read back lazily by filename: block lookup, decompression
+through a small LRU of decompressed blocks, then a slice.
+
+Blocks are immutable: replacing or deleting a text leaves its old bytes
+in its block. A block none of whose texts is live is dropped, and a block
+whose live texts fall below COMPACT_RATIO of its size is compacted: its
+live texts are repacked with those of the other sparse blocks.
+
+Tables (in any SQLite file):
+- content_dicts  : shared compression dictionaries
+- content_blocks : compressed blocks (and their uncompressed size)
+- content_docs   : filename -> (block, byte offset, byte length)
+
+ContentStore is a MutableMapping {filename: text}, so it replaces the
+CORPUS dict and the documents.content column without changing callers.
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOCK_SIZE = int(os.environ.get("DOCUFIND_CONTENT_BLOCK_SIZE", str(64 * 1024)))
+CACHE_BLOCKS = int(os.environ.get("DOCUFIND_CONTENT_CACHE_BLOCKS", "64"))
+CODEC = os.environ.get("DOCUFIND_CONTENT_CODEC", "zstd" if zstandard is not None else "zlib")
+# Rewrite a block once its live texts are less than this fraction of it
+COMPACT_RATIO = float(os.environ.get("DOCUFIND_CONTENT_COMPACT_RATIO", "0.5"))
+DICT_SIZE = 16 * 1024                 # zlib uses at most 32 KB of preset dictionary
+LEVEL = 9
+
+
+# -------------------------- CODECS --------------------------
+def build_dictionary(codec, samples):
+    """Shared dictionary trained on (or cut from) sample texts (bytes)."""
+    if codec == "zstd":
+        try:
+            return zstandard.train_dictionary(DICT_SIZE, samples).as_bytes()
+        except Exception:
+            # Not enough samples to train: raw content dictionary
+            pass
+    # Most useful strings last: zlib matches closer to the end are cheaper
+    per_sample = max(DICT_SIZE // max(len(samples), 1), 256)
+    return b"".join(s[:per_sample] for s in samples)[-DICT_SIZE:]
+
+
+def zstd_dict(dictionary):
+    if not dictionary:
+        return None
+    return zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_AUTO)
+
+
+def compress(codec, dictionary, data):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=LEVEL, dict_data=zstd_dict(dictionary)).compress(data)
+    if codec == "zlib":
+        c = zlib.compressobj(LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(LEVEL)
+        return c.compress(data) + c.flush()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+def decompress(codec, dictionary, data):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor(dict_data=zstd_dict(dictionary)).decompress(data)
+    if codec == "zlib":
+        d = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return d.decompress(data) + d.flush()
+    raise ValueError(f"Unknown codec: {codec}")
+
+
+# -------------------------- STORE --------------------------
+class ContentStore(MutableMapping):
+    """{filename: text} compressed in an SQLite file (see module docstring)."""
+
+    def __init__(self, db, codec=CODEC, cache_blocks=CACHE_BLOCKS):
+        """
+        `db` is a path, or an open connection: writes then join the caller's
+        transaction and are committed by the caller (admin reindex).
+        """
+        if codec == "zstd" and zstandard is None:
+            codec = "zlib"
+        self.codec = codec
+        self.cache_blocks = cache_blocks
+        self.lock = threading.RLock()
+        self.cache = OrderedDict()            # block id -> decompressed bytes
+        self.dicts = {}                       # dict id -> bytes
+        self.owns_conn = not isinstance(db, sqlite3.Connection)
+        self.conn = sqlite3.connect(db, check_same_thread=False) if self.owns_conn else db
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_dicts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codec TEXT,
+                data BLOB
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_blocks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                codec TEXT,
+                dict_id INTEGER,
+                data BLOB,
+                size INTEGER
+            )
+        """)
+        if "size" not in {row[1] for row in self.conn.execute("PRAGMA table_info(content_blocks)")}:
+            # Stores written before compaction: their blocks are never compacted
+            self.conn.execute("ALTER TABLE content_blocks ADD COLUMN size INTEGER")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS content_docs (
+                filename TEXT PRIMARY KEY,
+                block_id INTEGER,
+                start INTEGER,
+                length INTEGER
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_content_docs_block ON content_docs (block_id)")
+        self._commit()
+
+    def _commit(self):
+        if self.owns_conn:
+            self.conn.commit()
+
+    # ---------- writing ----------
+    def _dictionary_id(self, samples):
+        row = self.conn.execute(
+            "SELECT id FROM content_dicts WHERE codec = ? ORDER BY id DESC LIMIT 1", (self.codec,)
+        ).fetchone()
+        if row:
+            return row[0]
+        data = build_dictionary(self.codec, samples)
+        cursor = self.conn.execute("INSERT INTO content_dicts (codec, data) VALUES (?, ?)", (self.codec, data))
+        return cursor.lastrowid
+
+    def _dictionary(self, dict_id):
+        if dict_id not in self.dicts:
+            row = self.conn.execute("SELECT data FROM content_dicts WHERE id = ?", (dict_id,)).fetchone()
+            self.dicts[dict_id] = bytes(row[0]) if row else b""
+        return self.dicts[dict_id]
+
+    def _write_block(self, dict_id, docs):
+        """Compress [(filename, bytes)] into one block."""
+        data = b"".join(text for _, text in docs)
+        compressed = compress(self.codec, self._dictionary(dict_id), data)
+        cursor = self.conn.execute(
+            "INSERT INTO content_blocks (codec, dict_id, data, size) VALUES (?, ?, ?, ?)",
+            (self.codec, dict_id, compressed, len(data)),
+        )
+        block_id = cursor.lastrowid
+        rows, start = [], 0
+        for filename, text in docs:
+            rows.append((filename, block_id, start, len(text)))
+            start += len(text)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO content_docs (filename, block_id, start, length) VALUES (?, ?, ?, ?)", rows
+        )
+
+    def update(self, other=(), **kwargs):
+        """Write many texts at once, packed into shared blocks."""
+        items = other.items() if hasattr(other, "items") else other
+        docs = [(filename, text.encode("utf-8")) for filename, text in items]
+        docs += [(filename, text.encode("utf-8")) for filename, text in kwargs.items()]
+        if not docs:
+            return
+        with self.lock, metrics.timed("content_write"):
+            self._pack(docs)
+            self._drop_unused_blocks()
+            self._compact_blocks()
+            self._commit()
+
+    def _pack(self, docs):
+        """Write [(filename, bytes)] into blocks of about BLOCK_SIZE bytes."""
+        dict_id = self._dictionary_id([text for _, text in docs[:64] if text])
+        block, size = [], 0
+        for filename, text in docs:
+            block.append((filename, text))
+            size += len(text)
+            if size >= BLOCK_SIZE:
+                self._write_block(dict_id, block)
+                block, size = [], 0
+        if block:
+            self._write_block(dict_id, block)
+
+    def __setitem__(self, filename, text):
+        self.update({filename: text})
+
+    def __delitem__(self, filename):
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM content_docs WHERE filename = ?", (filename,))
+            if not cursor.rowcount:
+                raise KeyError(filename)
+            self._drop_unused_blocks()
+            self._compact_blocks()
+            self._commit()
+
+    def clear(self):
+        with self.lock:
+            for table in ("content_docs", "content_blocks", "content_dicts"):
+                self.conn.execute(f"DELETE FROM {table}")
+            self._commit()
+            self.cache.clear()
+            self.dicts.clear()
+
+    def _drop_unused_blocks(self):
+        # Blocks are immutable: a block goes away once none of its texts is live
+        self.conn.execute("""
+            DELETE FROM content_blocks
+            WHERE id NOT IN (SELECT DISTINCT block_id FROM content_docs)
+        """)
+
+    def _compact_blocks(self):
+        """Repack the live texts of the blocks below COMPACT_RATIO, then drop those blocks."""
+        sparse = [block_id for (block_id,) in self.conn.execute("""
+            SELECT b.id FROM content_blocks b JOIN content_docs d ON d.block_id = b.id
+            WHERE b.size IS NOT NULL
+            GROUP BY b.id HAVING SUM(d.length) < b.size * ?
+        """, (COMPACT_RATIO,))]
+        if not sparse:
+            return
+        with metrics.timed("content_compact"):
+            docs = []
+            for block_id in sparse:
+                block = self._block(block_id)
+                rows = self.conn.execute(
+                    "SELECT filename, start, length FROM content_docs WHERE block_id = ? ORDER BY start", (block_id,)
+                )
+                docs += [(filename, block[start:start + length]) for filename, start, length in rows]
+            self._pack(docs)
+            self._drop_unused_blocks()
+            for block_id in sparse:
+                self.cache.pop(block_id, None)
+
+    # ---------- reading ----------
+    def _block(self, block_id):
+        block = self.cache.get(block_id)
+        if block is not None:
+            self.cache.move_to_end(block_id)
+            metrics.cache_hit("content_blocks")
+            return block
+
+        metrics.cache_miss("content_blocks")
+        codec, dict_id, data = self.conn.execute(
+            "SELECT codec, dict_id, data FROM content_blocks WHERE id = ?", (block_id,)
+        ).fetchone()
+        block = decompress(codec, self._dictionary(dict_id), data)
+        self.cache[block_id] = block
+        if len(self.cache) > self.cache_blocks:
+            self.cache.popitem(last=False)
+        return block
+
+    def get(self, filename, default=None):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT block_id, start, length FROM content_docs WHERE filename = ?", (filename,)
+            ).fetchone()
+            if row is None:
+                return default
+            block_id, start, length = row
+            return self._block(block_id)[start:start + length].decode("utf-8")
+
+    def __getitem__(self, filename):
+        text = self.get(filename)
+        if text is None:
+            raise KeyError(filename)
+        return text
+
+    def __contains__(self, filename):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM content_docs WHERE filename = ?", (filename,)
+            ).fetchone() is not None
+
+    def __iter__(self):
+        with self.lock:
+            filenames = [f for (f,) in self.conn.execute("SELECT filename FROM content_docs ORDER BY filename")]
+        return iter(filenames)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM content_docs").fetchone()[0]
+
+    def compressed_bytes(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM content_blocks").fetchone()[0]
+
+    def raw_bytes(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(length), 0) FROM content_docs").fetchone()[0]
+
+    def close(self):
+        if self.owns_conn:
+            self.conn.close()
+
+
+# -------------------------- MIGRATION --------------------------
+def migrate_documents_column(db_path):
+    """
+    Move the texts of the historical documents.content column into the
+    store and empty the column. Returns the number of documents moved.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT filename, content FROM documents WHERE content IS NOT NULL"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # no documents table yet
+        rows = []
+    if rows:
+        store = ContentStore(db_path)
+        store.update({filename: content for filename, content in rows})
+        store.close()
+        conn.execute("UPDATE documents SET content = NULL")
+        conn.commit()
+        conn.execute("VACUUM")
+    conn.close()
+    return len(rows)
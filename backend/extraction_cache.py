@@ -0,0 +1,449 @@
+"""
+Extracted-text cache shared by every component that reads documents.
+
+PDF / DOCX / HTML text extraction is the slowest step of indexing and was
+done again by the API at startup, by the admin reindex, by app.py and by
+the /search snippets. extract(path) is now the single entry point:
+
+- key = sha256 of the file content + extractor name + extractor version,
+  so a renamed or copied file is still a hit, a modified file is a miss,
+  and bumping an extractor version invalidates only its own entries
+- entries are stored zlib-compressed in an SQLite file
+  (DOCUFIND_EXTRACTION_CACHE, WAL mode so the API and the dashboards can
+  share it)
+- hits / misses are counted per extractor in the same file (shown in the
+  admin dashboard) and in the docufind_cache_requests_total metric
+
+.txt files are read directly: reading them is the extraction.
+
+Huge documents: PDFs are converted page by page (only the current page's
+layout is in memory) and every page of the text ends with PAGE_BREAK, so
+page_offsets() finds where each page starts (the viewer and the snippets
+jump to the page of a match). DOCUFIND_MAX_PAGES / DOCUFIND_MAX_DOCUMENT_CHARS
+(0 = no limit) cap what is kept of a document, page by page as it is read;
+they are part of the cache key, so changing them re-extracts.
+extract_pages() hands the pages over as pdfminer converts them and
+text_chunks() groups them for lemmatization, so indexing a huge PDF never
+joins its text first; its page offsets are recorded on the way.
+"""
+import atexit
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import zlib
+
+import metrics
+
+CACHE_PATH = os.environ.get("DOCUFIND_EXTRACTION_CACHE", "extraction_cache.db")
+CHUNK_SIZE = 64 * 1024
+# Pending hit / miss counts are written to the cache file every N lookups
+STATS_FLUSH_EVERY = 50
+# Limits per document (0 = none): PDF pages read, characters of text kept
+MAX_PAGES = int(os.environ.get("DOCUFIND_MAX_PAGES", "0"))
+MAX_CHARS = int(os.environ.get("DOCUFIND_MAX_DOCUMENT_CHARS", "0"))
+# pdfminer ends every page with a form feed
+PAGE_BREAK = "\f"
+# Characters lemmatized at once (bounds the spaCy Doc of a huge document)
+CHUNK_CHARS = int(os.environ.get("DOCUFIND_LEMMA_CHUNK_CHARS", "100000"))
+
+
+# -------------------------- EXTRACTORS --------------------------
+def iter_pdf_pages(filepath, max_pages=MAX_PAGES):
+    """Text of each page of a PDF (same output as pdfminer's extract_text, page by page)."""
+    from io import StringIO
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    with open(filepath, "rb") as f, StringIO() as output:
+        manager = PDFResourceManager()
+        device = TextConverter(manager, output, laparams=LAParams())
+        interpreter = PDFPageInterpreter(manager, device)
+        for page in PDFPage.get_pages(f, maxpages=max_pages):
+            interpreter.process_page(page)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+
+def limited_pages(pages, max_chars=MAX_CHARS):
+    """The pages, stopped after max_chars characters in total (0 = no limit)."""
+    size = 0
+    for page in pages:
+        if max_chars and size + len(page) > max_chars:
+            if max_chars > size:
+                yield page[:max_chars - size]
+            return
+        yield page
+        size += len(page)
+
+
+def truncate(text, max_chars=MAX_CHARS):
+    return text[:max_chars] if max_chars else text
+
+
+# The extractors raise on unreadable files: see cached()
+def lire_pdf(filepath):
+    return "".join(limited_pages(iter_pdf_pages(filepath)))
+
+
+def lire_docx(filepath):
+    import docx
+    doc = docx.Document(filepath)
+    return truncate("\n".join([p.text for p in doc.paragraphs]))
+
+
+def lire_html(filepath):
+    with open(filepath, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # Remove HTML tags
+    return truncate(re.sub(r"<[^>]+>", " ", text))
+
+
+def pdf_pages(filepath):
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfparser import PDFParser
+    from pdfminer.pdftypes import resolve1
+    with open(filepath, "rb") as f:
+        document = PDFDocument(PDFParser(f))
+        return str(resolve1(document.catalog["Pages"])["Count"])
+
+
+def docx_pages(filepath):
+    # Page count saved by the word processor (docProps/app.xml), if any
+    import zipfile
+    with zipfile.ZipFile(filepath) as z:
+        found = re.search(rb"<Pages>(\d+)</Pages>", z.read("docProps/app.xml"))
+    return found.group(1).decode() if found else ""
+
+
+def page_starts(text):
+    """Character offset where each page of an extracted text starts."""
+    starts = [0]
+    position = text.find(PAGE_BREAK)
+    while position != -1 and position + 1 < len(text):
+        starts.append(position + 1)
+        position = text.find(PAGE_BREAK, position + 1)
+    return starts
+
+
+def text_chunks(text, size=CHUNK_CHARS):
+    """
+    Pieces of about `size` characters of a text, or of an iterable of its
+    pages (consumed as it goes): consecutive pages are grouped, a longer
+    text or page is cut at a page break or a whitespace.
+    """
+    if isinstance(text, str):
+        yield from cut_text(text, size)
+        return
+    pending, length = [], 0
+    for page in text:
+        if pending and length + len(page) > size:
+            yield "".join(pending)
+            pending, length = [], 0
+        if len(page) > size:
+            yield from cut_text(page, size)
+        else:
+            pending.append(page)
+            length += len(page)
+    if pending:
+        yield "".join(pending)
+
+
+def cut_text(text, size):
+    start = 0
+    while start < len(text):
+        end = start + size
+        if end < len(text):
+            cut = text.rfind(PAGE_BREAK, start + size // 2, end)
+            if cut == -1:
+                cut = max(text.rfind(c, start, end) for c in " \n\t")
+            if cut > start:
+                end = cut + 1
+        yield text[start:end]
+        start = end
+
+
+# extension -> (extractor name, version, function). Bump the version when
+# an extractor's output changes so that its cached texts are recomputed.
+EXTRACTORS = {
+    ".pdf": ("pdfminer", 1, lire_pdf),
+    ".docx": ("python-docx", 1, lire_docx),
+    ".html": ("html-tags", 1, lire_html),
+    ".htm": ("html-tags", 1, lire_html),
+}
+# Page counts (facets.py), cached the same way
+PAGE_COUNTERS = {
+    ".pdf": ("pdfminer-pages", 1, pdf_pages),
+    ".docx": ("docx-pages", 1, docx_pages),
+}
+
+
+# -------------------------- CONTENT HASH --------------------------
+_hashes = {}                # path -> (size, mtime_ns, sha256 hex)
+_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """sha256 of a file's content, computed once per version of the file."""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached is not None and cached[:2] == key:
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hashes_lock:
+        _hashes[path] = key + (value,)
+    return value
+
+
+# -------------------------- CACHE --------------------------
+class ExtractionCache:
+    def __init__(self, db_path=CACHE_PATH):
+        self.lock = threading.Lock()
+        self.pending = {}                    # extractor -> [hits, misses]
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extracted_texts (
+                hash TEXT,
+                extractor TEXT,
+                version INTEGER,
+                text BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (hash, extractor, version)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_stats (
+                extractor TEXT PRIMARY KEY,
+                hits INTEGER DEFAULT 0,
+                misses INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, digest, extractor, version):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT text FROM extracted_texts WHERE hash = ? AND extractor = ? AND version = ?",
+                (digest, extractor, version),
+            ).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put(self, digest, extractor, version, text=None, data=None):
+        """Store a text, or its zlib-compressed UTF-8 bytes (`data`)."""
+        if data is None:
+            data = zlib.compress(text.encode("utf-8"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO extracted_texts (hash, extractor, version, text) VALUES (?, ?, ?, ?)",
+                (digest, extractor, version, data),
+            )
+            self.conn.commit()
+
+    # ---------- hit / miss counters ----------
+    def count(self, extractor, hit):
+        (metrics.cache_hit if hit else metrics.cache_miss)("extraction")
+        with self.lock:
+            counts = self.pending.setdefault(extractor, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = sum(h + m for h, m in self.pending.values()) >= STATS_FLUSH_EVERY
+        if due or not hit:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            for extractor, (hits, misses) in pending.items():
+                self.conn.execute("INSERT OR IGNORE INTO extraction_stats (extractor) VALUES (?)", (extractor,))
+                self.conn.execute(
+                    "UPDATE extraction_stats SET hits = hits + ?, misses = misses + ? WHERE extractor = ?",
+                    (hits, misses, extractor),
+                )
+            self.conn.commit()
+
+    def stats(self):
+        """[(extractor, hits, misses, cached texts)] including unflushed counts."""
+        self.flush()
+        with self.lock:
+            return self.conn.execute("""
+                SELECT s.extractor, s.hits, s.misses,
+                       (SELECT COUNT(*) FROM extracted_texts t WHERE t.extractor = s.extractor)
+                FROM extraction_stats s ORDER BY s.extractor
+            """).fetchall()
+
+    def size_bytes(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(SUM(LENGTH(text)), 0) FROM extracted_texts").fetchone()[0]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache, opened on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+            atexit.register(_cache.flush)
+    return _cache
+
+
+# -------------------------- ENTRY POINT --------------------------
+class ExtractionFailed(Exception):
+    """A document could not be read; nothing was cached for it."""
+
+
+def supported(filename):
+    return filename.lower().endswith(".txt") or os.path.splitext(filename.lower())[1] in EXTRACTORS
+
+
+def extract(filepath):
+    """
+    Text of a document (None for unsupported formats, "" when it cannot be
+    read). Each version of a file goes through its extractor only once,
+    whoever asks.
+    """
+    ext = os.path.splitext(filepath.lower())[1]
+    if ext == ".txt":
+        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read(MAX_CHARS or -1)
+    if ext not in EXTRACTORS:
+        return None
+
+    name, version, extractor = EXTRACTORS[ext]
+    if ext != ".pdf":
+        return cached(filepath, limited(name), version, extractor)
+    cache, digest, text = lookup(filepath, limited(name), version)
+    if text is None:
+        try:
+            text = "".join(stream_pdf(filepath, cache, digest))
+        except ExtractionFailed:
+            return ""
+    return text
+
+
+def extract_pages(filepath):
+    """
+    The pages of extract(filepath), one piece for the formats without
+    pages. A PDF missing from the cache is streamed: each page is yielded as
+    soon as pdfminer has converted it. Raises ExtractionFailed when the
+    document cannot be read.
+    """
+    ext = os.path.splitext(filepath.lower())[1]
+    if ext == ".pdf":
+        name, version, _ = EXTRACTORS[ext]
+        cache, digest, text = lookup(filepath, limited(name), version)
+        if text is None:
+            yield from stream_pdf(filepath, cache, digest)
+            return
+        offsets = page_offsets(filepath) or [0]
+        for start, end in zip(offsets, offsets[1:] + [len(text)]):
+            yield text[start:end]
+        return
+
+    if ext in EXTRACTORS:
+        name, version, extractor = EXTRACTORS[ext]
+        text = cached(filepath, limited(name), version, extractor, failed=None)
+        if text is None:
+            raise ExtractionFailed(filepath)
+    else:
+        text = extract(filepath)             # .txt, None if unsupported
+    if text:
+        yield text
+
+
+def stream_pdf(filepath, cache, digest):
+    """
+    Pages of a PDF read by pdfminer (capped by the limits). After the last
+    one its text, compressed on the way, and its page offsets are cached.
+    """
+    name, version, _ = EXTRACTORS[".pdf"]
+    compressor, data, offsets, size = zlib.compressobj(), [], [], 0
+    try:
+        for page in limited_pages(iter_pdf_pages(filepath)):
+            offsets.append(size)
+            size += len(page)
+            data.append(compressor.compress(page.encode("utf-8")))
+            yield page
+    except Exception as e:
+        print(f" {name} failed on {os.path.basename(filepath)}: {e}")
+        raise ExtractionFailed(filepath) from e
+    data.append(compressor.flush())
+    cache.put(digest, limited(name), version, data=b"".join(data))
+    cache.put(digest, limited("pdf-page-offsets"), 1, json.dumps(offsets or [0]))
+
+
+def limited(name):
+    """Cache name of an extractor's output under the current limits."""
+    if not (MAX_PAGES or MAX_CHARS):
+        return name
+    return f"{name}[pages={MAX_PAGES},chars={MAX_CHARS}]"
+
+
+def lookup(filepath, name, version):
+    """(cache, content hash, cached text or None), counted as a hit / miss."""
+    cache = get_cache()
+    digest = file_hash(filepath)
+    text = cache.get(digest, name, version)
+    cache.count(name, hit=text is not None)
+    return cache, digest, text
+
+
+def cached(filepath, name, version, extractor, failed=""):
+    """
+    extractor(filepath), computed once per file content and extractor
+    version. When the extractor raises, `failed` is returned and nothing is
+    cached: a missing library or a transient error is retried next time.
+    """
+    cache, digest, text = lookup(filepath, name, version)
+    if text is None:
+        try:
+            text = extractor(filepath)
+        except Exception as e:
+            print(f" {name} failed on {os.path.basename(filepath)}: {e}")
+            return failed
+        cache.put(digest, name, version, text)
+    return text
+
+
+def page_count(filepath):
+    """Number of pages of a PDF / DOCX (None when unknown), cached like the texts."""
+    ext = os.path.splitext(filepath.lower())[1]
+    if ext not in PAGE_COUNTERS:
+        return None
+    pages = cached(filepath, *PAGE_COUNTERS[ext])
+    return int(pages) if pages else None
+
+
+def page_offsets(filepath):
+    """
+    Character offsets of the pages in extract(filepath) (PDF only, else
+    None). Recorded while the PDF is read, and computed from the cached text
+    for the texts cached before.
+    """
+    if not filepath.lower().endswith(".pdf"):
+        return None
+    offsets = cached(filepath, limited("pdf-page-offsets"), 1, pdf_page_starts, failed=None)
+    return json.loads(offsets) if offsets is not None else None
+
+
+def pdf_page_starts(filepath):
+    text = extract(filepath)
+    if not text:
+        raise ValueError("text extraction failed")
+    return json.dumps(page_starts(text))
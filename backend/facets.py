@@ -0,0 +1,202 @@
+"""
+Facets of the indexed documents: file type, size, month, page count.
+
+Each document gets its facet values when it is indexed (stat of the file,
+page count through the extraction cache). For every (facet, value) the
+FacetIndex keeps a bitset of doc ids (a Python int, bit i = DOC_IDS id i),
+so that for a query:
+
+- filters : OR of the selected values of a facet, AND across facets, then
+            AND with the hits (converted to a bitset once) before scoring,
+            instead of checking the documents of a long hit list one by one
+- counts  : popcount of (hits AND value) for every value; a facet is
+            counted with the filters of the *other* facets only, so that
+            the alternatives to a selected value keep their counts
+
+numpy is only used to convert between bitsets and sorted doc ids faster.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import defaultdict
+
+import extraction_cache
+from postings import PostingList
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FACETS = ("type", "size", "month", "pages")
+KB = 1024
+# (upper bound excluded, label)
+SIZE_BUCKETS = ((100 * KB, "0-100KB"), (KB * KB, "100KB-1MB"), (10 * KB * KB, "1MB-10MB"), (None, "10MB+"))
+# (upper bound included, label)
+PAGE_BUCKETS = ((1, "1"), (10, "2-10"), (50, "11-50"), (None, "50+"))
+
+
+# -------------------------- METADATA --------------------------
+def bucket(value, buckets, inclusive=False):
+    for bound, label in buckets:
+        if bound is None or value < bound or (inclusive and value == bound):
+            return label
+
+
+def metadata(filepath):
+    """{facet: value} of a file (no "pages" when it is unknown, e.g. .txt)."""
+    stat = os.stat(filepath)
+    values = {
+        "type": os.path.splitext(filepath)[1].lstrip(".").lower(),
+        "size": bucket(stat.st_size, SIZE_BUCKETS),
+        # Month the file was added / last modified in the documents folder
+        "month": time.strftime("%Y-%m", time.localtime(stat.st_mtime)),
+    }
+    pages = extraction_cache.page_count(filepath)
+    if pages:
+        values["pages"] = bucket(pages, PAGE_BUCKETS, inclusive=True)
+    return values
+
+
+# -------------------------- BITSETS --------------------------
+def to_bits(ids):
+    """Bitset (int) of an iterable of doc ids."""
+    if np is not None:
+        if isinstance(ids, array) and ids.itemsize == 4:
+            values = np.frombuffer(ids, dtype=np.uint32)
+        else:
+            values = np.fromiter(ids, dtype=np.uint32)
+        if not len(values):
+            return 0
+        mask = np.zeros(int(values.max()) + 1, dtype=bool)
+        mask[values] = True
+        return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+    data = bytearray()
+    for doc_id in ids:
+        byte = doc_id >> 3
+        if byte >= len(data):
+            data.extend(bytes(byte + 1 - len(data)))
+        data[byte] |= 1 << (doc_id & 7)
+    return int.from_bytes(data, "little")
+
+
+def to_ids(bits):
+    """Sorted doc ids (array('I')) of a bitset."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    if np is not None:
+        ids = np.flatnonzero(np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little"))
+        return array("I", ids.astype(np.uint32).tobytes())
+    return array("I", [
+        (byte << 3) | bit
+        for byte, value in enumerate(data) if value
+        for bit in range(8) if value & (1 << bit)
+    ])
+
+
+def popcount(bits):
+    return bits.bit_count() if hasattr(bits, "bit_count") else bin(bits).count("1")
+
+
+# -------------------------- INDEX --------------------------
+class FacetIndex:
+    """(facet, value) -> bitset of the doc ids having that value."""
+
+    def __init__(self):
+        self.bits = defaultdict(dict)        # facet -> {value: bitset}
+        self.values = {}                     # doc id -> {facet: value}
+        self.lock = threading.Lock()
+
+    def index_files(self, doc_ids, directory, filenames):
+        """Read the metadata of `filenames` and add them (ids from `doc_ids`)."""
+        found = {}
+        for filename in filenames:
+            try:
+                found[doc_ids.add(filename)] = metadata(os.path.join(directory, filename))
+            except OSError:
+                pass
+        self.add_many(found)
+
+    def add_many(self, documents):
+        """Set the values of {doc id: {facet: value}} (replacing previous ones)."""
+        ids = defaultdict(list)
+        for doc_id, values in documents.items():
+            for facet, value in values.items():
+                ids[facet, value].append(doc_id)
+        with self.lock:
+            for doc_id in documents:
+                self._remove(doc_id)
+            self.values.update(documents)
+            for (facet, value), members in ids.items():
+                self.bits[facet][value] = self.bits[facet].get(value, 0) | to_bits(members)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        values = self.values.pop(doc_id, None)
+        if not values:
+            return
+        for facet, value in values.items():
+            bits = self.bits[facet].get(value, 0) & ~(1 << doc_id)
+            if bits:
+                self.bits[facet][value] = bits
+            else:
+                self.bits[facet].pop(value, None)
+
+    def _mask(self, filters, skip=None):
+        """Bitset of the documents passing `filters` (None = no restriction)."""
+        mask = None
+        for facet, selected in filters.items():
+            if facet == skip:
+                continue
+            values = self.bits.get(facet, {})
+            allowed = 0
+            for value in selected:
+                allowed |= values.get(value, 0)
+            mask = allowed if mask is None else mask & allowed
+        return mask
+
+    def apply(self, hits, filters=None):
+        """
+        (PostingList of the hits passing `filters`, facet counts).
+        `filters` is {facet: [accepted values]}.
+        """
+        filters = {f: v for f, v in (filters or {}).items() if v}
+        hit_bits = to_bits(hits.ids)
+        with self.lock:
+            counts = {}
+            for facet in FACETS:
+                base = self._mask(filters, skip=facet)
+                base = hit_bits if base is None else hit_bits & base
+                counts[facet] = {
+                    value: n for value, n in sorted(
+                        (value, popcount(base & bits)) for value, bits in self.bits.get(facet, {}).items()
+                    ) if n
+                }
+            mask = self._mask(filters)
+        if mask is None:
+            return hits, counts
+        return PostingList(to_ids(hit_bits & mask)), counts
+
+
+def merge_counts(all_counts):
+    """Sum of the facet counts of several shards."""
+    total = {facet: defaultdict(int) for facet in FACETS}
+    for counts in all_counts:
+        for facet, values in counts.items():
+            for value, n in values.items():
+                total[facet][value] += n
+    return {facet: dict(sorted(values.items())) for facet, values in total.items()}
+
+
+def parse_filters(**params):
+    """{facet: [values]} from query parameters (repeated or comma-separated)."""
+    filters = {}
+    for facet, values in params.items():
+        if values is not None:
+            filters[facet] = [v.strip().lower() if facet == "type" else v.strip()
+                              for value in values for v in value.split(",") if v.strip()]
+    return filters
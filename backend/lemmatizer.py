@@ -0,0 +1,51 @@
+"""
+French lemmatization shared by the API (search_engine.py, named
+collections) and the reindex worker (reindex_jobs.py).
+
+The spaCy model is loaded on first use, once per process: importing the
+module loads nothing, so the worker and the dashboard pay for the model
+only when they lemmatize.
+"""
+import re
+import threading
+
+MODEL = "fr_core_news_sm"
+# Words of a text, before lemmatization
+WORD_PATTERN = re.compile(r"[a-zA-ZÀ-ÿ'-]+")
+
+_nlp = None
+_load_lock = threading.Lock()
+
+
+def model():
+    """The spaCy French pipeline, loaded on the first call."""
+    global _nlp
+    if _nlp is None:
+        with _load_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load(MODEL)
+    return _nlp
+
+
+def lemmatisation(text: str):
+    """
+    Lemmas of a French text, unfiltered:
+    - lowercase
+    - extract alphabetic tokens
+    - lemmatization (infinitive form)
+    Stopwords and short words are filtered afterwards (see token_filters.py),
+    so changing them does not require lemmatizing the corpus again.
+    """
+    # Extract only alphabetic words
+    tokens = WORD_PATTERN.findall(text.lower())
+    if not tokens:
+        return []
+
+    # Join tokens back so spaCy can process them
+    lemmas = []
+    for token in model()(" ".join(tokens)):
+        lemma = token.lemma_.lower().strip()
+        if lemma and lemma.isalpha():
+            lemmas.append(lemma)
+    return lemmas
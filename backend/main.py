@@ -1,17 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Query
-from search_engine import CORPUS, FREQS, INDEX, recherche
+from search_engine import CORPUS, FREQS, INDEX, DOC_IDS, recherche
 
 from fastapi import HTTPException
 import os
-from search_engine import CORPUS, FREQS, INDEX, recherche
 
 from fastapi.responses import FileResponse
 
 import os
 from fastapi import Query
-from fastapi.responses import JSONResponse
 
 
 import sqlite3
@@ -21,15 +19,43 @@ from fastapi import FastAPI
 import sqlite3
 import difflib
 
-import Levenshtein
-
 import re
 import unicodedata
+import bisect
+
+import hmac
+import threading
+import time
+from typing import Dict, List, Optional, Union
+from fastapi import Header, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+import metrics
+import named_collections
+import profiling
+import scoring
+import shards
+import tombstones
+import paths
+import raw_files
+import extraction_cache
+import search_engine
+import facets
+import token_filters
+import ngrams
+import wildcards
+import similarity
+import response_encoding
+import query_log
+from response_encoding import FastJSONResponse
+from postings import EMPTY
 
 app = FastAPI(
     title="DocuFind API",
     description="Backend API for the document search engine",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 # ---------- CORS (to allow React frontend later) -----------
@@ -41,8 +67,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------- gzip / br for large JSON and NDJSON bodies (see response_encoding.py) -----------
+app.add_middleware(response_encoding.CompressionMiddleware)
+
+
+# ---------- Metrics + Server-Timing (see metrics.py) -----------
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    stages = metrics.collect_stages()
+    query_entry = query_log.collect()
+    start = time.perf_counter()
+
+    response = await call_next(request)
+
+    total = time.perf_counter() - start
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.REQUESTS.inc(route=route, status=response.status_code)
+    metrics.REQUEST_SECONDS.observe(total, route=route)
+    metrics.finish_stages(stages)
+    # Search requests only (see query_log.py)
+    query_log.record(query_entry, stages, total, response.status_code, search_engine.GENERATION)
+
+    # Per-stage breakdown visible in the browser devtools (Network > Timing)
+    response.headers["Server-Timing"] = metrics.server_timing(stages, total)
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
 
-DOCS_DIR = "Documents"  # folder where files are stored
+
+DOCS_DIR = paths.DOCUMENTS_DIR  # folder where files are stored (resolved once, see paths.py)
 
 def clean_text(text: str) -> str:
     """
@@ -85,25 +137,15 @@ def extract_snippet(filepath: str, max_chars: int = 200):
         with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
             raw_text = f.read(max_chars)
 
-    # DOCX
-    elif filepath.lower().endswith(".docx"):
-        import docx
-        doc = docx.Document(filepath)
-        full_text = " ".join([p.text for p in doc.paragraphs])
-        raw_text = full_text[:max_chars]
-
-    # PDF
-    elif filepath.lower().endswith(".pdf"):
-        import PyPDF2
-        try:
-            pdf = PyPDF2.PdfReader(filepath)
-            text = pdf.pages[0].extract_text() or ""
-            raw_text = text[:max_chars]
-        except:
-            return "PDF preview not available"
-
+    # DOCX / PDF : text parsed once per file version (see extraction_cache.py)
     else:
-        return "No preview available"
+        try:
+            text = extraction_cache.extract(filepath)
+        except OSError:
+            return "Preview not available"
+        if text is None:
+            return "No preview available"
+        raw_text = text[:max_chars]
 
     # CLEAN + NORMALIZE → RETURN SNIPPET
     return clean_text(raw_text)
@@ -115,34 +157,208 @@ def ping():
 
 
 @app.get("/search")
-def search(query: str = Query(..., min_length=1)):
+def search(
+    query: str = Query(..., min_length=1),
+    limit: Optional[int] = None,
+    match: str = "exact",
+    collapse: bool = False,
+    filetype: Optional[List[str]] = Query(None, alias="type"),
+    size: Optional[List[str]] = Query(None),
+    month: Optional[List[str]] = Query(None),
+    pages: Optional[List[str]] = Query(None),
+    stream: bool = False,
+    profile: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
     """
-    Return enriched search results:
-    - filename
-    - snippet
-    - score (ranking indicator)
-    - path
+    Return enriched search results (see run_search).
+    limit=k only keeps (and builds snippets for) the k best documents.
+    match=accents / substring / fuzzy also matches the index terms equal
+    without accents / containing the word / within a few typos of it
+    (trigram index, see ngrams.py). Words with * or ? are wildcards
+    (see wildcards.py). The terms used are returned in "expansions".
+    collapse=true keeps only the best ranked document of each group of
+    near-duplicates, the others being listed in its "duplicates"
+    (see near_duplicates.py).
+    type=pdf, size=1MB-10MB, month=2024-06, pages=2-10 (repeated or
+    comma-separated) only keep the documents with one of these values
+    for each facet given; the facet counts of the hits are returned in
+    "facets" (see facets.py).
+    stream=true answers in NDJSON: a first line with the query, total,
+    facets (and expansions), then one line per result as soon as its
+    snippet is ready, then {"count": n}.
+    profile=1 (sampling, flamegraph) or profile=cprofile captures a profile
+    of this request when allowed (see profiling.py); its file name is
+    returned in the X-Profile header. Not with stream=true: the snippets
+    are extracted after the headers are sent, on other threads.
     """
+    if profile and not profiling.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    if profile and stream:
+        raise HTTPException(status_code=400, detail="profile cannot be combined with stream=true")
+    if match not in MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"match must be one of {', '.join(MATCH_MODES)}")
+
+    with profiling.unit_of_work("search", query, mode=profile,
+                                stages=metrics.current_stages()) as prof:
+        filters = facets.parse_filters(type=filetype, size=size, month=month, pages=pages)
+        query_log.annotate(endpoint="/search", query=query_log.normalize(query), params={
+            "limit": limit, "match": match, "collapse": collapse, "filters": filters, "stream": stream,
+        })
+        if stream:
+            response = stream_search(query, limit, match, collapse, filters)
+        else:
+            response = run_search(query, limit, match, collapse, filters)
 
-    # Get list of filenames from the existing search
-    filenames = recherche(query, INDEX)
-    terms = query.lower().split()
+    if prof.path:
+        response.headers["X-Profile"] = os.path.basename(prof.path)
+    return response
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    results = []
+# ---------- Term dictionaries: trigrams (ngrams.py), sorted terms (wildcards.py) -----------
+MATCH_MODES = ("exact", "accents", "substring", "fuzzy")
+# Index terms a query word can expand to (most frequent / closest first)
+MAX_EXPANSIONS = int(os.environ.get("DOCUFIND_MAX_EXPANSIONS", "20"))
+# Index terms a wildcard ("neuro*") can expand to (most frequent first)
+MAX_WILDCARD_TERMS = int(os.environ.get("DOCUFIND_MAX_WILDCARD_TERMS", "50"))
+TRIGRAMS = ngrams.TrigramIndex()
+TERMS = wildcards.TermDictionary()
+TERMS_GENERATION = None
+_terms_lock = threading.Lock()
+
+
+def update_term_dictionaries():
+    """Add the terms of new segments to TRIGRAMS and TERMS (once per index generation)."""
+    global TERMS_GENERATION
+    with _terms_lock:
+        if TERMS_GENERATION != search_engine.GENERATION:
+            TERMS_GENERATION = search_engine.GENERATION
+            vocabulary = list(SHARDS.df if SHARDS is not None else INDEX)
+            with metrics.timed("term_dictionaries"):
+                TRIGRAMS.add(vocabulary)
+                TERMS.add(vocabulary)
 
-    for filename in filenames:
 
+def get_trigrams():
+    update_term_dictionaries()
+    return TRIGRAMS
+
+
+def get_terms():
+    update_term_dictionaries()
+    return TERMS
+
+
+def document_frequency(term):
+    if SHARDS is not None:
+        return SHARDS.df.get(term, 0)
+    return len(INDEX.get(term, EMPTY))
+
+
+def term_context(collection=None):
+    """(trigrams, terms, document_frequency, token filter) of the default index or of a collection."""
+    if collection is None:
+        return get_trigrams(), get_terms(), document_frequency, token_filters.current()
+    trigrams, terms = collection.term_dictionaries()
+    return trigrams, terms, collection.document_frequency, collection.token_filter()
+
+
+def expand_wildcards(words, collection=None):
+    """{pattern: [its most frequent matching index terms]} for the wildcard words."""
+    trigrams, terms, document_frequency, token_filter = term_context(collection)
+    keep = token_filter.keep
+    return {
+        word: [t for t in terms.expand(word, document_frequency, MAX_WILDCARD_TERMS,
+                                       substring=trigrams.substring) if keep(t)]
+        for word in words if wildcards.is_pattern(word)
+    }
+
+
+def expand_terms(words, match, collection=None):
+    """{word: [index terms it matches]} for the accents / substring / fuzzy modes."""
+    trigrams, _, document_frequency, token_filter = term_context(collection)
+    keep = token_filter.keep
+    expansions = {}
+    for word in words:
+        if not keep(word) or wildcards.is_pattern(word):
+            continue
+        if match == "fuzzy":
+            # Closest first, then the most frequent
+            found = trigrams.fuzzy(word)
+            found.sort(key=lambda m: (m[1], -document_frequency(m[0])))
+            terms = [t for t, _ in found]
+        else:
+            terms = trigrams.accent_insensitive(word) if match == "accents" else trigrams.substring(word)
+            terms.sort(key=lambda t: -document_frequency(t))
+        expansions[word] = [t for t in terms if keep(t)][:MAX_EXPANSIONS]
+    return expansions
+
+
+# ---------- Ranking (see scoring.py) -----------
+SCORING_WEIGHTING = os.environ.get("DOCUFIND_SCORING", "count")
+SCORER = None
+SCORER_GENERATION = None
+_scorer_lock = threading.Lock()
+
+
+def build_scorer():
+    """
+    Scoring matrix of the current generation, from FREQS: the lemma counts
+    INDEX and the shards are built from, so documents added by refresh()
+    are ranked with their current counts.
+    """
+    global SCORER, SCORER_GENERATION
+    with _scorer_lock:
+        generation = search_engine.GENERATION
+        if SCORER is not None and SCORER_GENERATION == generation:
+            return
+        with search_engine._refresh_lock:
+            freqs = dict(FREQS)
+        # Stopwords are dropped from the query terms: unfiltered counts rank the same
+        with metrics.timed("scorer_build"):
+            matrix = scoring.ScoringMatrix.from_freqs(freqs, DOC_IDS, SCORING_WEIGHTING)
+        SCORER, SCORER_GENERATION = matrix, generation
+
+
+def get_scorer():
+    """
+    Sparse term-document matrix used to rank hits (see build_scorer).
+    Only the first build is waited for: after an index change the new
+    matrix is built in a background thread while the previous one serves.
+    None when numpy / scipy are not installed.
+    """
+    if not scoring.available():
+        return None
+    if SCORER is None:
+        build_scorer()
+    elif SCORER_GENERATION != search_engine.GENERATION and not _scorer_lock.locked():
+        threading.Thread(target=build_scorer, daemon=True, name="docufind-scorer").start()
+    return SCORER
+
+
+@app.on_event("startup")
+def start_scorer():
+    if scoring.available() and not search_engine.SHARDED:
+        threading.Thread(target=build_scorer, daemon=True, name="docufind-scorer").start()
+
+
+def sql_rank(filenames, terms, limit=None, conn=None):
+    """Historical per-hit scoring: one SQL query per (document, term)."""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    ranked = []
+    for filename in filenames:
         # ---- 1️ GET DOCUMENT ID
-        cursor.execute("SELECT id, content FROM documents WHERE filename = ?", (filename,))
+        cursor.execute("SELECT id FROM documents WHERE filename = ?", (filename,))
         row = cursor.fetchone()
 
         if not row:
             continue
 
-        doc_id, content = row
+        doc_id = row[0]
 
         # ---- 2️ CALCULATE SCORE BASED ON FREQUENCY OF SEARCH TERMS
         score = 0
@@ -155,54 +371,705 @@ def search(query: str = Query(..., min_length=1)):
             if freq:
                 score += freq[0]
 
-        # ---- 3️ Extract snippet
-        filepath = os.path.join(DOCS_DIR, filename)
-        snippet = extract_snippet(filepath)
+        ranked.append((filename, score))
 
-        # ---- 4️ Package results
-        results.append({
-            "filename": filename,
-            "snippet": snippet,
-            "path": f"/raw/{filename}",
-            "score": score
-        })
+    if own_conn:
+        conn.close()
 
-    conn.close()
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    return ranked[:limit] if limit else ranked
+
+
+_scorer_changes = None       # (matrix, generation, scoring.Changes)
+
+
+def scorer_changes(scorer):
+    """
+    Documents re-indexed since `scorer` was built (scoring.Changes), None
+    when it is current: while the next matrix is built they are ranked
+    from their counts in FREQS rather than dropped or ranked stale.
+    """
+    global _scorer_changes
+    generation = search_engine.GENERATION
+    if scorer is SCORER and SCORER_GENERATION == generation:
+        return None
+    cached = _scorer_changes
+    if cached is None or cached[0] is not scorer or cached[1] != generation:
+        # list() of the items is one C call: no refresh() can interleave
+        cached = _scorer_changes = (scorer, generation, scoring.Changes(scorer, list(FREQS.items()), DOC_IDS))
+    return cached[2]
+
+
+def rank_hits(hits, terms, limit=None):
+    """[(filename, score)] of the boolean hits, best first."""
+    scorer = get_scorer()
+    if scorer is None:
+        return sql_rank(DOC_IDS.filenames(hits), terms, limit)
+
+    ids, scores = scorer.rank(terms, hits, k=limit, changes=scorer_changes(scorer))
+    return list(zip(DOC_IDS.filenames(ids.tolist()), scores.tolist()))
+
+
+def rank_batch(hits_list, terms_list, limits):
+    """rank_hits() of several queries: one sparse product (or one SQLite connection)."""
+    scorer = get_scorer()
+    if scorer is None:
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            return [sql_rank(DOC_IDS.filenames(hits), terms, limit, conn)
+                    for hits, terms, limit in zip(hits_list, terms_list, limits)]
+        finally:
+            conn.close()
+
+    ranked = scorer.rank_batch(terms_list, hits_list, k=limits, changes=scorer_changes(scorer))
+    return [list(zip(DOC_IDS.filenames(ids.tolist()), scores.tolist())) for ids, scores in ranked]
+
+
+# ---------- Passage ranking (see passages.py) -----------
+PASSAGE_MATRIX = None
+PASSAGE_GENERATION = None
+_passages_building = threading.Lock()
+
+
+def build_passage_matrix():
+    """Passage x term matrix of the current generation (background thread)."""
+    global PASSAGE_MATRIX, PASSAGE_GENERATION
+    if not _passages_building.acquire(blocking=False):
+        return
+    try:
+        generation = search_engine.GENERATION
+        with metrics.timed("passages_build"):
+            matrix = search_engine.PASSAGES.matrix(DOC_IDS, SCORING_WEIGHTING)
+        PASSAGE_MATRIX, PASSAGE_GENERATION = matrix, generation
+    except Exception as e:
+        print(f" Passage matrix failed: {e}")
+    finally:
+        _passages_building.release()
+
+
+def get_passage_matrix():
+    """
+    Passage x term matrix of the current generation, None unless
+    DOCUFIND_PASSAGES=1 (not sharded, numpy / scipy installed). While the
+    matrix of a new generation is being built, None: the documents are
+    ranked as a whole rather than without the new ones.
+    """
+    if search_engine.PASSAGES is None:
+        return None
+    if PASSAGE_GENERATION != search_engine.GENERATION:
+        if not _passages_building.locked():
+            threading.Thread(target=build_passage_matrix, daemon=True, name="docufind-passages").start()
+        return None
+    return PASSAGE_MATRIX
+
+
+@app.on_event("startup")
+def start_passages():
+    if search_engine.PASSAGES is not None:
+        threading.Thread(target=build_passage_matrix, daemon=True, name="docufind-passages").start()
+
+
+def rank_passages(hits_list, terms_list, limits):
+    """
+    rank_batch() in passage mode: [(ranked (filename, score), {filename:
+    (start, end, page) of its best passage})] per query.
+    """
+    matrix = PASSAGE_MATRIX
+    answers = []
+    for ids, scores, best in matrix.rank_batch(terms_list, hits_list, limits):
+        filenames = DOC_IDS.filenames(ids.tolist())
+        spans = {f: matrix.span(p) for f, p in zip(filenames, best.tolist()) if p >= 0}
+        answers.append((list(zip(filenames, scores.tolist())), spans))
+    return answers
+
+
+# ---------- Sharded index (see shards.py) -----------
+# Set on startup when DOCUFIND_SHARDS > 1 or DOCUFIND_SHARD_ADDRESSES is set
+SHARDS = None
+
+
+@app.on_event("startup")
+def start_shards():
+    global SHARDS
+    if search_engine.SHARDED:
+        SHARDS = shards.coordinator()
+        metrics.INDEX_DOCUMENTS.set(SHARDS.total_docs)
+        metrics.INDEX_TERMS.set(len(SHARDS.df))
+        metrics.INDEX_POSTINGS.set(sum(SHARDS.df.values()))
+        print(f"✔️ {len(SHARDS.connections)} shards ready ({SHARDS.total_docs} documents)")
+
+
+@app.on_event("shutdown")
+def stop_shards():
+    if SHARDS is not None:
+        SHARDS.close()
 
-    # ---- 5️ Sort results by score DESC
-    results = sorted(results, key=lambda x: x["score"], reverse=True)
 
+# ---------- Incremental indexing (see segments.py) -----------
+# Scan the documents folder every N seconds (0 = only POST /index/refresh)
+REFRESH_SECONDS = float(os.environ.get("DOCUFIND_REFRESH_SECONDS", "0"))
+
+
+def refresh_loop():
+    while True:
+        time.sleep(REFRESH_SECONDS)
+        try:
+            search_engine.refresh()
+        except Exception as e:
+            print(f" Refresh failed: {e}")
+
+
+@app.on_event("startup")
+def start_refresh():
+    if REFRESH_SECONDS > 0 and not search_engine.SHARDED:
+        threading.Thread(target=refresh_loop, daemon=True, name="docufind-refresh").start()
+
+
+def require_admin(x_admin_token: Optional[str]):
+    """Index maintenance endpoints need X-Admin-Token when DOCUFIND_ADMIN_TOKEN is set."""
+    token = profiling.ADMIN_TOKEN
+    if token and not (isinstance(x_admin_token, str) and hmac.compare_digest(x_admin_token, token)):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.post("/index/refresh")
+def refresh_index(x_admin_token: Optional[str] = Header(None)):
+    """Index new / modified documents and drop removed ones, without a rebuild."""
+    require_admin(x_admin_token)
+    if search_engine.SHARDED:
+        raise HTTPException(status_code=409, detail="Not available with a sharded index")
+    indexed, removed = search_engine.refresh()
+    return {"indexed": indexed, "removed": removed, "generation": search_engine.GENERATION}
+
+
+@app.get("/index/segments")
+def index_segments():
+    if search_engine.SHARDED:
+        raise HTTPException(status_code=409, detail="Not available with a sharded index")
     return {
-        "query": query,
-        "count": len(results),
-        "results": results
+        "generation": search_engine.GENERATION,
+        "documents": INDEX.live_documents(),
+        "segments": INDEX.describe(),
     }
 
+
+# ---------- Deletions made from the admin dashboard (see tombstones.py) -----------
+TOMBSTONES = None
+
+
+def apply_tombstone(filename):
+    search_engine.delete_document(filename)
+    if SHARDS is not None:
+        SHARDS.delete(filename)
+
+
+@app.on_event("startup")
+def watch_tombstones():
+    global TOMBSTONES
+    TOMBSTONES = tombstones.TombstoneWatcher(DB_PATH, apply_tombstone)
+
+
+def analyze_query(query: str, match: str = "exact", cache: Optional[dict] = None, collection=None):
+    """
+    (expansions, terms) of a query: what its wildcard / match= words expand
+    to (None when there is nothing to expand) and the terms it is scored
+    with. `cache` ({(word, match): terms}) shares the expansions between
+    the queries of a batch. `collection`: a named collection instead of
+    the default index (see named_collections.py).
+    """
+    # Stopwords / short words neither match nor score (see token_filters.py)
+    words = query.lower().split()
+    expansions = None
+    if match != "exact" or any(wildcards.is_pattern(w) for w in words):
+        with metrics.timed("expansion"):
+            words_to_expand = [w for w in words if w not in ("et", "ou")]
+            cache = {} if cache is None else cache
+            missing = [w for w in dict.fromkeys(words_to_expand) if (w, match) not in cache]
+            found = expand_wildcards(missing, collection)
+            if match != "exact":
+                found.update(expand_terms(missing, match, collection))
+            for word in missing:
+                cache[word, match] = found.get(word)
+            expansions = {w: cache[w, match] for w in words_to_expand if cache[w, match] is not None}
+        words = [t for w in words for t in expansions.get(w, [w])]
+    token_filter = token_filters.current() if collection is None else collection.token_filter()
+    return expansions, token_filter.terms(words)
+
+
+def poll_tombstones():
+    # Documents deleted from the dashboard since the last request
+    if TOMBSTONES is not None:
+        with metrics.timed("tombstones"):
+            TOMBSTONES.poll()
+
+
+def ranking_limits(limit: Optional[int], collapse: bool):
+    """(k, documents to rank, near-duplicate index or None)."""
+    k = limit if limit and limit > 0 else None
+    # Near-duplicates are collapsed after ranking: rank enough extra documents
+    duplicates = search_engine.DUPLICATES if collapse else None
+    k_ranked = k + duplicates.redundant() if duplicates is not None and k else k
+    return k, k_ranked, duplicates
+
+
+def retrieve(query: str, expansions=None, filters=None, index=None):
+    """(PostingList of the hits, facet counts) on the in-memory index."""
+    # Boolean retrieval on the in-memory index
+    with metrics.timed("recherche"):
+        hits = recherche(query, INDEX if index is None else index, expansions)
+
+    # Facet filters as bitset intersections, before scoring
+    with metrics.timed("facets"):
+        return search_engine.FACET_INDEX.apply(hits, filters)
+
+
+def match_words(query: str, expansions=None):
+    """Words whose first occurrence locates the snippet of a PDF (query words and their expansions)."""
+    words = [w for w in query.lower().split() if w not in ("et", "ou") and not wildcards.is_pattern(w)]
+    for terms in (expansions or {}).values():
+        words.extend(terms)
+    return tuple(dict.fromkeys(w for w in words if len(w) > 1))
+
+
+def pdf_passage(filepath: str, words, max_chars: int = 200):
+    """
+    (snippet, page) of a PDF: the text around the first occurrence of one
+    of `words` and the number of its page (page offsets, see
+    extraction_cache.py). (None, None) when no word is found.
+    """
+    if not words:
+        return None, None
+    try:
+        text = extraction_cache.extract(filepath)
+        offsets = extraction_cache.page_offsets(filepath)
+    except OSError:
+        return None, None
+    found = re.search(r"\b(?:" + "|".join(re.escape(w) for w in words) + ")", text or "", re.IGNORECASE)
+    if found is None or not offsets:
+        return None, None
+    page = bisect.bisect_right(offsets, found.start())
+    start = max(offsets[page - 1], found.start() - max_chars // 4)
+    end = min(start + max_chars, offsets[page] if page < len(offsets) else len(text))
+    return clean_text(text[start:end]), page
+
+
+def package_results(ranked, k=None, duplicates=None, snippets=True, snippet_cache=None, words=(), spans=None):
+    """
+    Result dicts of the ranked (filename, score): deleted documents and,
+    with `duplicates`, the near-duplicates of a kept document are skipped.
+    `snippet_cache` ({filename: snippet}) is shared by the queries of a batch.
+    PDF results get the page of the first occurrence of `words` (match_words).
+    In passage mode `spans` ({filename: (start, end, page)}) gives the best
+    passage of a document, used as its snippet.
+    """
+    return list(iter_results(ranked, k, duplicates, snippets, snippet_cache, words, spans))
+
+
+def iter_results(ranked, k=None, duplicates=None, snippets=True, snippet_cache=None, words=(), spans=None):
+    """package_results() one result at a time."""
+    count = 0
+    deleted = search_engine.DELETED
+    seen_groups = set()
+
+    for filename, score in ranked:
+        if filename in deleted:
+            continue
+        if k and count >= k:
+            break
+
+        group = duplicates.groups().get(filename) if duplicates is not None else None
+        if group:
+            if group[0] in seen_groups:
+                continue
+            seen_groups.add(group[0])
+
+        # ---- 3️ Package results, with a snippet
+        result = {"filename": filename}
+        page = None
+        if snippets and spans and filename in spans:
+            # Best passage: a slice of the stored text, no extraction
+            with metrics.timed("snippet"):
+                start, end, page = spans[filename]
+                result["snippet"] = clean_text((CORPUS.get(filename) or "")[start:end])
+        elif snippets:
+            with metrics.timed("snippet"):
+                filepath = os.path.join(DOCS_DIR, filename)
+                is_pdf = filename.lower().endswith(".pdf")
+                key = (filename, words) if is_pdf else filename
+                cached = snippet_cache.get(key) if snippet_cache is not None else None
+                if cached is None:
+                    snippet, page = pdf_passage(filepath, words) if is_pdf else (None, None)
+                    if snippet is None:
+                        snippet = extract_snippet(filepath)
+                    cached = (snippet, page)
+                    if snippet_cache is not None:
+                        snippet_cache[key] = cached
+                snippet, page = cached
+            result["snippet"] = snippet
+        result["path"] = f"/raw/{filename}"
+        if page is not None:
+            # The viewer opens /raw/{filename}#page=N
+            result["page"] = page
+        result["score"] = score
+        if group:
+            result["duplicates"] = [f for f in group if f != filename and f not in deleted]
+        count += 1
+        yield result
+
+
+def run_search(query: str, limit: Optional[int] = None, match: str = "exact", collapse: bool = False,
+               filters: Optional[dict] = None):
+    """
+    Return enriched search results:
+    - filename
+    - snippet
+    - score (ranking indicator)
+    - path
+    """
+    summary, ranked, k, duplicates, spans = prepare_search(query, limit, match, collapse, filters)
+    results = package_results(ranked, k, duplicates, words=match_words(query, summary.get("expansions")),
+                              spans=spans)
+    query_log.annotate(count=len(results))
+
+    # ---- 4️ Serialize here so the JSON encoding time is measured too
+    with metrics.timed("serialize"):
+        body = {
+            "query": query,
+            "count": len(results),
+            "total": summary["total"],
+            "results": results,
+            "facets": summary["facets"],
+        }
+        if "expansions" in summary:
+            body["expansions"] = summary["expansions"]
+        response = FastJSONResponse(body)
+    return response
+
+
+def stream_search(query: str, limit: Optional[int] = None, match: str = "exact", collapse: bool = False,
+                  filters: Optional[dict] = None):
+    """run_search() as NDJSON: each result is sent once its snippet is extracted."""
+    summary, ranked, k, duplicates, spans = prepare_search(query, limit, match, collapse, filters)
+
+    def documents():
+        # Snippets are extracted while the response is being sent
+        with metrics.late_stages():
+            yield summary
+            count = 0
+            for result in iter_results(ranked, k, duplicates, words=match_words(query, summary.get("expansions")),
+                                       spans=spans):
+                count += 1
+                yield result
+            yield {"count": count}
+
+    return response_encoding.ndjson(documents())
+
+
+def prepare_search(query: str, limit: Optional[int] = None, match: str = "exact", collapse: bool = False,
+                   filters: Optional[dict] = None):
+    """
+    Everything before the snippets: ({query, total, facets[, expansions]},
+    ranked (filename, score), k, near-duplicate index or None, best
+    passages or None).
+    """
+    expansions, terms = analyze_query(query, match)
+    k, k_ranked, duplicates = ranking_limits(limit, collapse)
+    poll_tombstones()
+    spans = None
+
+    if SHARDS is not None:
+        # Every shard runs recherche + scoring on its documents, top-k merged
+        with metrics.timed("scatter_gather"):
+            total, ranked, facet_counts = SHARDS.search(query, terms, k_ranked, expansions=expansions,
+                                                        filters=filters)
+    else:
+        hits, facet_counts = retrieve(query, expansions, filters)
+        total = len(hits)
+
+        # ---- 1️ + 2️ Score hits by frequency of the search terms, sort DESC
+        with metrics.timed("scoring"):
+            if get_passage_matrix() is not None:
+                ranked, spans = rank_passages([hits], [terms], [k_ranked])[0]
+            else:
+                ranked = rank_hits(hits, terms, k_ranked)
+
+    query_log.annotate(hits=total)
+    summary = {"query": query, "total": total, "facets": facet_counts}
+    if expansions is not None:
+        summary["expansions"] = expansions
+    return summary, ranked, k, duplicates, spans
+
+
+# ---------- Batch search (relevance evaluations, internal tools) -----------
+MAX_BATCH = int(os.environ.get("DOCUFIND_MAX_BATCH", "10000"))
+
+
+class BatchQuery(BaseModel):
+    query: str
+    limit: Optional[int] = None            # batch "limit" when not set
+    match: str = "exact"
+    collapse: bool = False
+    filters: Dict[str, List[str]] = {}     # {"type": ["pdf"], "month": ["2024-06"]}
+
+
+class BatchRequest(BaseModel):
+    queries: List[Union[str, BatchQuery]]
+    limit: Optional[int] = 10
+    snippets: bool = True
+
+
+@app.post("/search/batch")
+def search_batch(request: BatchRequest):
+    """
+    Run many queries in one call (same results as /search for each one).
+    The queries share one pass over the tombstones, the expansions and the
+    posting lists of their common words, one sparse product to score them
+    all (scoring.rank_batch) and the snippets of their common documents.
+    Every query reports its own time ("seconds", scoring excluded); the
+    shared scoring time is "scoring_seconds".
+    snippets=false leaves the snippets out (evaluations only need the
+    ranked filenames).
+    """
+    if len(request.queries) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} queries per batch")
+    items = [q if isinstance(q, BatchQuery) else BatchQuery(query=q) for q in request.queries]
+    for i, item in enumerate(items):
+        if not item.query.strip():
+            raise HTTPException(status_code=400, detail=f"queries[{i}]: empty query")
+        if item.match not in MATCH_MODES:
+            raise HTTPException(status_code=400, detail=f"queries[{i}]: match must be one of {', '.join(MATCH_MODES)}")
+        if set(item.filters) - set(facets.FACETS):
+            raise HTTPException(status_code=400, detail=f"queries[{i}]: facets are {', '.join(facets.FACETS)}")
+
+    query_log.annotate(endpoint="/search/batch", params={
+        "limit": request.limit,
+        "snippets": request.snippets,
+        "queries": [dict(item.model_dump() if hasattr(item, "model_dump") else item.dict(),
+                         query=query_log.normalize(item.query)) for item in items],
+    })
+    start = time.perf_counter()
+    answers, scoring_seconds = run_batch(items, request.limit, request.snippets)
+    query_log.annotate(hits=[a["total"] for a in answers], count=len(answers))
+    with metrics.timed("serialize"):
+        response = FastJSONResponse({
+            "count": len(answers),
+            "seconds": round(time.perf_counter() - start, 6),
+            "scoring_seconds": round(scoring_seconds, 6),
+            "results": answers,
+        })
+    return response
+
+
+def run_batch(items, default_limit=None, snippets=True):
+    """([per-query body], scoring seconds) for a list of BatchQuery."""
+    poll_tombstones()
+    # Posting lists / expansions / snippets fetched once for the whole batch
+    index = search_engine.CachedIndex(INDEX) if SHARDS is None else None
+    expansion_cache = {}
+    snippet_cache = {}
+
+    # ---- Analysis + boolean retrieval of every query
+    prepared = []
+    for item in items:
+        start = time.perf_counter()
+        expansions, terms = analyze_query(item.query, item.match, expansion_cache)
+        limit = item.limit if item.limit is not None else default_limit
+        k, k_ranked, duplicates = ranking_limits(limit, item.collapse)
+        filters = facets.parse_filters(**item.filters)
+
+        if SHARDS is not None:
+            with metrics.timed("scatter_gather"):
+                total, ranked, facet_counts = SHARDS.search(item.query, terms, k_ranked,
+                                                            expansions=expansions, filters=filters)
+            hits = None
+        else:
+            hits, facet_counts = retrieve(item.query, expansions, filters, index)
+            total, ranked = len(hits), None
+        prepared.append({
+            "item": item, "expansions": expansions, "terms": terms, "k": k, "k_ranked": k_ranked,
+            "duplicates": duplicates, "hits": hits, "total": total, "ranked": ranked,
+            "facets": facet_counts, "spans": None, "seconds": time.perf_counter() - start,
+        })
+
+    # ---- Scoring of all the queries at once
+    start = time.perf_counter()
+    if SHARDS is None and prepared:
+        with metrics.timed("scoring"):
+            arguments = ([p["hits"] for p in prepared], [p["terms"] for p in prepared],
+                         [p["k_ranked"] for p in prepared])
+            if get_passage_matrix() is not None:
+                rankings = rank_passages(*arguments)
+            else:
+                rankings = [(ranked, None) for ranked in rank_batch(*arguments)]
+        for p, (ranked, spans) in zip(prepared, rankings):
+            p["ranked"], p["spans"] = ranked, spans
+    scoring_seconds = time.perf_counter() - start
+
+    # ---- Results of each query
+    answers = []
+    for p in prepared:
+        start = time.perf_counter()
+        results = package_results(p["ranked"], p["k"], p["duplicates"], snippets, snippet_cache,
+                                  match_words(p["item"].query, p["expansions"]), p["spans"])
+        answer = {
+            "query": p["item"].query,
+            "count": len(results),
+            "total": p["total"],
+            "results": results,
+            "facets": p["facets"],
+        }
+        if p["expansions"] is not None:
+            answer["expansions"] = p["expansions"]
+        answer["seconds"] = round(p["seconds"] + time.perf_counter() - start, 6)
+        answers.append(answer)
+    return answers, scoring_seconds
+
+
+# --- Prometheus metrics ---
+@app.get("/metrics")
+def prometheus_metrics():
+    # Throughput of the last reindex launched from the admin dashboard
+    conn = sqlite3.connect(DB_PATH)
+    run = metrics.last_indexing_run(conn)
+    conn.close()
+    if run and run["seconds"]:
+        metrics.DOCS_PER_SECOND.set(run["documents"] / run["seconds"], source="admin")
+    if COLLECTIONS is not None:
+        COLLECTIONS.publish_metrics()
+
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- Profiles (see profiling.py) ---
+def require_profiling(x_admin_token: Optional[str]):
+    if not profiling.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+
+
+@app.get("/profiles/slowest")
+def slowest_requests(x_admin_token: Optional[str] = Header(None)):
+    require_profiling(x_admin_token)
+    return {"keep": profiling.SLOWEST_KEEP, "requests": profiling.slowest()}
+
+
+@app.get("/profiles/slowest/{record_id}")
+def slowest_request_profile(record_id: str, x_admin_token: Optional[str] = Header(None)):
+    require_profiling(x_admin_token)
+    stacks = profiling.slowest_stacks(record_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(stacks)
+
+
+@app.get("/profiles/{name}")
+def profile_file(name: str, x_admin_token: Optional[str] = Header(None)):
+    require_profiling(x_admin_token)
+    path = os.path.join(profiling.PROFILE_DIR, os.path.basename(name))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path)
+
+
 # --- Root endpoint (optional welcome) ---
 @app.get("/")
 def root():
     return {
         "app": "DocuFind API",
-        "endpoints": ["/ping", "/docs", "/redoc"],
+        "endpoints": ["/ping", "/docs", "/redoc", "/metrics"],
         "message": "Backend ready to receive search, document, and cloud requests.",
     }
 
-@app.get("/document/{filename}")
-def get_document(filename: str):
-    if filename not in CORPUS:
+# ---------- Similar documents (see similarity.py) -----------
+SIMILAR = None
+SIMILAR_GENERATION = None
+_similar_building = threading.Lock()
+
+
+def build_similar():
+    """Neighbour table of the current generation (background thread)."""
+    global SIMILAR, SIMILAR_GENERATION
+    if not _similar_building.acquire(blocking=False):
+        return
+    try:
+        generation = search_engine.GENERATION
+        with search_engine._refresh_lock:
+            freqs = dict(FREQS)
+        with metrics.timed("similar_build"):
+            SIMILAR = similarity.SimilarDocuments.build(freqs, token_filters.current().keep)
+        SIMILAR_GENERATION = generation
+    except Exception as e:
+        print(f" Similar documents table failed: {e}")
+    finally:
+        _similar_building.release()
+
+
+@app.on_event("startup")
+def start_similar():
+    if similarity.available() and not search_engine.SHARDED:
+        threading.Thread(target=build_similar, daemon=True, name="docufind-similar").start()
+
+
+@app.get("/similar/{filename}")
+def similar_documents(filename: str, limit: int = Query(10, ge=1, le=similarity.NEIGHBOURS)):
+    """
+    Documents closest to `filename` (cosine of TF-IDF / LSA vectors),
+    read from the neighbour table precomputed after each index change.
+    """
+    if not similarity.available():
+        raise HTTPException(status_code=501, detail="numpy / scipy are required")
+    if search_engine.SHARDED:
+        raise HTTPException(status_code=409, detail="Not available with a sharded index")
+
+    if SIMILAR_GENERATION != search_engine.GENERATION:
+        # New documents: recomputed in the background, the previous table serves meanwhile
+        threading.Thread(target=build_similar, daemon=True, name="docufind-similar").start()
+    if SIMILAR is None:
+        raise HTTPException(status_code=503, detail="Similar documents are being computed")
+
+    with metrics.timed("similar"):
+        neighbours = SIMILAR.similar(filename, limit, exclude=search_engine.DELETED)
+    if neighbours is None or filename in search_engine.DELETED:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    content = CORPUS[filename]
+    results = []
+    for name, score in neighbours:
+        with metrics.timed("snippet"):
+            snippet = extract_snippet(os.path.join(DOCS_DIR, name))
+        results.append({
+            "filename": name,
+            "snippet": snippet,
+            "path": f"/raw/{name}",
+            "score": round(score, 4),
+        })
+    return {"filename": filename, "count": len(results), "results": results}
+
+
+@app.get("/document/{filename}")
+def get_document(filename: str, page: Optional[int] = Query(None, ge=1)):
+    content = SHARDS.document(filename) if SHARDS is not None else CORPUS.get(filename)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found")
 
     # A small snippet preview
     snippet = content[:500] + "..." if len(content) > 500 else content
 
-    return {
+    body = {
         "filename": filename,
         "snippet": snippet,
         "full_content": content if filename.endswith(".txt") else None,
         "message": "Use frontend viewer for PDF/DOCX full display"
     }
+    if filename.lower().endswith(".pdf"):
+        # Pages are separated by form feeds in the extracted text (extraction_cache.py)
+        starts = extraction_cache.page_starts(content)
+        body["pages"] = len(starts)
+        if page is not None:
+            if page > len(starts):
+                raise HTTPException(status_code=404, detail="Page not found")
+            end = starts[page] if page < len(starts) else len(content)
+            body["page"] = page
+            body["page_content"] = content[starts[page - 1]:end].rstrip(extraction_cache.PAGE_BREAK)
+    return body
 
 
 
@@ -246,27 +1113,219 @@ def cloud(filename: str, limit: int = 40):
 
 
 @app.get("/raw/{filename}")
-def raw_file(filename: str):
-    file_path = os.path.join("documents", filename)
+def raw_file(filename: str, request: Request):
+    """Original file, with byte ranges, ETag and 304 support (see raw_files.py)."""
+    file_path = os.path.join(DOCS_DIR, os.path.basename(filename))
 
-    if not os.path.exists(file_path):
+    if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
-    return FileResponse(file_path)
+    with metrics.timed("raw"):
+        return raw_files.file_response(file_path, request.headers)
 
 
 
-@app.get("/suggest/{query}")
-def suggest(query: str):
-    conn = sqlite3.connect("search_engine.db")
-    cursor = conn.cursor()
+# ---------- Named collections (see named_collections.py) -----------
+COLLECTIONS = None
+
+
+@app.on_event("startup")
+def open_collections():
+    global COLLECTIONS
+    COLLECTIONS = named_collections.Collections()
+    found = COLLECTIONS.discover()
+    if found:
+        print(f"📚 Loading collections: {', '.join(found)}")
+
+
+def get_collection(name: str, ready: bool = True):
+    """Collection `name`: 404 when unknown, 503 while it is loading."""
+    try:
+        collection = COLLECTIONS.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    if ready:
+        try:
+            collection.check_ready()
+        except named_collections.CollectionNotReady as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return collection
+
+
+@app.get("/collections")
+def list_collections():
+    return {"collections": [c.describe() for c in COLLECTIONS]}
+
+
+@app.post("/collections/{name}")
+def create_collection(name: str, x_admin_token: Optional[str] = Header(None)):
+    """Open collection `name` (its folder is created if needed) and load it in the background."""
+    require_admin(x_admin_token)
+    try:
+        collection = COLLECTIONS.open(name, create=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return collection.describe()
+
+
+@app.get("/collections/{name}")
+def collection_info(name: str):
+    """State, documents, generation and estimated memory of a collection."""
+    return get_collection(name, ready=False).describe()
+
+
+@app.post("/collections/{name}/refresh")
+def refresh_collection(name: str, x_admin_token: Optional[str] = Header(None)):
+    """POST /index/refresh for a collection."""
+    require_admin(x_admin_token)
+    collection = get_collection(name)
+    indexed, removed = COLLECTIONS.refresh(name)
+    return {"indexed": indexed, "removed": removed, "generation": collection.generation}
+
+
+@app.get("/collections/{name}/search")
+def search_collection(
+    name: str,
+    query: str = Query(..., min_length=1),
+    limit: Optional[int] = None,
+    match: str = "exact",
+    filetype: Optional[List[str]] = Query(None, alias="type"),
+    size: Optional[List[str]] = Query(None),
+    month: Optional[List[str]] = Query(None),
+    pages: Optional[List[str]] = Query(None),
+):
+    """/search on a collection (match=, wildcards and facets; no collapse / stream)."""
+    if match not in MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"match must be one of {', '.join(MATCH_MODES)}")
+    collection = get_collection(name)
+    filters = facets.parse_filters(type=filetype, size=size, month=month, pages=pages)
+    query_log.annotate(endpoint=f"/collections/{name}/search", query=query_log.normalize(query),
+                       params={"limit": limit, "match": match, "filters": filters})
+
+    expansions, terms = analyze_query(query, match, collection=collection)
+    k = limit if limit and limit > 0 else None
+    total, ranked, facet_counts = collection.search(query, terms, k, expansions, filters)
+    query_log.annotate(hits=total)
+
+    words = match_words(query, expansions)
+    results = []
+    for filename, score in ranked:
+        filepath = os.path.join(collection.documents_dir, filename)
+        with metrics.timed("snippet"):
+            snippet, page = pdf_passage(filepath, words) if filename.lower().endswith(".pdf") else (None, None)
+            if snippet is None:
+                snippet = extract_snippet(filepath)
+        result = {"filename": filename, "snippet": snippet, "path": f"/collections/{name}/raw/{filename}"}
+        if page is not None:
+            result["page"] = page
+        result["score"] = score
+        results.append(result)
+    query_log.annotate(count=len(results))
+
+    with metrics.timed("serialize"):
+        body = {"collection": name, "query": query, "count": len(results), "total": total,
+                "results": results, "facets": facet_counts}
+        if expansions is not None:
+            body["expansions"] = expansions
+        response = FastJSONResponse(body)
+    return response
+
+
+@app.get("/collections/{name}/document/{filename}")
+def collection_document(name: str, filename: str):
+    content = get_collection(name).corpus.get(filename)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "collection": name,
+        "filename": filename,
+        "snippet": content[:500] + "..." if len(content) > 500 else content,
+        "full_content": content if filename.endswith(".txt") else None,
+    }
 
-    cursor.execute("SELECT word FROM word_frequencies ORDER BY count DESC LIMIT 5000")
-    vocab = [row[0] for row in cursor.fetchall()]
 
-    best = sorted(
-        vocab,
-        key=lambda w: Levenshtein.distance(query.lower(), w.lower())
-    )[:1]   # return only 1 suggestion
+@app.get("/collections/{name}/suggest/{query}")
+def collection_suggest(name: str, query: str):
+    """/suggest on a collection's vocabulary."""
+    return suggestions(query, get_collection(name))
 
+
+@app.get("/collections/{name}/cloud/{filename}")
+def collection_cloud(name: str, filename: str, limit: int = 40):
+    """/cloud of a collection's document, from its lemma counts and stopwords."""
+    top_words = get_collection(name).top_words(filename, limit)
+    if top_words is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {
+        "collection": name,
+        "filename": filename,
+        "word_count": len(top_words),
+        "top_words": [{"word": w, "count": c} for w, c in top_words],
+    }
+
+
+@app.get("/collections/{name}/similar/{filename}")
+def collection_similar(name: str, filename: str, limit: int = Query(10, ge=1, le=similarity.NEIGHBOURS)):
+    """/similar within a collection."""
+    if not similarity.available():
+        raise HTTPException(status_code=501, detail="numpy / scipy are required")
+    collection = get_collection(name)
+    table = collection.similar_table()
+    if table is None:
+        raise HTTPException(status_code=503, detail="Similar documents are being computed")
+
+    with metrics.timed("similar"):
+        # Documents removed since the table was built are skipped
+        neighbours = table.similar(filename, limit, exclude=set(table.filenames) - set(collection.freqs))
+    if neighbours is None or filename not in collection.freqs:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    results = []
+    for other, score in neighbours:
+        with metrics.timed("snippet"):
+            snippet = extract_snippet(os.path.join(collection.documents_dir, other))
+        results.append({
+            "filename": other,
+            "snippet": snippet,
+            "path": f"/collections/{name}/raw/{other}",
+            "score": round(score, 4),
+        })
+    return {"collection": name, "filename": filename, "count": len(results), "results": results}
+
+
+@app.get("/collections/{name}/raw/{filename}")
+def collection_raw_file(name: str, filename: str, request: Request):
+    file_path = os.path.join(get_collection(name, ready=False).documents_dir, os.path.basename(filename))
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="File not found")
+    with metrics.timed("raw"):
+        return raw_files.file_response(file_path, request.headers)
+
+
+@app.get("/suggest/{query}")
+def suggest(query: str):
+    """
+    Closest index term of each word of the query (typos and missing
+    accents tolerated), looked up in the trigram index (see ngrams.py).
+    """
+    return suggestions(query)
+
+
+def suggestions(query, collection=None):
+    trigrams, _, document_frequency, token_filter = term_context(collection)
+    keep = token_filter.keep
+
+    corrected = []
+    for word in query.lower().split():
+        # Tolerate a few more typos than /search before giving up
+        edits = max(ngrams.max_edits(word), 1)
+        found = []
+        while not found and edits <= max(len(word) // 2, 1):
+            found = [(t, d) for t, d in trigrams.fuzzy(word, edits) if keep(t)]
+            edits += 1
+        if found:
+            word = min(found, key=lambda m: (m[1], -document_frequency(m[0])))[0]
+        corrected.append(word)
+
+    best = [" ".join(corrected)] if corrected else []   # return only 1 suggestion
     return {"suggestions": best}
@@ -0,0 +1,248 @@
+"""
+Lightweight latency instrumentation (no external dependency).
+
+- Counter / Gauge / Histogram with labels, rendered in the Prometheus text
+  format by render() (served on /metrics by main.py)
+- timed(stage) : context manager timing one stage of a request or of an
+  indexing run; stages of the current request are also collected for the
+  Server-Timing header
+- indexing_runs table : the admin dashboard runs in its own process, so its
+  reindex timings are stored in SQLite and exported by the API from there
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# -------------------------- METRIC TYPES --------------------------
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REGISTRY = []
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_labels_key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {c}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------- DOCUFIND METRICS --------------------------
+REQUESTS = Counter("docufind_requests_total", "HTTP requests by route and status")
+REQUEST_SECONDS = Histogram("docufind_request_seconds", "HTTP request latency by route")
+STAGE_SECONDS = Histogram("docufind_stage_seconds", "Latency of query and indexing stages")
+CACHE_REQUESTS = Counter("docufind_cache_requests_total", "Cache lookups by cache and result (hit/miss)")
+
+INDEX_DOCUMENTS = Gauge("docufind_index_documents", "Documents in the in-memory index")
+INDEX_TERMS = Gauge("docufind_index_terms", "Distinct terms in the in-memory index")
+INDEX_POSTINGS = Gauge("docufind_index_postings", "(term, document) pairs in the in-memory index")
+INDEX_POSTING_BYTES = Gauge("docufind_index_posting_bytes", "Memory used by the posting arrays")
+INDEX_GENERATION = Gauge("docufind_index_generation", "Generation of the in-memory index")
+INDEX_SEGMENTS = Gauge("docufind_index_segments", "Live segments of the in-memory index")
+INDEX_DELETED = Gauge("docufind_index_deleted_documents", "Tombstoned documents not merged away yet")
+SEGMENT_MERGES = Counter("docufind_segment_merges_total", "Background segment merges")
+DOCS_INDEXED = Counter("docufind_documents_indexed_total", "Documents indexed by this process")
+DOCS_PER_SECOND = Gauge("docufind_documents_indexed_per_second", "Throughput of the last indexing run")
+COLLECTION_DOCUMENTS = Gauge("docufind_collection_documents", "Documents of a named collection")
+COLLECTION_MEMORY = Gauge("docufind_collection_memory_bytes", "Estimated memory of a named collection by part")
+
+
+def cache_hit(cache):
+    CACHE_REQUESTS.inc(cache=cache, result="hit")
+
+
+def cache_miss(cache):
+    CACHE_REQUESTS.inc(cache=cache, result="miss")
+
+
+# -------------------------- STAGE TIMING --------------------------
+_current_stages = ContextVar("docufind_stages", default=None)
+
+
+def collect_stages():
+    """
+    Start collecting stage timings for the current request (or indexing run).
+    Returns the {stage: seconds} dict filled by timed().
+    """
+    stages = {}
+    _current_stages.set(stages)
+    return stages
+
+
+def current_stages():
+    """Stage timings collected so far for the current request (or None)."""
+    return _current_stages.get()
+
+
+def finish_stages(stages):
+    """Record the per-request totals of each stage in the histogram."""
+    for stage, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block. Inside a request the time is added to the request's
+    stages (recorded once by finish_stages); otherwise it goes straight
+    into the stage histogram.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stages = _current_stages.get()
+        if stages is None:
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+        else:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def late_stages():
+    """
+    Record the stages timed after the request's stages were recorded by
+    finish_stages(), i.e. while the body of a streaming response is produced.
+    """
+    stages = current_stages()
+    before = dict(stages) if stages is not None else {}
+    try:
+        yield
+    finally:
+        if stages is not None:
+            finish_stages({s: t - before.get(s, 0.0) for s, t in list(stages.items()) if t != before.get(s)})
+
+
+def server_timing(stages, total=None):
+    """Server-Timing header value (durations in milliseconds)."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+# -------------------------- INDEXING RUNS --------------------------
+def save_indexing_run(conn, documents, seconds, stages):
+    """Store the timings of an indexing run (admin reindex)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS indexing_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            finished_at REAL,
+            documents INTEGER,
+            seconds REAL,
+            acquisition REAL,
+            normalisation REAL,
+            db_write REAL
+        )
+    """)
+    conn.execute("""
+        INSERT INTO indexing_runs (finished_at, documents, seconds, acquisition, normalisation, db_write)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (time.time(), documents, seconds, stages.get("acquisition", 0.0),
+          stages.get("normalisation", 0.0), stages.get("db_write", 0.0)))
+    conn.commit()
+
+
+def last_indexing_run(conn):
+    """Latest row of indexing_runs as a dict, or None."""
+    try:
+        row = conn.execute("""
+            SELECT finished_at, documents, seconds, acquisition, normalisation, db_write
+            FROM indexing_runs ORDER BY id DESC LIMIT 1
+        """).fetchone()
+    except sqlite3.OperationalError:
+        # table not created yet (no reindex from the dashboard so far)
+        return None
+    if row is None:
+        return None
+    keys = ("finished_at", "documents", "seconds", "acquisition", "normalisation", "db_write")
+    return dict(zip(keys, row))
@@ -0,0 +1,364 @@
+"""
+Named collections: separate corpora served by the same API process.
+
+Every folder of DOCUFIND_COLLECTIONS_DIR ("collections" by default) is a
+collection:
+    collections/<name>/documents/         its files
+    collections/<name>/stopwords.txt      its stopwords (the API's stopwords.txt otherwise)
+    collections/<name>/content_store.db   its extracted texts (written by the API)
+Each one has its own DocIds, segmented index, facets, scorer, term
+dictionaries (wildcards, match=), neighbour table (similarity.py) and
+stopword filter, and is queried through /collections/{name}/search,
+/suggest, /cloud, /similar, /document, /raw and /refresh. The default
+corpus (documents/, /search) is unchanged.
+
+Shared by all the collections of the process:
+- the spaCy model (lemmatizer.py), loaded once
+- the extraction cache (keyed by file content: same bytes, same text)
+- a pool of DOCUFIND_COLLECTION_WORKERS threads that load and refresh
+  the collections, and one thread merging the segments of their indexes
+
+memory() estimates what a collection holds in memory, part by part; the
+numbers are exported on /metrics (docufind_collection_memory_bytes).
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import facets
+import metrics
+import ngrams
+import scoring
+import search_engine as se
+import similarity
+import token_filters
+import wildcards
+from content_store import ContentStore
+from postings import DocIds, EMPTY
+from segments import MERGE_INTERVAL, SegmentedIndex
+
+COLLECTIONS_DIR = os.environ.get("DOCUFIND_COLLECTIONS_DIR", "collections")
+WORKERS = int(os.environ.get("DOCUFIND_COLLECTION_WORKERS", "2"))
+WEIGHTING = os.environ.get("DOCUFIND_SCORING", "count")
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class CollectionNotReady(Exception):
+    """The collection is still loading, or its loading failed."""
+
+
+# -------------------------- COLLECTION --------------------------
+class Collection:
+    """Index and storage of one named collection."""
+
+    def __init__(self, name, root):
+        self.name = name
+        self.root = root
+        self.documents_dir = os.path.join(root, "documents")
+        self.stopwords_path = os.path.join(root, "stopwords.txt")
+        self.doc_ids = DocIds()
+        self.freqs = {}
+        self.file_state = {}
+        self.corpus = ContentStore(os.path.join(root, "content_store.db"))
+        self.corpus.clear()
+        self.index = SegmentedIndex(self.doc_ids, gauges=False)
+        self.facets = facets.FacetIndex()
+        self.generation = 0
+        self.state = "loading"
+        self.error = None
+        self.lock = threading.Lock()
+
+        self._scorer = None
+        self._scorer_generation = None
+        self._scorer_building = threading.Lock()
+        self._scorer_changes = None          # (matrix, generation, scoring.Changes)
+        self.trigrams = ngrams.TrigramIndex()
+        self.terms = wildcards.TermDictionary()
+        self._terms_generation = None
+        self._derived_lock = threading.Lock()
+        self._similar = None
+        self._similar_generation = None
+        self._similar_building = threading.Lock()
+
+    # ---------- indexing ----------
+    def refresh(self):
+        """
+        Index the new / modified files of the collection and drop the removed
+        ones (everything on the first call). Returns (indexed, removed).
+        """
+        with self.lock:
+            try:
+                start = time.perf_counter()
+                current = se.scan_documents(self.documents_dir)
+                changed = sorted(f for f, mtime in current.items() if self.file_state.get(f) != mtime)
+                removed = [f for f in self.file_state if f not in current]
+
+                for i in range(0, len(changed), se.LOAD_BATCH):
+                    batch = se.acquisition(self.documents_dir, keep=set(changed[i:i + se.LOAD_BATCH]).__contains__)
+                    freqs = {}
+                    for filename, content in batch.items():
+                        with metrics.timed("normalisation"):
+                            freqs[filename] = se.count_lemmas(content)
+                        metrics.DOCS_INDEXED.inc()
+                    self.facets.index_files(self.doc_ids, self.documents_dir, freqs)
+                    self.corpus.update(batch)
+                    self.freqs.update(freqs)
+                    self.index.add_documents(freqs)
+
+                for filename in removed:
+                    self.index.delete(filename)
+                    self.facets.remove(self.doc_ids.get(filename))
+                    self.corpus.pop(filename, None)
+                    self.freqs.pop(filename, None)
+                    self.file_state.pop(filename, None)
+                self.file_state.update({f: current[f] for f in changed})
+
+                if changed or removed or self.state != "ready":
+                    self.generation += 1
+                if self.state == "loading" and changed:
+                    metrics.DOCS_PER_SECOND.set(len(changed) / max(time.perf_counter() - start, 1e-9),
+                                                source=f"collection:{self.name}")
+                self.state = "ready"
+                return changed, removed
+            except Exception as e:
+                if self.state == "loading":
+                    self.state, self.error = "failed", repr(e)
+                raise
+
+    def check_ready(self):
+        if self.state != "ready":
+            raise CollectionNotReady(self.error or f"Collection {self.name} is {self.state}")
+
+    # ---------- query side ----------
+    def token_filter(self):
+        path = self.stopwords_path if os.path.exists(self.stopwords_path) else token_filters.STOPWORDS_FILE
+        return token_filters.current(path)
+
+    def document_frequency(self, term):
+        return len(self.index.get(term, EMPTY))
+
+    def term_dictionaries(self):
+        """(TrigramIndex, TermDictionary) of the collection's current vocabulary."""
+        with self._derived_lock:
+            if self._terms_generation != self.generation:
+                self._terms_generation = self.generation
+                vocabulary = list(self.index)
+                with metrics.timed("term_dictionaries"):
+                    self.trigrams.add(vocabulary)
+                    self.terms.add(vocabulary)
+        return self.trigrams, self.terms
+
+    def scorer(self):
+        """
+        ScoringMatrix of the collection (None without numpy / scipy). Only
+        the first build is waited for: after a change the new matrix is
+        built in the background and the previous one serves meanwhile.
+        """
+        if not scoring.available():
+            return None
+        if self._scorer is None:
+            self.build_scorer()
+        elif self._scorer_generation != self.generation and not self._scorer_building.locked():
+            threading.Thread(target=self.build_scorer, daemon=True,
+                             name=f"docufind-scorer-{self.name}").start()
+        return self._scorer
+
+    def build_scorer(self):
+        with self._scorer_building:
+            with self.lock:
+                generation, freqs = self.generation, dict(self.freqs)
+            if self._scorer is not None and self._scorer_generation == generation:
+                return
+            with metrics.timed("scorer_build"):
+                matrix = scoring.ScoringMatrix.from_freqs(freqs, self.doc_ids, WEIGHTING)
+            self._scorer, self._scorer_generation = matrix, generation
+
+    def scorer_changes(self, scorer):
+        """Documents indexed since the scorer was built (see scoring.Changes), None when it is current."""
+        generation = self.generation
+        if scorer is self._scorer and self._scorer_generation == generation:
+            return None
+        cached = self._scorer_changes
+        if cached is None or cached[0] is not scorer or cached[1] != generation:
+            # list() of the items is one C call: no refresh() can interleave
+            changes = scoring.Changes(scorer, list(self.freqs.items()), self.doc_ids)
+            cached = self._scorer_changes = (scorer, generation, changes)
+        return cached[2]
+
+    def top_words(self, filename, limit):
+        """[(word, count)] most frequent indexed words of a document (None if unknown)."""
+        counts = self.freqs.get(filename)
+        if counts is None:
+            return None
+        return Counter(self.token_filter().apply(counts)).most_common(limit)
+
+    def similar_table(self):
+        """
+        SimilarDocuments of the collection, None until the first one is
+        built. After a change it is rebuilt in the background and the
+        previous table serves meanwhile, as for /similar.
+        """
+        if self._similar_generation != self.generation and not self._similar_building.locked():
+            threading.Thread(target=self.build_similar, daemon=True,
+                             name=f"docufind-similar-{self.name}").start()
+        return self._similar
+
+    def build_similar(self):
+        if not self._similar_building.acquire(blocking=False):
+            return
+        try:
+            with self.lock:
+                generation, freqs = self.generation, dict(self.freqs)
+            with metrics.timed("similar_build"):
+                table = similarity.SimilarDocuments.build(freqs, self.token_filter().keep)
+            self._similar, self._similar_generation = table, generation
+        except Exception as e:
+            print(f" Similar documents table failed ({self.name}): {e}")
+        finally:
+            self._similar_building.release()
+
+    def search(self, query, terms, k=None, expansions=None, filters=None):
+        """(total hits, [(filename, score)] best first, facet counts)."""
+        self.check_ready()
+        with metrics.timed("recherche"):
+            hits = se.recherche(query, self.index, expansions, self.token_filter())
+        with metrics.timed("facets"):
+            hits, facet_counts = self.facets.apply(hits, filters)
+
+        with metrics.timed("scoring"):
+            scorer = self.scorer()
+            if scorer is not None:
+                ids, scores = scorer.rank(terms, hits, k=k, changes=self.scorer_changes(scorer))
+                ranked = list(zip(self.doc_ids.filenames(ids.tolist()), scores.tolist()))
+            else:
+                # Raw counts, as the historical SQL scoring
+                ranked = [(f, sum(self.freqs[f].get(t, 0) for t in terms)) for f in self.doc_ids.filenames(hits)]
+                ranked.sort(key=lambda item: (-item[1], item[0]))
+                ranked = ranked[:k] if k else ranked
+        return len(hits), ranked, facet_counts
+
+    # ---------- memory ----------
+    def memory(self):
+        """Estimated bytes held in memory by the collection, by part."""
+        segments = self.index.segments
+        scorer = self._scorer
+        table = self._similar
+        parts = {
+            "postings": sum(p.nbytes for s in segments for p in s.postings.values())
+                        + sum(s.docs.nbytes for s in segments),
+            # dict tables of the Counters; the lemma strings are shared
+            "lemma_counts": sum(sys.getsizeof(counts) for counts in self.freqs.values()),
+            "facets": sum((bits.bit_length() + 7) // 8
+                          for values in self.facets.bits.values() for bits in values.values()),
+            "scorer": (scorer.matrix.data.nbytes + scorer.matrix.indices.nbytes
+                       + scorer.matrix.indptr.nbytes + scorer.present.nbytes) if scorer is not None else 0,
+            "term_dictionaries": sum(a.itemsize * len(a) for a in self.trigrams.postings.values())
+                                 + sys.getsizeof(self.trigrams.ids),
+            "similar": table.ids.nbytes + table.scores.nbytes if table is not None else 0,
+            "content_cache": sum(len(block) for block in list(self.corpus.cache.values())),
+        }
+        parts["total"] = sum(parts.values())
+        return parts
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "state": self.state,
+            "error": self.error,
+            "documents": len(self.freqs),
+            "generation": self.generation,
+            "memory": self.memory(),
+        }
+
+
+# -------------------------- REGISTRY --------------------------
+class Collections:
+    """The named collections of the process and their shared workers."""
+
+    def __init__(self, directory=COLLECTIONS_DIR, workers=WORKERS):
+        self.directory = directory
+        self.collections = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="docufind-collection")
+        self._merger = None
+
+    def discover(self):
+        """Open (and load in the background) every collection folder."""
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if NAME_PATTERN.match(name) and os.path.isdir(os.path.join(self.directory, name, "documents")):
+                    self.open(name)
+        return list(self.collections)
+
+    def open(self, name, create=False):
+        """
+        Collection `name`, loaded in the background the first time.
+        ValueError for an invalid name, KeyError when the folder does not
+        exist (unless `create`).
+        """
+        if not NAME_PATTERN.match(name):
+            raise ValueError("Collection names are 1-64 letters, digits, '-' or '_'")
+        with self.lock:
+            collection = self.collections.get(name)
+            if collection is not None:
+                return collection
+            root = os.path.join(self.directory, name)
+            if create:
+                os.makedirs(os.path.join(root, "documents"), exist_ok=True)
+            elif not os.path.isdir(os.path.join(root, "documents")):
+                raise KeyError(name)
+            collection = self.collections[name] = Collection(name, root)
+        self.pool.submit(self._load, collection)
+        self.start_merging()
+        return collection
+
+    @staticmethod
+    def _load(collection):
+        try:
+            collection.refresh()
+            print(f"✔️ Collection {collection.name} ready ({len(collection.freqs)} documents)")
+            collection.scorer()
+            if similarity.available():
+                collection.similar_table()
+        except Exception as e:
+            print(f" Collection {collection.name} failed to load: {e}")
+
+    def get(self, name):
+        """Loaded collection `name` (KeyError if unknown)."""
+        return self.collections[name]
+
+    def refresh(self, name):
+        """refresh() of a collection, run on the shared pool."""
+        collection = self.get(name)
+        collection.check_ready()
+        return self.pool.submit(collection.refresh).result()
+
+    def __iter__(self):
+        return iter(list(self.collections.values()))
+
+    def start_merging(self):
+        """One background thread merging the segments of every collection."""
+        with self.lock:
+            if self._merger is None:
+                self._merger = threading.Thread(target=self._merge_loop, daemon=True,
+                                                name="docufind-collection-merger")
+                self._merger.start()
+
+    def _merge_loop(self):
+        while True:
+            time.sleep(MERGE_INTERVAL)
+            for collection in self:
+                try:
+                    collection.index.merge_pending()
+                except Exception as e:
+                    print(f" Segment merge failed ({collection.name}): {e}")
+
+    def publish_metrics(self):
+        for collection in self:
+            for part, size in collection.memory().items():
+                metrics.COLLECTION_MEMORY.set(size, collection=collection.name, part=part)
+            metrics.COLLECTION_DOCUMENTS.set(len(collection.freqs), collection=collection.name)
@@ -0,0 +1,255 @@
+"""
+Near-duplicate documents: MinHash signatures bucketed with LSH.
+
+The same PDF under another name, or docv2.txt / docv3.txt with a few
+edits, share most of their word shingles. Each document gets:
+- shingles : every run of SHINGLE_WORDS consecutive words, hashed (crc32)
+- MinHash  : the minimum of NUM_PERM hash functions (a*x + b) mod P over
+             its shingles; two documents agree on a position with a
+             probability equal to the Jaccard similarity of their shingles
+- LSH      : the signature is cut into BANDS bands of ROWS values; two
+             documents sharing one band bucket are candidates (a pair
+             with similarity s is caught with probability 1 - (1 - s^ROWS)^BANDS)
+
+Candidates are confirmed by comparing their signatures (estimated
+similarity >= THRESHOLD) and grouped with union-find. Adding a document
+touches BANDS buckets, so detection is linear in the corpus size.
+
+The API keeps a NearDuplicateIndex in memory (/search?collapse=true); the
+admin reindex stores the signatures and the groups in SQLite
+(minhash_signatures, near_duplicate_groups) for the dashboard.
+"""
+import os
+import random
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from collections import defaultdict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+THRESHOLD = float(os.environ.get("DOCUFIND_DUPLICATE_THRESHOLD", "0.8"))
+# Shingles hashed together (bounds the numpy temporary of a large document)
+CHUNK = 8192
+
+PRIME = 4294967291                     # largest prime < 2**32: a * x + b fits in 64 bits
+_rng = random.Random(20240611)
+A = [_rng.randrange(1, PRIME) for _ in range(NUM_PERM)]
+B = [_rng.randrange(0, PRIME) for _ in range(NUM_PERM)]
+
+
+# -------------------------- SIGNATURES --------------------------
+def shingles(text):
+    """crc32 of every SHINGLE_WORDS-word window of the text."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        for i in range(len(words) - SHINGLE_WORDS + 1)
+    }
+
+
+def signature(text):
+    """MinHash signature (array('I') of NUM_PERM values), None for an empty text."""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    if np is not None:
+        a = np.asarray(A, dtype=np.uint64)[:, None]
+        b = np.asarray(B, dtype=np.uint64)[:, None]
+        values = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        minimum = np.full(NUM_PERM, PRIME, dtype=np.uint64)
+        for start in range(0, len(values), CHUNK):
+            chunk = values[None, start:start + CHUNK]
+            minimum = np.minimum(minimum, ((a * chunk + b) % PRIME).min(axis=1))
+        return array("I", minimum.astype(np.uint32).tobytes())
+    return array("I", [min((a * x + b) % PRIME for x in hashes) for a, b in zip(A, B)])
+
+
+def similarity(sig1, sig2):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(sig1, sig2)) / NUM_PERM
+
+
+def band_keys(sig):
+    return [(band, hash(tuple(sig[band * ROWS:(band + 1) * ROWS]))) for band in range(BANDS)]
+
+
+# -------------------------- INDEX --------------------------
+class NearDuplicateIndex:
+    """LSH buckets of the signatures of a set of documents."""
+
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.signatures = {}                 # filename -> signature
+        self.buckets = defaultdict(set)      # (band, hash) -> filenames
+        self._groups = None
+        self.lock = threading.RLock()
+
+    def add(self, filename, text):
+        self.add_signature(filename, signature(text))
+
+    def add_signature(self, filename, sig):
+        with self.lock:
+            self.remove(filename)
+            if sig is None:
+                return
+            self.signatures[filename] = sig
+            for key in band_keys(sig):
+                self.buckets[key].add(filename)
+            self._groups = None
+
+    def remove(self, filename):
+        with self.lock:
+            sig = self.signatures.pop(filename, None)
+            if sig is None:
+                return
+            for key in band_keys(sig):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(filename)
+                    if not bucket:
+                        del self.buckets[key]
+            self._groups = None
+
+    def duplicates_of(self, filename):
+        """[(other filename, estimated similarity)] above the threshold, closest first."""
+        with self.lock:
+            sig = self.signatures.get(filename)
+            if sig is None:
+                return []
+            candidates = set()
+            for key in band_keys(sig):
+                candidates |= self.buckets.get(key, set())
+            candidates.discard(filename)
+            found = [(other, similarity(sig, self.signatures[other])) for other in candidates]
+        return sorted((f for f in found if f[1] >= self.threshold), key=lambda f: (-f[1], f[0]))
+
+    def groups(self):
+        """{filename: sorted group} for the documents that have near-duplicates."""
+        with self.lock:
+            if self._groups is None:
+                self._groups = self._find_groups()
+            return self._groups
+
+    def _find_groups(self):
+        parent = {}
+
+        def find(x):
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        checked = set()
+        for bucket in self.buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = sorted(bucket)
+            for i, first in enumerate(members):
+                for other in members[i + 1:]:
+                    if (first, other) in checked:
+                        continue
+                    checked.add((first, other))
+                    if similarity(self.signatures[first], self.signatures[other]) >= self.threshold:
+                        parent.setdefault(first, first)
+                        parent.setdefault(other, other)
+                        parent[find(other)] = find(first)
+
+        clusters = defaultdict(list)
+        for filename in parent:
+            clusters[find(filename)].append(filename)
+        groups = {}
+        for members in clusters.values():
+            members = sorted(members)
+            for filename in members:
+                groups[filename] = members
+        return groups
+
+    def representative(self, filename):
+        """First filename of its group (itself when it has no near-duplicate)."""
+        group = self.groups().get(filename)
+        return group[0] if group else filename
+
+    def redundant(self):
+        """Number of documents that are not the representative of their group."""
+        return sum(1 for filename, group in self.groups().items() if group[0] != filename)
+
+
+# -------------------------- DATABASE (admin) --------------------------
+def init_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS minhash_signatures (
+            filename TEXT PRIMARY KEY,
+            signature BLOB
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS near_duplicate_groups (
+            filename TEXT PRIMARY KEY,
+            group_id TEXT,
+            similarity REAL
+        )
+    """)
+    conn.commit()
+
+
+def save_signature(cursor, filename, sig):
+    if sig is None:
+        cursor.execute("DELETE FROM minhash_signatures WHERE filename = ?", (filename,))
+        return
+    cursor.execute(
+        "INSERT OR REPLACE INTO minhash_signatures (filename, signature) VALUES (?, ?)",
+        (filename, sig.tobytes()),
+    )
+
+
+def forget(cursor, filename):
+    cursor.execute("DELETE FROM minhash_signatures WHERE filename = ?", (filename,))
+    cursor.execute("DELETE FROM near_duplicate_groups WHERE filename = ?", (filename,))
+
+
+def rebuild_groups(conn):
+    """Group the stored signatures; returns the number of groups."""
+    index = NearDuplicateIndex()
+    for filename, blob in conn.execute("SELECT filename, signature FROM minhash_signatures"):
+        sig = array("I")
+        sig.frombytes(blob)
+        index.add_signature(filename, sig)
+
+    rows = []
+    for filename, group in index.groups().items():
+        best = max((s for f, s in index.duplicates_of(filename) if f in group), default=1.0)
+        rows.append((filename, group[0], best))
+    conn.execute("DELETE FROM near_duplicate_groups")
+    conn.executemany(
+        "INSERT INTO near_duplicate_groups (filename, group_id, similarity) VALUES (?, ?, ?)", rows
+    )
+    conn.commit()
+    return len({group_id for _, group_id, _ in rows})
+
+
+def load_groups(conn):
+    """[(group id, [(filename, similarity)])] stored by the last reindex."""
+    try:
+        rows = conn.execute(
+            "SELECT group_id, filename, similarity FROM near_duplicate_groups ORDER BY group_id, filename"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # no reindex since near-duplicates are detected
+        return []
+    groups = defaultdict(list)
+    for group_id, filename, sim in rows:
+        groups[group_id].append((filename, sim))
+    # A group loses members when documents are deleted
+    return sorted((g, members) for g, members in groups.items() if len(members) > 1)
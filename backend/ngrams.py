@@ -0,0 +1,131 @@
+"""
+Character trigram index over the term dictionary.
+
+recherche() looks lemmas up exactly, so "neuron" or "geologie" (for
+"géologie") found nothing. Every term of the index is folded like
+clean_text() does (NFKD, accents dropped, lowercase) and cut into
+trigrams; each trigram maps to the sorted ids of the terms containing it
+(array('I') posting lists, intersected with postings.py). Looking a word
+up is then a few posting intersections followed by a verification on the
+candidates only, instead of a scan of the vocabulary:
+
+- accent-insensitive : folded form equal
+- substring          : the fragment's trigrams all present, then `in`
+- fuzzy (typos)      : enough shared padded trigrams (one edit changes
+                       at most 3 of them), then Levenshtein distance
+"""
+import threading
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+
+import Levenshtein
+
+from postings import PostingList
+
+N = 3
+PAD = "$"
+
+
+def fold(word):
+    """Accent-free lowercase form (same folding as clean_text)."""
+    return unicodedata.normalize("NFKD", word).encode("ascii", "ignore").decode("ascii").lower()
+
+
+def grams(text, padded=True):
+    """Distinct trigrams of a folded word ("$$w" ... "d$" when padded)."""
+    if padded:
+        text = PAD * (N - 1) + text + PAD
+    return {text[i:i + N] for i in range(len(text) - N + 1)}
+
+
+def max_edits(word):
+    """Typos tolerated for a word of this length."""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+class TrigramIndex:
+    """Trigram -> term ids, for the (growing) vocabulary of the index."""
+
+    def __init__(self, terms=()):
+        self.lock = threading.Lock()
+        self.terms = []                      # term id -> term
+        self.folded = []                     # term id -> folded term
+        self.ids = {}                        # term -> term id
+        self.by_folded = defaultdict(list)   # folded term -> term ids
+        self.postings = defaultdict(lambda: array("I"))
+        self.add(terms)
+
+    def add(self, terms):
+        """Add the new terms (ids only grow, so posting lists stay sorted)."""
+        with self.lock:
+            for term in terms:
+                if term in self.ids:
+                    continue
+                term_id = self.ids[term] = len(self.terms)
+                folded = fold(term)
+                self.terms.append(term)
+                self.folded.append(folded)
+                self.by_folded[folded].append(term_id)
+                for gram in grams(folded):
+                    self.postings[gram].append(term_id)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _candidates(self, gram_set):
+        """Term ids containing every trigram of `gram_set` (shortest lists first)."""
+        lists = sorted((self.postings.get(g) for g in gram_set), key=lambda p: len(p) if p else 0)
+        if not lists or not lists[0]:
+            return []
+        result = PostingList(lists[0])
+        for ids in lists[1:]:
+            result = result & PostingList(ids)
+            if not result:
+                break
+        return result
+
+    # -------------------------- LOOKUPS --------------------------
+    def accent_insensitive(self, word):
+        """Terms equal to `word` once both are folded."""
+        return [self.terms[i] for i in self.by_folded.get(fold(word), ())]
+
+    def substring(self, fragment):
+        """Terms containing `fragment` (folded)."""
+        fragment = fold(fragment)
+        if not fragment:
+            return []
+        if len(fragment) < N:
+            # Too short for a trigram: verify every term
+            candidates = range(len(self.terms))
+        else:
+            candidates = self._candidates(grams(fragment, padded=False))
+        return [self.terms[i] for i in candidates if fragment in self.folded[i]]
+
+    def fuzzy(self, word, edits=None):
+        """[(term, distance)] within `edits` typos of `word` (folded), closest first."""
+        word = fold(word)
+        edits = max_edits(word) if edits is None else edits
+        word_grams = grams(word)
+        if edits == 0:
+            return [(self.terms[i], 0) for i in self.by_folded.get(word, ())]
+
+        # Count shared trigrams; a term within `edits` keeps at least this many
+        needed = max(len(word_grams) - N * edits, 1)
+        shared = Counter()
+        for gram in word_grams:
+            ids = self.postings.get(gram)
+            if ids:
+                shared.update(ids)
+
+        matches = []
+        for term_id, count in shared.items():
+            if count < needed:
+                continue
+            distance = Levenshtein.distance(word, self.folded[term_id])
+            if distance <= edits:
+                matches.append((self.terms[term_id], distance))
+        matches.sort(key=lambda m: (m[1], m[0]))
+        return matches
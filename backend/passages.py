@@ -0,0 +1,188 @@
+"""
+Passage-level ranking of long documents (DOCUFIND_PASSAGES=1).
+
+Summing the counts over a whole document favours long documents: a
+300-page course contains almost every term many times. In passage mode
+every document is also cut at index time into windows of
+DOCUFIND_PASSAGE_WORDS words, overlapping by DOCUFIND_PASSAGE_OVERLAP
+words, and the windows are scored as sub-documents:
+
+- score   : a document scores as its best passage (same weighting as
+            DOCUFIND_SCORING, computed over the passages)
+- snippet : the best passage itself, a slice of the stored text at
+            offsets known since indexing (with its page for a PDF), so
+            /search no longer extracts nor scans the document for a snippet
+
+Boolean retrieval (recherche()) and facets stay at the document level:
+only the ranking and the snippets change. Off by default, and ignored in
+sharded mode; needs numpy / scipy (see scoring.py).
+
+Per document only the term counts of its passages and their offsets are
+kept (numpy arrays); the passage x term matrix is a concatenation of them,
+built in a background thread after the index changes (see main.py).
+"""
+import os
+import threading
+
+import scoring
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+ENABLED = os.environ.get("DOCUFIND_PASSAGES", "0").lower() in ("1", "true", "yes")
+WORDS = int(os.environ.get("DOCUFIND_PASSAGE_WORDS", "50"))
+OVERLAP = int(os.environ.get("DOCUFIND_PASSAGE_OVERLAP", "25"))
+
+
+def available():
+    return ENABLED and scoring.available()
+
+
+def windows(n_words, size=WORDS, overlap=OVERLAP):
+    """(first word, end word) of the passages of a text of n_words words."""
+    step = max(size - overlap, 1)
+    ranges = []
+    for first in range(0, n_words, step):
+        ranges.append((first, min(first + size, n_words)))
+        if first + size >= n_words:
+            break
+    return ranges
+
+
+# -------------------------- INDEX --------------------------
+class PassageIndex:
+    """
+    filename -> term counts of each of its passages (numpy arrays: term
+    ids, counts, passage boundaries) and the passage offsets. Term ids come
+    from one vocabulary shared by the documents.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.vocab = {}                      # lemma -> term id
+        self.lock = threading.Lock()
+
+    def add(self, filename, words, lemmas, page_starts=None):
+        """
+        Cut a document into passages. `words` are the (start, end) character
+        offsets of its words, `lemmas` the (word number, lemma) pairs in
+        text order (search_engine.positioned_lemmas), `page_starts` the
+        offsets of its pages (PDF).
+        """
+        with self.lock:
+            terms = np.fromiter((self.vocab.setdefault(lemma, len(self.vocab)) for _, lemma in lemmas),
+                                dtype=np.uint32, count=len(lemmas))
+        positions = np.fromiter((position for position, _ in lemmas), dtype=np.int64, count=len(lemmas))
+
+        ranges = windows(len(words))
+        term_ids, counts, sizes = [], [], []
+        for first, end in ranges:
+            lo, hi = np.searchsorted(positions, (first, end))
+            ids, n = np.unique(terms[lo:hi], return_counts=True)
+            term_ids.append(ids)
+            counts.append(n.astype(np.uint32))
+            sizes.append(len(ids))
+        starts = np.fromiter((words[first][0] for first, _ in ranges), dtype=np.int64, count=len(ranges))
+        stops = np.fromiter((words[end - 1][1] for _, end in ranges), dtype=np.int64, count=len(ranges))
+        # 0 = no page (not a PDF)
+        pages = np.searchsorted(page_starts, starts, side="right") if page_starts else np.zeros(len(ranges), np.int64)
+
+        passages = (
+            np.concatenate(term_ids) if ranges else np.zeros(0, np.uint32),
+            np.concatenate(counts) if ranges else np.zeros(0, np.uint32),
+            np.asarray(sizes, dtype=np.int64),
+            starts, stops, pages.astype(np.int32),
+        )
+        with self.lock:
+            self.documents[filename] = passages
+
+    def remove(self, filename):
+        with self.lock:
+            self.documents.pop(filename, None)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def matrix(self, doc_ids, weighting="count"):
+        """PassageMatrix of the current documents (columns = passages), built with numpy only."""
+        with self.lock:
+            documents = list(self.documents.items())
+            vocab = dict(self.vocab)
+
+        doc_ids_list = [doc_ids.add(filename) for filename, _ in documents]
+        parts = list(zip(*(passages for _, passages in documents))) or [()] * 6
+        term_ids, counts, sizes, starts, stops, pages = (
+            np.concatenate(p) if p else np.zeros(0, np.int64) for p in parts
+        )
+        n_passages = len(sizes)
+        doc_of = np.repeat(np.asarray(doc_ids_list, dtype=np.int64),
+                           [len(passages[2]) for _, passages in documents]) if documents else np.zeros(0, np.int64)
+
+        weights = sparse.csr_matrix(
+            (counts.astype(np.int64), (term_ids.astype(np.int64), np.repeat(np.arange(n_passages), sizes))),
+            shape=(len(vocab), n_passages),
+        )
+        present = np.ones(n_passages, dtype=bool)
+        scorer = scoring.ScoringMatrix(scoring.weigh(weights, weighting, n_passages), vocab, present)
+        matrix = PassageMatrix(scorer, doc_of, starts, stops, pages, len(doc_ids))
+        matrix.order = scoring.name_order(doc_ids, len(matrix.indexed))
+        return matrix
+
+
+class PassageMatrix:
+    """Passage x term weights, with the document of every passage."""
+
+    def __init__(self, scorer, doc_of, starts, stops, pages, n_docs):
+        self.scorer = scorer
+        self.doc_of = doc_of                 # passage -> doc id
+        self.starts = starts                 # passage -> character offsets in the text
+        self.stops = stops
+        self.pages = pages                   # passage -> PDF page, 0 if none
+        self.indexed = np.zeros(n_docs, dtype=bool)
+        self.indexed[doc_of] = True
+        self.order = None                    # ties by filename, see scoring.name_order()
+
+    def rank_batch(self, queries, candidates, k=10):
+        """
+        [(doc ids, scores, best passage of each doc or -1)] per query, best
+        first. A document's score is the one of its best passage; hits
+        without any scoring passage keep a score of 0, as in scoring.rank().
+        """
+        product = (self.scorer.query_matrix(queries) @ self.scorer.matrix).tocsr()
+        limits = k if isinstance(k, (list, tuple)) else [k] * len(queries)
+        n_docs = len(self.indexed)
+        ranked = []
+        for i in range(len(queries)):
+            start, end = product.indptr[i], product.indptr[i + 1]
+            passages, values = product.indices[start:end].astype(np.int64), product.data[start:end]
+
+            ids = scoring.candidate_ids(candidates[i])
+            ids = ids[ids < n_docs]
+            ids = ids[self.indexed[ids]]
+            allowed = np.zeros(n_docs, dtype=bool)
+            allowed[ids] = True
+            keep = allowed[self.doc_of[passages]]
+            passages, values = passages[keep], values[keep]
+
+            # Best passage of each document: highest score, then the first one
+            docs = self.doc_of[passages]
+            order = np.lexsort((passages, -values, docs))
+            docs, passages, values = docs[order], passages[order], values[order]
+            first = np.ones(len(docs), dtype=bool)
+            first[1:] = docs[1:] != docs[:-1]
+
+            doc_scores = np.zeros(n_docs, dtype=self.scorer.matrix.dtype)
+            doc_scores[docs[first]] = values[first]
+            best = np.full(n_docs, -1, dtype=np.int64)
+            best[docs[first]] = passages[first]
+
+            top_ids, top_scores = scoring.top_k(ids, doc_scores[ids], limits[i], self.order)
+            ranked.append((top_ids, top_scores, best[top_ids]))
+        return ranked
+
+    def span(self, passage):
+        """(start, end, page or None) of a passage in the document's text."""
+        return int(self.starts[passage]), int(self.stops[passage]), int(self.pages[passage]) or None
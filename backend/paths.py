@@ -0,0 +1,25 @@
+"""
+Location of the documents folder, resolved once at startup.
+
+Historically the code used both "documents" (admin uploads, indexing,
+/raw) and "Documents" (snippets), which only agree on case-insensitive
+filesystems. DOCUFIND_DOCUMENTS_DIR forces the folder; otherwise the
+first existing of these names is used.
+"""
+import os
+
+CANDIDATES = ("documents", "Documents")
+
+
+def resolve_documents_dir(base="."):
+    configured = os.environ.get("DOCUFIND_DOCUMENTS_DIR")
+    if configured:
+        return os.path.abspath(configured)
+    for name in CANDIDATES:
+        path = os.path.join(base, name)
+        if os.path.isdir(path):
+            return os.path.abspath(path)
+    return os.path.abspath(os.path.join(base, CANDIDATES[0]))
+
+
+DOCUMENTS_DIR = resolve_documents_dir()
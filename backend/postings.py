@@ -0,0 +1,224 @@
+"""
+Compact posting lists for the in-memory index.
+
+Documents get dense integer ids (DocIds) and each term maps to a
+PostingList: a sorted array('I') of doc ids (4 bytes per posting instead of
+a str reference in a hash set). Boolean operations work directly on the
+sorted arrays:
+- AND : galloping (exponential + binary search) when one list is much
+        shorter than the other, linear set intersection otherwise
+- OR  : union of sorted arrays (k lists at once with union_all, or a
+        heap k-way merge with merge_union)
+- NOT : difference
+With numpy installed, these read the arrays' buffers without copying them:
+intersect1d / setdiff1d, and a stable sort (a merge of the sorted runs)
+for unions. Without numpy, or for short lists, the C set operations are
+used: an interpreted merge loop is slower at every size.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Use galloping when the longer list is at least this many times longer
+GALLOP_RATIO = 8
+# Below this many ids in total, set operations beat numpy's call overhead
+NUMPY_MIN = 256
+
+
+# -------------------------- DOCUMENT IDS --------------------------
+class DocIds:
+    """Bidirectional filename <-> dense integer id dictionary."""
+
+    def __init__(self, filenames=()):
+        self.names = []
+        self.ids = {}
+        for name in filenames:
+            self.add(name)
+
+    def add(self, filename):
+        doc_id = self.ids.get(filename)
+        if doc_id is None:
+            doc_id = self.ids[filename] = len(self.names)
+            self.names.append(filename)
+        return doc_id
+
+    def get(self, filename):
+        return self.ids.get(filename)
+
+    def name(self, doc_id):
+        return self.names[doc_id]
+
+    def filenames(self, postings):
+        """Filenames of a PostingList (or any iterable of ids)."""
+        names = self.names
+        return [names[i] for i in postings]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, filename):
+        return filename in self.ids
+
+
+# -------------------------- SORTED ARRAY OPERATIONS --------------------------
+def gallop_intersect(small, large):
+    """Intersection of two sorted arrays, |small| << |large|."""
+    out = array("I")
+    lo, n = 0, len(large)
+    for x in small:
+        # exponential search for the first position >= x, then binary search
+        step = 1
+        hi = lo
+        while hi < n and large[hi] < x:
+            lo = hi + 1
+            hi = lo + step
+            step <<= 1
+        lo = bisect_left(large, x, lo, min(hi + 1, n))
+        if lo >= n:
+            break
+        if large[lo] == x:
+            out.append(x)
+            lo += 1
+    return out
+
+
+def _numpy(*arrays):
+    return np is not None and sum(len(a) for a in arrays) >= NUMPY_MIN
+
+
+def _view(a):
+    return np.frombuffer(a, dtype=np.uintc)
+
+
+def _to_array(values):
+    out = array("I")
+    out.frombytes(values.astype(np.uintc, copy=False).tobytes())
+    return out
+
+
+def _sorted_union(arrays):
+    """Union of sorted unique arrays: merge of the sorted runs, duplicates dropped."""
+    merged = np.sort(np.concatenate([_view(a) for a in arrays]), kind="stable")
+    keep = np.empty(len(merged), dtype=bool)
+    keep[0] = True
+    np.not_equal(merged[1:], merged[:-1], out=keep[1:])
+    return _to_array(merged[keep])
+
+
+def intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return array("I")
+    if len(b) >= GALLOP_RATIO * len(a):
+        return gallop_intersect(a, b)
+    if _numpy(a, b):
+        return _to_array(np.intersect1d(_view(a), _view(b), assume_unique=True))
+    return array("I", sorted(set(a).intersection(b)))
+
+
+def union(a, b):
+    if not a:
+        return array("I", b)
+    if not b:
+        return array("I", a)
+    if _numpy(a, b):
+        return _sorted_union((a, b))
+    return array("I", sorted(set(a).union(b)))
+
+
+def union_all(arrays):
+    arrays = [a for a in arrays if a]
+    if len(arrays) == 1:
+        return array("I", arrays[0])
+    if _numpy(*arrays):
+        return _sorted_union(arrays)
+    return array("I", sorted(set().union(*arrays)))
+
+
+def merge_union(arrays):
+    """
+    k-way union through a heap (heapq.merge): O(n log k) over the already
+    sorted arrays, for the many lists of an expanded (wildcard) term.
+    """
+    arrays = [a for a in arrays if a]
+    if len(arrays) == 1:
+        return array("I", arrays[0])
+    out = array("I")
+    last = -1
+    for doc_id in heapq.merge(*arrays):
+        if doc_id != last:
+            out.append(doc_id)
+            last = doc_id
+    return out
+
+
+def difference(a, b):
+    if not a or not b:
+        return array("I", a)
+    if _numpy(a, b):
+        return _to_array(np.setdiff1d(_view(a), _view(b), assume_unique=True))
+    return array("I", sorted(set(a).difference(b)))
+
+
+# -------------------------- POSTING LIST --------------------------
+class PostingList:
+    """Sorted, duplicate-free doc ids of one term (or of a query result)."""
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids=()):
+        self.ids = ids if isinstance(ids, array) else array("I", sorted(set(ids)))
+
+    @classmethod
+    def from_sorted(cls, ids):
+        """Build from ids already sorted and unique (no check)."""
+        return cls(array("I", ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __bool__(self):
+        return len(self.ids) > 0
+
+    def __contains__(self, doc_id):
+        i = bisect_left(self.ids, doc_id)
+        return i < len(self.ids) and self.ids[i] == doc_id
+
+    def __eq__(self, other):
+        return isinstance(other, PostingList) and self.ids == other.ids
+
+    def __and__(self, other):
+        return PostingList(intersect(self.ids, other.ids))
+
+    def __or__(self, other):
+        return PostingList(union(self.ids, other.ids))
+
+    def __sub__(self, other):
+        return PostingList(difference(self.ids, other.ids))
+
+    @staticmethod
+    def union_all(lists):
+        return PostingList(union_all([p.ids for p in lists]))
+
+    @staticmethod
+    def merge_all(lists):
+        return PostingList(merge_union([p.ids for p in lists]))
+
+    @property
+    def nbytes(self):
+        return self.ids.itemsize * len(self.ids)
+
+    def __repr__(self):
+        return f"PostingList({len(self.ids)} docs)"
+
+
+EMPTY = PostingList()
@@ -0,0 +1,206 @@
+"""
+Opt-in profiling of single units of work (one /search request, one reindex).
+
+- On demand : /search?query=...&profile=1 (sampling profiler, collapsed
+  stacks readable by flamegraph.pl / speedscope) or profile=cprofile
+  (.pstats for snakeviz / pstats). Allowed when DOCUFIND_PROFILING=1 or
+  when the X-Admin-Token header matches DOCUFIND_ADMIN_TOKEN.
+- Always on : a coarse background sampler keeps the stacks of the slowest
+  DOCUFIND_PROFILE_SLOWEST requests in memory (0 disables it), listed on
+  /profiles/slowest.
+"""
+import cProfile
+import heapq
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILING_ENABLED = os.environ.get("DOCUFIND_PROFILING", "0") == "1"
+ADMIN_TOKEN = os.environ.get("DOCUFIND_ADMIN_TOKEN", "")
+PROFILE_DIR = os.environ.get("DOCUFIND_PROFILE_DIR", "profiles")
+SLOWEST_KEEP = int(os.environ.get("DOCUFIND_PROFILE_SLOWEST", "20"))
+SAMPLE_INTERVAL = 0.001            # on-demand profiles
+BACKGROUND_INTERVAL = 0.01         # slowest-requests recorder
+
+
+def authorized(token):
+    """On-demand profiling is allowed by the config flag or the admin token."""
+    if PROFILING_ENABLED:
+        return True
+    return bool(ADMIN_TOKEN) and isinstance(token, str) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+# -------------------------- SAMPLING PROFILER --------------------------
+def collapse(frame):
+    """One stack in the 'collapsed' format: root;caller;callee"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """
+    Samples the Python stacks of the tracked threads every `interval`
+    seconds. One sampler serves any number of threads.
+    """
+
+    def __init__(self, interval):
+        super().__init__(daemon=True, name=f"docufind-sampler-{interval}")
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.tracked = {}
+        self.stopped = threading.Event()
+
+    def track(self, ident):
+        with self.lock:
+            self.tracked[ident] = Counter()
+
+    def untrack(self, ident):
+        with self.lock:
+            return self.tracked.pop(ident, Counter())
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                if not self.tracked:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self.tracked.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+def format_collapsed(stacks):
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+# -------------------------- SLOWEST REQUESTS --------------------------
+_background = None
+_background_lock = threading.Lock()
+_slowest = []                       # min-heap of (seconds, seq, record)
+_slowest_lock = threading.Lock()
+_seq = itertools.count()
+
+
+def _background_sampler():
+    global _background
+    with _background_lock:
+        if _background is None:
+            _background = Sampler(BACKGROUND_INTERVAL)
+            _background.start()
+    return _background
+
+
+def _keep_if_slow(record):
+    with _slowest_lock:
+        item = (record["seconds"], next(_seq), record)
+        if len(_slowest) < SLOWEST_KEEP:
+            heapq.heappush(_slowest, item)
+        elif item[0] > _slowest[0][0]:
+            heapq.heapreplace(_slowest, item)
+
+
+def slowest():
+    """Recorded slow units of work, slowest first (without their stacks)."""
+    with _slowest_lock:
+        records = [r for _, _, r in sorted(_slowest, key=lambda x: x[0], reverse=True)]
+    return [{k: v for k, v in r.items() if k != "stacks"} for r in records]
+
+
+def slowest_stacks(record_id):
+    """Collapsed stacks of one recorded slow unit of work, or None."""
+    with _slowest_lock:
+        for _, _, r in _slowest:
+            if r["id"] == record_id:
+                return format_collapsed(r["stacks"])
+    return None
+
+
+# -------------------------- UNIT OF WORK --------------------------
+class ProfileResult:
+    """What unit_of_work() captured: `path` is set when a file was written."""
+
+    def __init__(self):
+        self.path = None
+        self.seconds = None
+
+
+def _save(kind, suffix, write):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{kind}-{next(_seq)}.{suffix}"
+    path = os.path.join(PROFILE_DIR, name)
+    write(path)
+    return path
+
+
+@contextmanager
+def unit_of_work(kind, detail="", mode=None, stages=None):
+    """
+    Profile the enclosed block, run in the current thread.
+    - mode "sample" / "1" / "true" : write a collapsed-stacks file
+    - mode "cprofile"             : write a .pstats file
+    - no mode                     : only the background slowest-N recorder
+    `stages` ({stage: seconds}, see metrics.py) is copied into the
+    slow-request record at the end of the block.
+    """
+    result = ProfileResult()
+    ident = threading.get_ident()
+    mode = (mode or "").lower()
+
+    sampler = profiler = None
+    if mode in ("1", "true", "sample"):
+        sampler = Sampler(SAMPLE_INTERVAL)
+        sampler.track(ident)
+        sampler.start()
+    elif mode == "cprofile":
+        profiler = cProfile.Profile()
+
+    background = _background_sampler() if SLOWEST_KEEP > 0 else None
+    if background is not None:
+        background.track(ident)
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        result.seconds = time.perf_counter() - start
+
+        if background is not None:
+            stacks = background.untrack(ident)
+            _keep_if_slow({
+                "id": f"{kind}-{next(_seq)}",
+                "kind": kind,
+                "detail": detail,
+                "seconds": result.seconds,
+                "at": time.time(),
+                "stages": dict(stages or {}),
+                "stacks": stacks,
+            })
+
+        if sampler is not None:
+            stacks = sampler.untrack(ident)
+            sampler.stop()
+
+            def write(path):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(format_collapsed(stacks))
+
+            result.path = _save(kind, "collapsed", write)
+        elif profiler is not None:
+            result.path = _save(kind, "pstats", profiler.dump_stats)
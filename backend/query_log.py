@@ -0,0 +1,132 @@
+"""
+Structured log of the search queries, for replaying production load.
+
+One JSON line per /search or /search/batch request:
+    {"ts", "endpoint", "query", "params", "hits", "count", "status",
+     "ms", "stages": {stage: ms}, "generation"}
+- query : normalized (lowercase, single spaces), the form replayed
+- ms    : time until the response started (first line for stream=true)
+
+Requests never wait for the disk: records go through a queue
+(logging.QueueHandler) to a background thread (QueueListener) writing
+rotating files (DOCUFIND_QUERY_LOG_BYTES per file, DOCUFIND_QUERY_LOG_BACKUPS
+old files kept). Queries slower than DOCUFIND_SLOW_QUERY_MS are also
+written to DOCUFIND_SLOW_QUERY_LOG.
+
+Replay a log with: python -m bench.replay logs/queries.log (see bench/replay.py).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from contextvars import ContextVar
+
+QUERY_LOG = os.environ.get("DOCUFIND_QUERY_LOG", os.path.join("logs", "queries.log"))
+SLOW_QUERY_LOG = os.environ.get("DOCUFIND_SLOW_QUERY_LOG", os.path.join("logs", "slow_queries.log"))
+SLOW_QUERY_MS = float(os.environ.get("DOCUFIND_SLOW_QUERY_MS", "500"))
+MAX_BYTES = int(os.environ.get("DOCUFIND_QUERY_LOG_BYTES", str(50 * 1024 * 1024)))
+BACKUPS = int(os.environ.get("DOCUFIND_QUERY_LOG_BACKUPS", "5"))
+
+_current = ContextVar("docufind_query_log", default=None)
+_loggers = None
+_listener = None
+_lock = threading.Lock()
+
+
+def normalize(query):
+    return " ".join(query.lower().split())
+
+
+# -------------------------- WRITER --------------------------
+def _file_handler(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUPS,
+                                                   encoding="utf-8", delay=True)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+def _start():
+    """(query logger, slow query logger) writing through one background thread."""
+    global _loggers, _listener
+    with _lock:
+        if _loggers is None:
+            records = queue.SimpleQueue()
+            handlers = {}
+            if QUERY_LOG:
+                handlers["docufind.queries"] = _file_handler(QUERY_LOG)
+            if SLOW_QUERY_LOG:
+                handlers["docufind.slow_queries"] = _file_handler(SLOW_QUERY_LOG)
+
+            # One listener for both files: each handler only takes its logger's records
+            for name, handler in handlers.items():
+                handler.addFilter(logging.Filter(name))
+            _listener = logging.handlers.QueueListener(records, *handlers.values())
+            _listener.start()
+            atexit.register(stop)
+
+            _loggers = []
+            for name in ("docufind.queries", "docufind.slow_queries"):
+                logger = logging.getLogger(name)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.handlers = [logging.handlers.QueueHandler(records)] if name in handlers else []
+                _loggers.append(logger)
+    return _loggers
+
+
+def stop():
+    """Write the queued records and stop the writer thread."""
+    global _loggers, _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        _loggers = _listener = None
+
+
+def enabled():
+    return bool(QUERY_LOG or SLOW_QUERY_LOG)
+
+
+# -------------------------- REQUEST SIDE --------------------------
+def collect():
+    """Start collecting the query fields of the current request (filled by annotate())."""
+    entry = {}
+    _current.set(entry)
+    return entry
+
+
+def annotate(**fields):
+    """Add fields to the current request's log entry (ignored outside a request)."""
+    entry = _current.get()
+    if entry is not None:
+        entry.update(fields)
+
+
+def record(entry, stages, seconds, status, generation=None):
+    """Queue the log line of a request annotated as a query."""
+    if not entry or not enabled():
+        return
+    ms = round(seconds * 1000, 3)
+    line = {
+        "ts": round(time.time(), 3),
+        "endpoint": entry.pop("endpoint", None),
+        "query": entry.pop("query", None),
+        "params": entry.pop("params", {}),
+        **entry,
+        "status": status,
+        "ms": ms,
+        "stages": {stage: round(s * 1000, 3) for stage, s in stages.items()},
+        "generation": generation,
+    }
+    message = json.dumps(line, ensure_ascii=False, default=str)
+    queries, slow = _start()
+    queries.info(message)
+    if ms >= SLOW_QUERY_MS:
+        slow.info(message)
@@ -0,0 +1,133 @@
+"""
+Conditional and partial responses for /raw/{filename}.
+
+pdf.js (frontend viewer) can load a large PDF by byte ranges instead of
+downloading it in full, and browsers revalidate instead of re-downloading:
+- strong ETag = sha256 of the file content (the extraction cache key,
+  computed once per file version)
+- If-None-Match (or If-Modified-Since without it) -> 304 Not Modified
+- Range: bytes=a-b | a- | -n -> 206 Partial Content with Content-Range;
+  several ranges are answered with the whole file (200), an unsatisfiable
+  one with 416; If-Range is honoured
+- Cache-Control from DOCUFIND_RAW_CACHE_CONTROL
+"""
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi.responses import Response, StreamingResponse
+
+from extraction_cache import file_hash
+
+CACHE_CONTROL = os.environ.get("DOCUFIND_RAW_CACHE_CONTROL", "private, no-cache")
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+# -------------------------- VALIDATORS --------------------------
+def file_etag(path):
+    """Strong ETag of a file."""
+    return f'"{file_hash(path)}"'
+
+
+def not_modified(headers, etag, mtime):
+    """True when the client's cached copy is still valid."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison (RFC 9110 13.1.2)
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# -------------------------- RANGES --------------------------
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, or None when the
+    whole file should be sent (no / unsupported / multiple ranges).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    specs = header[len("bytes="):].split(",")
+    if len(specs) != 1:
+        return None
+
+    first, _, last = specs[0].strip().partition("-")
+    try:
+        if not first:
+            # suffix range: the last n bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def iter_file(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+# -------------------------- RESPONSE --------------------------
+def file_response(path, headers):
+    """Response for a GET of `path` given the request headers."""
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(path)
+    last_modified = formatdate(stat.st_mtime, usegmt=True)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    common = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if not_modified(headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=common)
+
+    # If-Range: only send a part when the client's copy is the current one
+    if_range = headers.get("if-range")
+    range_header = headers.get("range")
+    if if_range and if_range not in (etag, last_modified):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**common, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+        common["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = end - start + 1 if size else 0
+    common["Content-Length"] = str(length)
+    return StreamingResponse(iter_file(path, start, length), status_code=status,
+                             media_type=media_type, headers=common)
@@ -0,0 +1,440 @@
+"""
+Background, resumable reindex jobs (admin "Ré-indexer").
+
+The dashboard only creates a row in `reindex_jobs` and starts a detached
+worker process (python reindex_jobs.py --run <id>), then polls the row:
+closing the tab or rerunning the Streamlit script does not stop the job.
+
+The worker builds the new index in a staging SQLite file next to the
+database (documents, lemma counts, word_frequencies, statistics,
+compressed texts, MinHash signatures and near-duplicate groups).
+Each file is committed there together with its row in `job_files`, which
+is the checkpoint: a job interrupted by a crash is resumed by starting a
+worker again on the same id, and it skips the files already done (the
+files that failed are tried again). The live tables keep serving until
+every file is processed; they are then replaced by the staging tables in
+a single transaction.
+
+Job status: queued -> running -> completed | failed | cancelled, or
+interrupted when its worker died (then it can be resumed).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import traceback
+from collections import Counter
+
+import content_store
+import extraction_cache
+import lemmatizer
+import metrics
+import near_duplicates
+import paths
+import profiling
+import stats
+import token_filters
+
+DB_PATH = "search_engine.db"
+ACTIVE = ("queued", "running", "cancelling")
+# Progress is written to the jobs table at most this often (seconds)
+PROGRESS_EVERY = 0.5
+
+JOB_COLUMNS = (
+    "id", "status", "created_at", "started_at", "updated_at", "finished_at",
+    "total_files", "done_files", "failed_files", "run_started_at", "run_start_done",
+    "pid", "profile_mode", "profile_path", "error",
+)
+
+
+# -------------------------- JOB TABLE --------------------------
+def init_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reindex_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL,
+            created_at REAL,
+            started_at REAL,
+            updated_at REAL,
+            finished_at REAL,
+            total_files INTEGER DEFAULT 0,
+            done_files INTEGER DEFAULT 0,
+            failed_files INTEGER DEFAULT 0,
+            run_started_at REAL,
+            run_start_done INTEGER DEFAULT 0,
+            pid INTEGER,
+            profile_mode TEXT,
+            profile_path TEXT,
+            error TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reindex_job_errors (
+            job_id INTEGER,
+            filename TEXT,
+            error TEXT,
+            at REAL
+        )
+    """)
+    conn.commit()
+
+
+def get_job(conn, job_id):
+    row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM reindex_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def latest_job(conn):
+    init_tables(conn)
+    row = conn.execute("SELECT MAX(id) FROM reindex_jobs").fetchone()
+    if not row[0]:
+        return None
+    check_alive(conn, row[0])
+    return get_job(conn, row[0])
+
+
+def job_errors(conn, job_id, limit=50):
+    return conn.execute("""
+        SELECT filename, error FROM reindex_job_errors
+        WHERE job_id = ? ORDER BY at DESC LIMIT ?
+    """, (job_id, limit)).fetchall()
+
+
+def update_job(conn, job_id, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(f"UPDATE reindex_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+
+
+def pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # A finished child of this process stays a zombie until reaped
+    try:
+        done, _ = os.waitpid(pid, os.WNOHANG)
+        return done == 0
+    except ChildProcessError:
+        return True
+
+
+def check_alive(conn, job_id):
+    """Mark an active job whose worker is gone as interrupted."""
+    job = get_job(conn, job_id)
+    if job and job["status"] in ("running", "cancelling") and not pid_alive(job["pid"]):
+        update_job(conn, job_id, status="interrupted")
+
+
+def progress(job, now=None):
+    """(fraction done, files per second of the current run, ETA in seconds or None)."""
+    now = now or time.time()
+    total = job["total_files"] or 0
+    done = job["done_files"] + job["failed_files"]
+    fraction = done / total if total else 0.0
+
+    elapsed = now - (job["run_started_at"] or now)
+    run_done = done - (job["run_start_done"] or 0)
+    rate = run_done / elapsed if elapsed > 0 and run_done > 0 else 0.0
+    eta = (total - done) / rate if rate and job["status"] == "running" else None
+    return fraction, rate, eta
+
+
+# -------------------------- LAUNCHING --------------------------
+def staging_path(db_path, job_id):
+    return f"{db_path}.reindex-{job_id}"
+
+
+def spawn_worker(job_id, db_path=DB_PATH):
+    """Detached worker process: survives the Streamlit script run."""
+    log = open(staging_path(db_path, job_id) + ".log", "a")
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--run", str(job_id), "--db", db_path],
+        cwd=os.getcwd(), stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+    )
+    log.close()
+
+
+def start_job(db_path=DB_PATH, profile_mode=None):
+    """Create and launch a job; the active job instead if there is one."""
+    conn = sqlite3.connect(db_path)
+    init_tables(conn)
+    job = latest_job(conn)
+    if job and job["status"] in ACTIVE:
+        conn.close()
+        return job["id"]
+
+    cursor = conn.execute(
+        "INSERT INTO reindex_jobs (status, created_at, updated_at, profile_mode) VALUES ('queued', ?, ?, ?)",
+        (time.time(), time.time(), profile_mode),
+    )
+    conn.commit()
+    job_id = cursor.lastrowid
+    conn.close()
+    spawn_worker(job_id, db_path)
+    return job_id
+
+
+def resume_job(job_id, db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    update_job(conn, job_id, status="queued", error=None)
+    conn.close()
+    spawn_worker(job_id, db_path)
+
+
+def cancel_job(job_id, db_path=DB_PATH):
+    """Ask the worker to stop after the current file (the live index is untouched)."""
+    conn = sqlite3.connect(db_path)
+    job = get_job(conn, job_id)
+    if job and job["status"] in ACTIVE:
+        update_job(conn, job_id, status="cancelling" if pid_alive(job["pid"]) else "cancelled")
+    conn.close()
+
+
+# -------------------------- STAGING --------------------------
+def remove_staging(path):
+    for leftover in (path, path + "-journal", path + ".log"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+
+
+def create_index_tables(conn):
+    """documents / word_frequencies / statistics / texts, as written by app.py."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT UNIQUE,
+            filetype TEXT,
+            content TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS word_frequencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER,
+            word TEXT,
+            count INTEGER,
+            FOREIGN KEY(document_id) REFERENCES documents(id)
+        )
+    """)
+    stats.init_stats_tables(conn)
+    token_filters.init_tables(conn)
+    near_duplicates.init_tables(conn)
+    content_store.ContentStore(conn)
+    conn.commit()
+
+
+def open_staging(path):
+    conn = sqlite3.connect(path)
+    create_index_tables(conn)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_unique_word_per_doc
+        ON word_frequencies (document_id, word)
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_files (
+            filename TEXT PRIMARY KEY,
+            status TEXT,
+            error TEXT
+        )
+    """)
+    conn.commit()
+    return conn
+
+
+def index_file(conn, texts, filename, filetype, content, lemmas, token_filter):
+    """Write one document into the staging tables (replacing a partial attempt)."""
+    cursor = conn.cursor()
+    row = cursor.execute("SELECT id FROM documents WHERE filename = ?", (filename,)).fetchone()
+    if row:
+        stats.forget_document(cursor, row[0])
+        token_filters.forget_document(cursor, row[0])
+        cursor.execute("DELETE FROM word_frequencies WHERE document_id = ?", (row[0],))
+        cursor.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+    cursor.execute(
+        "INSERT INTO documents (filename, filetype, content) VALUES (?, ?, NULL)", (filename, filetype)
+    )
+    indexed = token_filters.write_document(cursor, cursor.lastrowid, filename, lemmas, token_filter)
+    with metrics.timed("minhash"):
+        near_duplicates.save_signature(cursor, filename, near_duplicates.signature(content))
+    texts[filename] = content
+    return len(indexed)
+
+
+SWAPPED_TABLES = {
+    "documents": "id, filename, filetype, content",
+    "word_frequencies": "id, document_id, word, count",
+    "corpus_stats": "id, total_docs, total_words, unique_words",
+    "document_stats": "document_id, filename, word_count, occurrences",
+    "term_stats": "word, doc_count, occurrences",
+    "lemma_counts": "document_id, word, count",
+    "applied_filter": "id, stopwords, min_length",
+    "minhash_signatures": "filename, signature",
+    "near_duplicate_groups": "filename, group_id, similarity",
+    "content_dicts": "id, codec, data",
+    "content_blocks": "id, codec, dict_id, data, size",
+    "content_docs": "filename, block_id, start, length",
+}
+
+
+def swap_in(conn, staging):
+    """Replace the live tables by the staging ones in one transaction."""
+    create_index_tables(conn)
+    conn.execute("ATTACH DATABASE ? AS staging", (staging,))
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        for table, columns in SWAPPED_TABLES.items():
+            conn.execute(f"DELETE FROM main.{table}")
+            conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM staging.{table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE staging")
+
+
+# -------------------------- WORKER --------------------------
+def run(job_id, db_path=DB_PATH, documents_dir=None):
+    documents_dir = documents_dir or paths.DOCUMENTS_DIR
+    conn = sqlite3.connect(db_path, timeout=30)
+    init_tables(conn)
+    job = get_job(conn, job_id)
+    if job is None:
+        raise SystemExit(f"Unknown job {job_id}")
+    if job["status"] != "queued":
+        # cancelled before the worker started, or already handled
+        if job["status"] == "cancelled":
+            remove_staging(staging_path(db_path, job_id))
+        return
+
+    staging = staging_path(db_path, job_id)
+    stage_conn = open_staging(staging)
+    texts = content_store.ContentStore(stage_conn)
+    # Filter of the job's first run; later stopword edits are synced after the swap
+    token_filter = token_filters.applied_filter(stage_conn)
+    if token_filter is None:
+        token_filter = token_filters.current()
+        token_filters.record_filter(stage_conn, token_filter)
+        stage_conn.commit()
+
+    files = sorted(os.listdir(documents_dir))
+    # Files that failed in an earlier run go back in the queue
+    stage_conn.execute("DELETE FROM job_files WHERE status = 'error'")
+    stage_conn.commit()
+    done = {f for f, in stage_conn.execute("SELECT filename FROM job_files")}
+    n_done, n_failed = len(done), 0
+    now = time.time()
+    update_job(
+        conn, job_id, status="running", pid=os.getpid(), total_files=len(files),
+        started_at=job["started_at"] or now, run_started_at=now,
+        run_start_done=n_done + n_failed, done_files=n_done, failed_files=n_failed,
+    )
+
+    stages = metrics.collect_stages()
+    start = time.perf_counter()
+    indexed_docs = 0
+    last_progress = 0.0
+
+    with profiling.unit_of_work("reindex", documents_dir, mode=job["profile_mode"]) as prof:
+        for file in files:
+            if file in done:
+                continue
+            if get_job(conn, job_id)["status"] == "cancelling":
+                # The live tables were never touched: drop the staging file
+                stage_conn.close()
+                remove_staging(staging)
+                update_job(conn, job_id, status="cancelled", finished_at=time.time(),
+                           done_files=n_done, failed_files=n_failed)
+                return
+
+            path = os.path.join(documents_dir, file)
+            try:
+                if not extraction_cache.supported(file):
+                    # Unsupported format: counted as processed, nothing indexed
+                    stage_conn.execute("INSERT OR REPLACE INTO job_files VALUES (?, 'skipped', NULL)", (file,))
+                    stage_conn.commit()
+                    n_done += 1
+                    continue
+
+                with metrics.timed("normalisation"):
+                    # Page by page, by chunks: a huge PDF is lemmatized as
+                    # pdfminer reads it, with a bounded spaCy Doc size
+                    lemmas = Counter()
+                    for chunk in extraction_cache.text_chunks(extraction_cache.extract_pages(path)):
+                        lemmas.update(lemmatizer.lemmatisation(chunk))
+                with metrics.timed("acquisition"):
+                    # Cached by extract_pages()
+                    content = extraction_cache.extract(path)
+
+                with metrics.timed("db_write"):
+                    index_file(stage_conn, texts, file, os.path.splitext(file)[1].lower(),
+                               content, lemmas, token_filter)
+                    # Checkpoint: the document and its job_files row are committed together
+                    stage_conn.execute("INSERT OR REPLACE INTO job_files VALUES (?, 'done', NULL)", (file,))
+                    stage_conn.commit()
+                n_done += 1
+                indexed_docs += 1
+
+            except Exception as e:
+                stage_conn.rollback()
+                stage_conn.execute("INSERT OR REPLACE INTO job_files VALUES (?, 'error', ?)", (file, repr(e)))
+                stage_conn.commit()
+                conn.execute(
+                    "INSERT INTO reindex_job_errors (job_id, filename, error, at) VALUES (?, ?, ?, ?)",
+                    (job_id, file, repr(e), time.time()),
+                )
+                n_failed += 1
+
+            if time.time() - last_progress >= PROGRESS_EVERY:
+                update_job(conn, job_id, done_files=n_done, failed_files=n_failed)
+                last_progress = time.time()
+
+        update_job(conn, job_id, done_files=n_done, failed_files=n_failed)
+
+        # ---- Near-duplicate groups over all the signatures (LSH, linear)
+        with metrics.timed("near_duplicates"):
+            near_duplicates.rebuild_groups(stage_conn)
+
+        # ---- Swap: the old index served every query until here
+        with metrics.timed("swap"):
+            swap_in(conn, staging)
+            # Stopwords edited while the job ran
+            token_filters.sync_database(conn)
+
+    elapsed = time.perf_counter() - start
+    metrics.save_indexing_run(conn, indexed_docs, elapsed, stages)
+    update_job(conn, job_id, status="completed", finished_at=time.time(), profile_path=prof.path)
+
+    stage_conn.close()
+    conn.close()
+    remove_staging(staging)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a DocuFind reindex job")
+    parser.add_argument("--run", type=int, required=True, help="job id")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    try:
+        run(args.run, args.db)
+    except Exception as e:
+        traceback.print_exc()
+        conn = sqlite3.connect(args.db)
+        update_job(conn, args.run, status="failed", error=json.dumps(repr(e)))
+        conn.close()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
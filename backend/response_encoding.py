@@ -0,0 +1,173 @@
+"""
+Encoding of the API responses: fast JSON, NDJSON streams, compression.
+
+- FastJSONResponse : JSON rendered with orjson when it is installed (several
+                     times faster than json.dumps on large result lists),
+                     the standard encoder otherwise
+- ndjson()         : one JSON document per line, sent as soon as it is
+                     produced (/search?stream=true)
+- CompressionMiddleware : br (when `brotli` is installed) or gzip, chosen
+                     from Accept-Encoding, for JSON / NDJSON / text bodies
+                     of at least DOCUFIND_COMPRESS_MIN_BYTES. Streamed
+                     bodies are compressed chunk by chunk and flushed after
+                     each one, so a streamed result still reaches the
+                     client at once. Byte-range responses (/raw) are left
+                     alone: their ranges refer to the uncompressed file.
+"""
+import json
+import os
+import zlib
+
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+NDJSON = "application/x-ndjson"
+MIN_BYTES = int(os.environ.get("DOCUFIND_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+COMPRESSIBLE = ("application/json", NDJSON, "text/")
+
+
+# -------------------------- JSON --------------------------
+def dumps(content):
+    """JSON bytes of `content`."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+def ndjson(documents, headers=None):
+    """Streaming response of an iterable of JSON documents, one per line."""
+    return StreamingResponse((dumps(d) + b"\n" for d in documents), media_type=NDJSON, headers=headers)
+
+
+# -------------------------- COMPRESSION --------------------------
+class GzipStream:
+    def __init__(self):
+        self.z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.z.compress(data)
+
+    def flush(self):
+        return self.z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.z.flush()
+
+
+class BrotliStream:
+    def __init__(self):
+        self.c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self.c.process(data)
+
+    def flush(self):
+        return self.c.flush()
+
+    def finish(self):
+        return self.c.finish()
+
+
+def choose_encoding(accept_encoding):
+    """"br", "gzip" or None from an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compressible(status, headers):
+    if status in (204, 206, 304) or "content-encoding" in headers:
+        return False
+    if "content-range" in headers or "accept-ranges" in headers:
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE)
+
+
+class CompressionMiddleware:
+    """ASGI middleware, see the module docstring."""
+
+    def __init__(self, app, minimum_size=MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        stream = None           # compressor, once the body is known to be compressed
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Sent with the first body chunk, once we know whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if stream is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if not compressible(start["status"], headers) or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                stream = BrotliStream() if encoding == "br" else GzipStream()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more:
+                    del headers["Content-Length"]
+                else:
+                    body = stream.compress(body) + stream.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            data = stream.compress(body) + (stream.flush() if more else stream.finish())
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
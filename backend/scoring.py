@@ -0,0 +1,264 @@
+"""
+Vectorized ranking over a sparse term-document matrix (NumPy / SciPy).
+
+The lemma counts (search_engine.FREQS) are kept as a term-major CSR matrix
+(n_terms x n_docs, columns = DOC_IDS ids) holding precomputed weights.
+A query is a sparse 1 x n_terms vector (one entry per query word
+occurrence), so scoring a query is a single sparse product touching only
+the posting rows of its terms, followed by argpartition for the top-k.
+A batch of queries is one (n_queries x n_terms) @ (n_terms x n_docs) product.
+
+Weightings:
+- "count" : raw counts, same ranking as the historical per-hit SQL loop
+- "tfidf" : (1 + log tf) * log(N / df)
+- "logtf" : 1 + log tf, the idf coming with each query (rank(weights=)):
+            a shard scores with the idf of the whole corpus (see shards.py)
+
+A matrix is a snapshot: documents re-indexed after it was built are
+scored from their current counts (Changes), with the same weighting, until
+the next matrix is ready.
+
+numpy / scipy are optional: without them available() is False and /search
+keeps the per-hit SQL scoring.
+"""
+import math
+from array import array
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+def available():
+    return sparse is not None
+
+
+class ScoringMatrix:
+    """Precomputed term-document weights for one set of DOC_IDS."""
+
+    def __init__(self, matrix, vocab, present, idf=None):
+        self.matrix = matrix.tocsr()
+        self.vocab = vocab                 # term -> row
+        self.present = present             # bool per doc id: known to the source
+        self.idf = idf                     # per row with "tfidf", None with "count"
+        self.order = None                  # doc id -> rank of its filename (ties), see name_order()
+        self.sources = {}                  # filename -> Counter the matrix was built from
+
+    # -------------------------- BUILDING --------------------------
+    @classmethod
+    def from_triples(cls, triples, n_docs, weighting="count", documents=()):
+        """
+        Build from (doc_id, word, count) triples. `documents` adds the ids of
+        documents without any triple: they count in the idf like the others.
+        """
+        vocab, rows, cols, data = {}, [], [], []
+        for doc_id, word, count in triples:
+            rows.append(vocab.setdefault(word, len(vocab)))
+            cols.append(doc_id)
+            data.append(count)
+
+        present = np.zeros(n_docs, dtype=bool)
+        present[np.asarray(cols, dtype=np.int64)] = True
+        present[np.asarray(list(documents), dtype=np.int64)] = True
+
+        counts = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.int64), (rows, cols)),
+            shape=(len(vocab), n_docs),
+        )
+        counts.sum_duplicates()
+        n_present = int(present.sum())
+        idf = inverse_df(counts, n_present) if weighting == "tfidf" else None
+        return cls(weigh(counts, weighting, n_present), vocab, present, idf)
+
+    @classmethod
+    def from_freqs(cls, freqs, doc_ids, weighting="count"):
+        """
+        Build from search_engine.FREQS ({filename: Counter}), the lemma
+        counts the index and the shards are built from.
+        """
+        ids = {filename: doc_ids.add(filename) for filename in freqs}
+        triples = (
+            (ids[filename], word, count)
+            for filename, counter in freqs.items()
+            for word, count in counter.items()
+        )
+        matrix = cls.from_triples(triples, len(doc_ids), weighting, documents=ids.values())
+        matrix.order = name_order(doc_ids, matrix.matrix.shape[1])
+        matrix.sources = dict(freqs)
+        return matrix
+
+    # -------------------------- SCORING --------------------------
+    def query_matrix(self, queries, weights=None):
+        """
+        (n_queries x n_terms) matrix, one entry per known query word
+        occurrence: 1, or weights[term] ({term: weight}, 0 when missing).
+        """
+        rows, cols, data = [], [], []
+        for i, terms in enumerate(queries):
+            for term in terms:
+                col = self.vocab.get(term)
+                if col is not None:
+                    rows.append(i)
+                    cols.append(col)
+                    data.append(1 if weights is None else weights.get(term, 0.0))
+        dtype = self.matrix.dtype if weights is None else np.float64
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=dtype), (rows, cols)),
+            shape=(len(queries), len(self.vocab)),
+        )
+
+    def scores(self, terms, weights=None):
+        """Dense score of every document for one query."""
+        return (self.query_matrix([terms], weights) @ self.matrix).toarray().ravel()
+
+    def known(self, ids):
+        """Keep the ids present in the matrix."""
+        ids = ids[ids < len(self.present)]
+        return ids[self.present[ids]]
+
+    def count_scores(self, terms, counters):
+        """Scores of documents given by their Counters, weighted as the matrix."""
+        scores = np.zeros(len(counters), dtype=self.matrix.dtype)
+        n_docs = max(int(self.present.sum()), 1)
+        for j, counts in enumerate(counters):
+            for term in terms:
+                tf = counts.get(term, 0)
+                if not tf:
+                    continue
+                if self.idf is None:
+                    scores[j] += tf
+                else:
+                    row = self.vocab.get(term)
+                    # A term unknown to the matrix was in no document of its source
+                    idf = self.idf[row] if row is not None else math.log(n_docs)
+                    scores[j] += (1.0 + math.log(tf)) * idf
+        return scores
+
+    def rank(self, terms, candidates=None, k=None, changes=None, weights=None):
+        """
+        Best documents for one query as (doc_ids, scores), score desc then
+        filename. `candidates` (PostingList / ids) restricts the documents,
+        e.g. to the boolean result of recherche(); `changes` (Changes) holds
+        the documents re-indexed since the matrix was built; `weights` the
+        weight of each query term (see query_matrix).
+        """
+        scores = self.scores(terms, weights)
+        if candidates is None:
+            ids = np.flatnonzero(scores)
+        else:
+            ids = candidate_ids(candidates)
+        return self._top(terms, ids, scores, candidates is None, k, changes)
+
+    def rank_batch(self, queries, candidates=None, k=10, changes=None):
+        """
+        rank() for many queries with one sparse product.
+        `candidates` is None or one candidate set per query, `k` one value
+        for all the queries or one per query.
+        """
+        product = (self.query_matrix(queries) @ self.matrix).tocsr()
+        limits = k if isinstance(k, (list, tuple)) else [k] * len(queries)
+        ranked = []
+        for i in range(len(queries)):
+            start, end = product.indptr[i], product.indptr[i + 1]
+            if candidates is None and (changes is None or not len(changes.ids)):
+                ids, values = product.indices[start:end], product.data[start:end]
+                keep = self.present[ids]
+                ranked.append(top_k(ids[keep], values[keep], limits[i], self.order))
+                continue
+            scores = np.zeros(self.matrix.shape[1], dtype=self.matrix.dtype)
+            scores[product.indices[start:end]] = product.data[start:end]
+            if candidates is None:
+                ids = product.indices[start:end].astype(np.int64)
+            else:
+                ids = candidate_ids(candidates[i])
+            ranked.append(self._top(queries[i], ids, scores, candidates is None, limits[i], changes))
+        return ranked
+
+    def _top(self, terms, ids, scores, any_document, k, changes):
+        if changes is None or not len(changes.ids):
+            ids = self.known(ids)
+            return top_k(ids, scores[ids], k, self.order)
+
+        # Re-indexed documents: current counts instead of the matrix column
+        changed = changes.ids if any_document else ids[np.isin(ids, changes.ids)]
+        ids = self.known(ids[~np.isin(ids, changes.ids)])
+        extra = self.count_scores(terms, [changes.counts[i] for i in changed.tolist()])
+        if any_document:
+            changed, extra = changed[extra > 0], extra[extra > 0]
+        return top_k(np.concatenate([ids, changed]), np.concatenate([scores[ids], extra]), k, changes.order)
+
+
+class Changes:
+    """
+    Documents whose counts in `freqs` are not the ones `matrix` was built
+    from (new or re-indexed since), with the filename order of every doc id.
+    """
+
+    def __init__(self, matrix, freqs, doc_ids):
+        """`freqs`: (filename, Counter) pairs of the current documents."""
+        self.counts = {
+            doc_ids.add(filename): counts
+            for filename, counts in freqs
+            if matrix.sources.get(filename) is not counts
+        }
+        self.ids = np.fromiter(sorted(self.counts), dtype=np.int64, count=len(self.counts))
+        self.order = name_order(doc_ids, len(doc_ids))
+
+
+# -------------------------- HELPERS --------------------------
+def weigh(counts, weighting, n_docs=None):
+    """Weights of a term-document count matrix (`n_docs`: documents of the source)."""
+    if weighting == "count":
+        return counts
+    if weighting == "tfidf":
+        df = np.diff(counts.indptr)              # CSR rows = terms
+        weights = counts.astype(np.float64)
+        weights.data = (1.0 + np.log(weights.data)) * np.repeat(inverse_df(counts, n_docs), df)
+        return weights
+    if weighting == "logtf":
+        weights = counts.astype(np.float64)
+        weights.data = 1.0 + np.log(weights.data)
+        return weights
+    raise ValueError(f"Unknown weighting: {weighting}")
+
+
+def inverse_df(counts, n_docs=None):
+    """log(N / df) of every row (term) of a term-document count matrix."""
+    n_docs = max(n_docs or counts.shape[1], 1)
+    return np.log(n_docs / np.maximum(np.diff(counts.indptr), 1))
+
+
+def candidate_ids(candidates):
+    """Doc ids of a PostingList (array('I') buffer, no copy) or any iterable."""
+    ids = getattr(candidates, "ids", candidates)
+    if isinstance(ids, array) and ids.itemsize == 4:
+        return np.frombuffer(ids, dtype=np.uint32).astype(np.int64) if len(ids) else np.zeros(0, dtype=np.int64)
+    return np.fromiter(ids, dtype=np.int64)
+
+
+def name_order(doc_ids, n_docs):
+    """
+    Rank of the filename of each of the first n_docs ids: equal scores are
+    ordered by filename, as the shards do (see shards.py).
+    """
+    names = doc_ids.names[:n_docs]
+    order = np.empty(len(names), dtype=np.int64)
+    order[sorted(range(len(names)), key=names.__getitem__)] = np.arange(len(names))
+    return order
+
+
+def top_k(ids, scores, k=None, order=None):
+    """
+    Sort (ids, scores) by score desc then id (or order[id]); keep the k best.
+    The documents tied with the k-th score are all sorted before cutting,
+    so the result does not depend on argpartition's choice among them.
+    """
+    tiebreak = ids if order is None else order[ids]
+    if k is not None and 0 < k < len(ids):
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        best = scores >= kth
+        ids, scores, tiebreak = ids[best], scores[best], tiebreak[best]
+    ranking = np.lexsort((tiebreak, -scores))[:k]
+    return ids[ranking], scores[ranking]
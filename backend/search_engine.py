@@ -1,110 +1,107 @@
+import bisect
 import os
-import re
 import glob
 import sqlite3
+import threading
+import time
 from collections import Counter, defaultdict
-from pdfminer.high_level import extract_text
-import docx
 
-import spacy
-# Load French model once
-nlp = spacy.load("fr_core_news_sm")
+import extraction_cache
+import facets
+import lemmatizer
+import metrics
+import near_duplicates
+import passages
+import paths
+import token_filters
+from postings import DocIds, PostingList, EMPTY
+from segments import SegmentedIndex
+from content_store import ContentStore
+from lemmatizer import WORD_PATTERN, lemmatisation
 
 DB_PATH = "search_engine.db"
-DOCUMENTS_DIR = "documents"
-STOPWORDS_FILE = "stopwords.txt"
-
-
-# -------------------------- STOPWORDS LOADING --------------------------
-def load_stopwords():
-    stopwords = set()
-    if os.path.exists(STOPWORDS_FILE):
-        with open(STOPWORDS_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                w = line.strip().lower()
-                if w:
-                    stopwords.add(w)
-    return stopwords
-
-
-STOPWORDS = load_stopwords()
+DOCUMENTS_DIR = paths.DOCUMENTS_DIR
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".docx")
+# Compressed text of the indexed documents (see content_store.py)
+CONTENT_STORE_PATH = os.environ.get("DOCUFIND_CONTENT_STORE", "content_store.db")
+# Documents read and normalized together at startup
+LOAD_BATCH = 200
 
 
 # -------------------------- NORMALISATION --------------------------
-"""
-def normalisation(text: str):
-     
-    Same logic as your Streamlit version: lowercase, keep alphabetic tokens,
-    remove stopwords.
-     
-    text = text.lower()
-    tokens = re.findall(r"[a-zA-ZÀ-ÿ'-]+", text)
-    tokens = [t for t in tokens if t not in STOPWORDS]
-    return tokens
-"""
-
-def normalisation(text: str):
+# lemmatisation(text): unfiltered lemmas of a French text (see lemmatizer.py)
+def count_lemmas(text):
     """
-    Full normalization for French:
-    - lowercase
-    - extract alphabetic tokens
-    - lemmatization (infinitive form)
-    - remove stopwords & short words
+    Counter of the unfiltered lemmas of a text of any size, or of its pages
+    (extraction_cache.extract_pages): lemmatized by chunks (see
+    extraction_cache.text_chunks), so a 2,000-page PDF never becomes one
+    giant spaCy Doc.
     """
-    text = text.lower()
-
-    # Extract only alphabetic words
-    tokens = re.findall(r"[a-zA-ZÀ-ÿ'-]+", text)
+    counts = Counter()
+    for chunk in extraction_cache.text_chunks(text):
+        counts.update(lemmatisation(chunk))
+    return counts
 
-    # Join tokens back so spaCy can process them
-    doc = nlp(" ".join(tokens))
 
-    normalized = []
-    for token in doc:
-        lemma = token.lemma_.lower().strip()
+def positioned_lemmas(text: str):
+    """
+    (words, lemmas) of a text for passages.py: the (start, end) offsets of
+    its words in `text` and its unfiltered lemmas as (word number, lemma),
+    lemmatized by chunks of about extraction_cache.CHUNK_CHARS characters.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # Rare characters changing length in lowercase: keep the offsets right
+        lowered = text
+    words = [m.span() for m in WORD_PATTERN.finditer(lowered)]
+
+    lemmas = []
+    first = 0
+    while first < len(words):
+        last, size = first, 0
+        while last < len(words) and (last == first or size < extraction_cache.CHUNK_CHARS):
+            size += words[last][1] - words[last][0] + 1
+            last += 1
+        # Where each word starts in the text given to spaCy
+        tokens, starts, position = [], [], 0
+        for start, end in words[first:last]:
+            tokens.append(lowered[start:end])
+            starts.append(position)
+            position += end - start + 1
+        for token in lemmatizer.model()(" ".join(tokens)):
+            lemma = token.lemma_.lower().strip()
+            if lemma and lemma.isalpha():
+                lemmas.append((first + bisect.bisect_right(starts, token.idx) - 1, lemma))
+        first = last
+    return words, lemmas
 
-        if (
-            lemma
-            and lemma not in STOPWORDS
-            and len(lemma) > 2
-            and lemma.isalpha()
-        ):
-            normalized.append(lemma)
 
-    return normalized
+def normalisation(text: str):
+    """Lemmas without the stopwords & short words (current filter)."""
+    return token_filters.current().terms(lemmatisation(text))
 
 # -------------------------- FILE READERS --------------------------
-def lire_pdf(filepath):
-    try:
-        return extract_text(filepath)
-    except Exception:
-        return ""
-
-
-def lire_docx(filepath):
-    try:
-        doc = docx.Document(filepath)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception:
-        return ""
+# Raw extractors; acquisition() goes through the shared cache instead
+from extraction_cache import lire_pdf, lire_docx
 
 
 # -------------------------- ACQUISITION --------------------------
-def acquisition(path=DOCUMENTS_DIR):
+def acquisition(path=DOCUMENTS_DIR, keep=None):
+    """
+    Read every supported file of `path`.
+    `keep(filename)` optionally selects a subset (e.g. one shard).
+    """
     corpus = {}
     for filepath in glob.glob(os.path.join(path, "*")):
         filename = os.path.basename(filepath)
+        if keep is not None and not keep(filename):
+            continue
 
         try:
-            if filename.endswith(".txt"):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    corpus[filename] = f.read()
-
-            elif filename.endswith(".pdf"):
-                corpus[filename] = lire_pdf(filepath)
-
-            elif filename.endswith(".docx"):
-                corpus[filename] = lire_docx(filepath)
+            with metrics.timed("acquisition"):
+                if filename.endswith(SUPPORTED_EXTENSIONS):
+                    # Parsed once per file version (see extraction_cache.py)
+                    corpus[filename] = extraction_cache.extract(filepath)
 
         except Exception as e:
             print(f" Error reading {filename}: {e}")
@@ -114,62 +111,245 @@ def acquisition(path=DOCUMENTS_DIR):
 
 # -------------------------- EXTRACTION --------------------------
 def extraction(corpus):
+    """
+    {filename: Counter of the unfiltered lemmas}. In passage mode the
+    documents are also cut into passages (PASSAGES) from the same
+    lemmatization.
+    """
     freqs = {}
     for filename, content in corpus.items():
-        tokens = normalisation(content)
-        freqs[filename] = Counter(tokens)
+        with metrics.timed("normalisation"):
+            if PASSAGES is None:
+                freqs[filename] = count_lemmas(content)
+            else:
+                words, lemmas = positioned_lemmas(content)
+                freqs[filename] = Counter(lemma for _, lemma in lemmas)
+                pages = extraction_cache.page_starts(content) if filename.lower().endswith(".pdf") else None
+                PASSAGES.add(filename, words, lemmas, pages)
+        metrics.DOCS_INDEXED.inc()
     return freqs
 
 
 # -------------------------- INDEXATION --------------------------
-def build_index(freqs):
-    index = defaultdict(set)
-    for filename, counter in freqs.items():
-        for word in counter.keys():
-            index[word].add(filename)
+def build_index(freqs, doc_ids=None):
+    """
+    Inverted index: word -> PostingList of integer doc ids (see postings.py).
+    Filenames are mapped to ids through `doc_ids` (DOC_IDS by default).
+    """
+    doc_ids = DOC_IDS if doc_ids is None else doc_ids
+    lists = defaultdict(list)
+    with metrics.timed("index_build"):
+        for filename, counter in freqs.items():
+            doc_id = doc_ids.add(filename)
+            for word in counter.keys():
+                lists[word].append(doc_id)
+        index = {word: PostingList(ids) for word, ids in lists.items()}
     return index
 
 
+def publish_index_metrics(index, freqs, generation):
+    """Index size gauges exported on /metrics."""
+    metrics.INDEX_DOCUMENTS.set(len(freqs))
+    metrics.INDEX_TERMS.set(len(index))
+    metrics.INDEX_POSTINGS.set(sum(len(p) for p in index.values()))
+    metrics.INDEX_POSTING_BYTES.set(sum(p.nbytes for p in index.values()))
+    metrics.INDEX_GENERATION.set(generation)
+
+
 # -------------------------- RECHERCHE --------------------------
-def recherche(query: str, index):
+def recherche(query: str, index, expansions=None, token_filter=None):
     """
     Recherche en français :
     - "mot1 mot2"        => OU par défaut
     - "mot1 et mot2"    => ET
     - "mot1 ou mot2"    => OU
+    - "neuro*", "r?seau" => jokers (résolus par l'appelant dans `expansions`)
+    Returns a PostingList of doc ids (DOC_IDS.filenames() gives the names).
+    The index holds every lemma: stopwords / short words match nothing.
+    `expansions` ({mot: [terms]}, see ngrams.py / wildcards.py) replaces a
+    word by the union of the terms it matches (wildcards "neuro*", "r?seau",
+    substring / typo-tolerant modes). `token_filter` replaces the current
+    stopwords.txt filter (named collections, see named_collections.py).
     """
     q = query.lower().strip()
+    keep = (token_filter or token_filters.current()).keep
+
+    def postings(mot):
+        if expansions is not None and mot in expansions:
+            return PostingList.merge_all([index.get(t, EMPTY) for t in expansions[mot] if keep(t)])
+        return index.get(mot, EMPTY) if keep(mot) else EMPTY
 
     # ----- Détection opérateurs -----
     if " et " in q:
         mot1, mot2 = q.split(" et ", 1)
-        set1 = index.get(mot1, set())
-        set2 = index.get(mot2, set())
+        set1 = postings(mot1)
+        set2 = postings(mot2)
         return set1 & set2   # ET
 
     if " ou " in q:
         mot1, mot2 = q.split(" ou ", 1)
-        set1 = index.get(mot1, set())
-        set2 = index.get(mot2, set())
+        set1 = postings(mot1)
+        set2 = postings(mot2)
         return set1 | set2   # OU
 
     # ----- OU par défaut pour plusieurs mots -----
     mots = q.split()
 
     if len(mots) == 1:
-        return index.get(mots[0], set())
+        return postings(mots[0])
 
     # Sinon : OU pour tous les mots
-    result = set()
-    for m in mots:
-        result |= index.get(m, set())
+    return PostingList.union_all([postings(m) for m in mots])
 
-    return result
+
+class CachedIndex:
+    """index.get() memoized: a batch of queries fetches each posting list once."""
+
+    def __init__(self, index):
+        self.index = index
+        self.cache = {}
+
+    def get(self, word, default=None):
+        if word not in self.cache:
+            self.cache[word] = self.index.get(word)
+        postings = self.cache[word]
+        return default if postings is None else postings
+
+
+# -------------------------- NEAR-DUPLICATES --------------------------
+# MinHash / LSH of the indexed texts (see near_duplicates.py)
+DUPLICATES = near_duplicates.NearDuplicateIndex()
+
+
+def detect_duplicates(corpus):
+    with metrics.timed("minhash"):
+        for filename, content in corpus.items():
+            DUPLICATES.add(filename, content)
+
+
+# -------------------------- FACETS --------------------------
+# Type / size / month / pages bitsets over DOC_IDS (see facets.py)
+FACET_INDEX = facets.FacetIndex()
+
+
+def index_facets(filenames, path=DOCUMENTS_DIR):
+    with metrics.timed("facets"):
+        FACET_INDEX.index_files(DOC_IDS, path, filenames)
+
+
+# -------------------------- INCREMENTAL REFRESH --------------------------
+# filename -> mtime of the indexed version
+FILE_STATE = {}
+# Filenames deleted since startup (see tombstones.py)
+DELETED = set()
+_refresh_lock = threading.Lock()
+
+
+def scan_documents(path=DOCUMENTS_DIR):
+    """{filename: mtime} of the supported files of `path`."""
+    state = {}
+    for filepath in glob.glob(os.path.join(path, "*")):
+        filename = os.path.basename(filepath)
+        if filename.endswith(SUPPORTED_EXTENSIONS):
+            try:
+                state[filename] = os.path.getmtime(filepath)
+            except OSError:
+                pass
+    return state
+
+
+def refresh(path=DOCUMENTS_DIR):
+    """
+    Bring INDEX up to date with the documents folder without a rebuild:
+    new or modified files go into a new segment, removed files are
+    tombstoned (see segments.py). Returns (indexed, removed) filenames.
+    """
+    global GENERATION
+    with _refresh_lock:
+        current = scan_documents(path)
+        changed = {f for f, mtime in current.items() if FILE_STATE.get(f) != mtime}
+        removed = [f for f in FILE_STATE if f not in current]
+        if not changed and not removed:
+            return [], []
+
+        corpus = acquisition(path, keep=changed.__contains__)
+        freqs = extraction(corpus)
+        detect_duplicates(corpus)
+        index_facets(freqs, path)
+        DELETED.difference_update(freqs)
+        CORPUS.update(corpus)
+        FREQS.update(freqs)
+        INDEX.add_documents(freqs)
+
+        for filename in removed:
+            INDEX.delete(filename)
+            DUPLICATES.remove(filename)
+            FACET_INDEX.remove(DOC_IDS.get(filename))
+            if PASSAGES is not None:
+                PASSAGES.remove(filename)
+            CORPUS.pop(filename, None)
+            FREQS.pop(filename, None)
+            FILE_STATE.pop(filename, None)
+        FILE_STATE.update({f: current[f] for f in changed})
+
+        GENERATION += 1
+        publish_index_metrics(INDEX, FREQS, GENERATION)
+        return sorted(changed), removed
+
+
+def delete_document(filename):
+    """
+    Make a deleted document disappear from search at once: tombstone it
+    in INDEX (its postings are dropped by the next merge) and in DELETED,
+    checked for every hit before results are returned.
+    """
+    with _refresh_lock:
+        DELETED.add(filename)
+        if not SHARDED:
+            INDEX.delete(filename)
+            DUPLICATES.remove(filename)
+            FACET_INDEX.remove(DOC_IDS.get(filename))
+            if PASSAGES is not None:
+                PASSAGES.remove(filename)
+        CORPUS.pop(filename, None)
+        FREQS.pop(filename, None)
+        FILE_STATE.pop(filename, None)
 
 
 # -------------------------- LOADING ON STARTUP --------------------------
-print("📚 Loading documents...")
-CORPUS = acquisition()
-FREQS = extraction(CORPUS)
-INDEX = build_index(FREQS)
-print("✔️ Search engine ready")
+# With DOCUFIND_SHARDS > 1 (or remote shards) the documents are loaded by
+# the shard workers instead (see shards.py)
+SHARDED = int(os.environ.get("DOCUFIND_SHARDS", "0")) > 1 or bool(os.environ.get("DOCUFIND_SHARD_ADDRESSES"))
+
+DOC_IDS = DocIds()
+# Incremented every time INDEX changes
+GENERATION = 1
+# Passages of the documents, with DOCUFIND_PASSAGES=1 (see passages.py)
+PASSAGES = passages.PassageIndex() if passages.available() and not SHARDED else None
+
+if SHARDED:
+    CORPUS, FREQS, INDEX = {}, {}, {}
+    print("🧩 Sharded mode: documents are loaded by the shard workers")
+else:
+    print("📚 Loading documents...")
+    _start = time.perf_counter()
+    FILE_STATE.update(scan_documents())
+    # Texts go to the compressed store batch by batch: the whole corpus is never resident
+    CORPUS = ContentStore(CONTENT_STORE_PATH)
+    CORPUS.clear()
+    FREQS = {}
+    filenames = sorted(FILE_STATE)
+    for i in range(0, len(filenames), LOAD_BATCH):
+        batch = acquisition(keep=set(filenames[i:i + LOAD_BATCH]).__contains__)
+        FREQS.update(extraction(batch))
+        detect_duplicates(batch)
+        index_facets(batch)
+        CORPUS.update(batch)
+    # First segment; later changes are added by refresh() and merged in the background
+    INDEX = SegmentedIndex(DOC_IDS)
+    INDEX.add_documents(FREQS)
+    INDEX.start_merging()
+
+    publish_index_metrics(INDEX, FREQS, GENERATION)
+    metrics.DOCS_PER_SECOND.set(len(FREQS) / max(time.perf_counter() - _start, 1e-9), source="startup")
+    print("✔️ Search engine ready")
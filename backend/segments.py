@@ -0,0 +1,352 @@
+"""
+Segmented (LSM-style) in-memory inverted index.
+
+Instead of one index rebuilt from scratch on every change:
+- new or modified documents are indexed into a small immutable Segment
+  ({word: PostingList} over the global DOC_IDS ids)
+- deletes only set a bit in the tombstone bitmap of the segments holding
+  the document; queries subtract the tombstones of each segment
+- a query term is looked up in every live segment and the per-segment
+  posting lists are merged (union)
+- a background thread merges segments of similar size (MERGE_FACTOR of
+  the same tier) into a bigger one, dropping tombstoned documents, and
+  rewrites segments with too many deletes. Merges copy at most
+  MERGE_BUDGET postings per second so they never compete with queries
+  for long.
+
+SegmentedIndex behaves like the former {word: PostingList} dict
+(get / [] / in / iteration / len), so recherche() works unchanged.
+"""
+import itertools
+import math
+import os
+import threading
+import time
+from collections.abc import Mapping
+
+import metrics
+from postings import PostingList, EMPTY
+
+MERGE_FACTOR = int(os.environ.get("DOCUFIND_MERGE_FACTOR", "4"))
+# Postings copied per second by background merges (0 = unlimited)
+MERGE_BUDGET = int(os.environ.get("DOCUFIND_MERGE_BUDGET", "2000000"))
+# Rewrite a segment alone once this fraction of its documents is deleted
+EXPUNGE_RATIO = float(os.environ.get("DOCUFIND_EXPUNGE_RATIO", "0.3"))
+MERGE_INTERVAL = 1.0
+
+
+# -------------------------- TOMBSTONES --------------------------
+class Bitmap:
+    """Growable bitset of doc ids."""
+
+    __slots__ = ("bits", "count")
+
+    def __init__(self, bits=b""):
+        self.bits = bytearray(bits)
+        self.count = sum(bin(b).count("1") for b in self.bits)
+
+    def add(self, doc_id):
+        """Set the bit of doc_id; False if it was already set."""
+        byte, bit = doc_id >> 3, 1 << (doc_id & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        if self.bits[byte] & bit:
+            return False
+        self.bits[byte] |= bit
+        self.count += 1
+        return True
+
+    def __contains__(self, doc_id):
+        byte = doc_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (doc_id & 7)))
+
+    def __iter__(self):
+        for byte, value in enumerate(self.bits):
+            if value:
+                for bit in range(8):
+                    if value & (1 << bit):
+                        yield (byte << 3) | bit
+
+    def __len__(self):
+        return self.count
+
+    def copy(self):
+        return Bitmap(self.bits)
+
+
+# -------------------------- SEGMENT --------------------------
+class Segment:
+    """Immutable postings of a batch of documents + their tombstones."""
+
+    def __init__(self, segment_id, postings, docs):
+        self.id = segment_id
+        self.postings = postings               # word -> PostingList
+        self.docs = docs                       # PostingList of the documents
+        self.deleted = Bitmap()
+        self.n_postings = sum(len(p) for p in postings.values())
+        self._deleted_list = None
+        # word -> live postings, for the current tombstones (emptied by delete)
+        self._live = {}
+
+    @classmethod
+    def build(cls, segment_id, freqs, doc_ids):
+        """Segment of `freqs` ({filename: Counter})."""
+        lists = {}
+        ids = []
+        for filename, counter in freqs.items():
+            doc_id = doc_ids.add(filename)
+            ids.append(doc_id)
+            for word in counter.keys():
+                lists.setdefault(word, []).append(doc_id)
+        postings = {word: PostingList(l) for word, l in lists.items()}
+        return cls(segment_id, postings, PostingList(ids))
+
+    @property
+    def live_docs(self):
+        return len(self.docs) - len(self.deleted)
+
+    def delete(self, doc_id):
+        """Tombstone doc_id if this segment holds it."""
+        if doc_id in self.docs and self.deleted.add(doc_id):
+            self._deleted_list = None
+            self._live = {}
+            return True
+        return False
+
+    def deleted_list(self):
+        deleted = self._deleted_list
+        if deleted is None:
+            deleted = self._deleted_list = PostingList.from_sorted(self.deleted)
+        return deleted
+
+    def get(self, word):
+        """Live postings of `word` in this segment (None if absent)."""
+        postings = self.postings.get(word)
+        if postings is None or not self.deleted.count:
+            return postings
+        live = self._live                 # before deleted_list(): see delete()
+        result = live.get(word)
+        if result is None:
+            result = live[word] = postings - self.deleted_list()
+        return result
+
+    def __repr__(self):
+        return f"Segment({self.id}, {len(self.docs)} docs, {len(self.deleted)} deleted)"
+
+
+# -------------------------- MERGE THROTTLING --------------------------
+class Throttle:
+    """Sleeps so that at most `budget` units are consumed per second."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.start = time.perf_counter()
+        self.consumed = 0
+
+    def consume(self, amount):
+        if self.budget <= 0:
+            return
+        self.consumed += amount
+        ahead = self.consumed / self.budget - (time.perf_counter() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+# -------------------------- SEGMENTED INDEX --------------------------
+def lookup(segments, word, default=None):
+    """Union of the live postings of `word` over `segments`."""
+    lists = []
+    for segment in segments:
+        postings = segment.get(word)
+        if postings is not None:
+            lists.append(postings)
+    if not lists:
+        return default
+    if len(lists) == 1:
+        return lists[0]
+    return PostingList.union_all(lists)
+
+
+class SegmentedIndex(Mapping):
+    """Live segments searched together; see the module docstring."""
+
+    def __init__(self, doc_ids, merge_factor=MERGE_FACTOR, merge_budget=MERGE_BUDGET, gauges=True):
+        """`gauges=False`: not the API's main index, keep it out of the index gauges."""
+        self.doc_ids = doc_ids
+        self.gauges = gauges
+        self.merge_factor = max(merge_factor, 2)
+        self.merge_budget = merge_budget
+        self.segments = []                      # replaced, never mutated in place
+        self.lock = threading.Lock()
+        self.generation = 0
+        self._ids = itertools.count(1)
+        self._wake = threading.Event()
+        self._merger = None
+
+    # ---------- writes ----------
+    def add_documents(self, freqs):
+        """
+        Index `freqs` ({filename: Counter}) as a new segment. Previous
+        versions of these documents are tombstoned in older segments.
+        """
+        if not freqs:
+            return None
+        with metrics.timed("segment_build"):
+            segment = Segment.build(next(self._ids), freqs, self.doc_ids)
+
+        with self.lock:
+            older = self.segments
+            # Publish first: the same ids are deduplicated by the union,
+            # so no document disappears between the two steps
+            self.segments = older + [segment]
+            for doc_id in segment.docs:
+                for s in older:
+                    s.delete(doc_id)
+            self.generation += 1
+        self._changed()
+        return segment
+
+    def delete(self, filename):
+        """Tombstone a document; True if it was live."""
+        doc_id = self.doc_ids.get(filename)
+        if doc_id is None:
+            return False
+        with self.lock:
+            deleted = any([s.delete(doc_id) for s in self.segments])
+            if deleted:
+                self.generation += 1
+        if deleted:
+            self._changed()
+        return deleted
+
+    # ---------- reads (Mapping interface) ----------
+    def get(self, word, default=None):
+        return lookup(self.segments, word, default)
+
+    def items(self):
+        # One snapshot for the whole iteration (a merge may swap segments)
+        segments = self.segments
+        return [(word, lookup(segments, word, EMPTY)) for word in self._words(segments)]
+
+    def values(self):
+        return [postings for _, postings in self.items()]
+
+    def __getitem__(self, word):
+        postings = self.get(word)
+        if postings is None:
+            raise KeyError(word)
+        return postings
+
+    def __contains__(self, word):
+        return any(word in s.postings for s in self.segments)
+
+    def __iter__(self):
+        return iter(self._words(self.segments))
+
+    def __len__(self):
+        return len(self._words(self.segments))
+
+    @staticmethod
+    def _words(segments):
+        if len(segments) == 1:
+            return segments[0].postings.keys()
+        return set().union(*(s.postings for s in segments))
+
+    def live_documents(self):
+        return sum(s.live_docs for s in self.segments)
+
+    def describe(self):
+        """One dict per live segment (admin / API display)."""
+        return [
+            {"id": s.id, "documents": len(s.docs), "deleted": len(s.deleted),
+             "terms": len(s.postings), "postings": s.n_postings}
+            for s in self.segments
+        ]
+
+    # ---------- merging ----------
+    def tier(self, segment):
+        return int(math.log(max(segment.live_docs, 1), self.merge_factor))
+
+    def merge_candidates(self):
+        """Segments to merge next (empty list when the index is balanced)."""
+        segments = self.segments
+        for segment in segments:
+            if segment.docs and len(segment.deleted) >= EXPUNGE_RATIO * len(segment.docs):
+                return [segment]
+        tiers = {}
+        for segment in segments:
+            tiers.setdefault(self.tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier][:self.merge_factor]
+        return []
+
+    def merge(self, inputs):
+        """Replace `inputs` with one segment without their deleted documents."""
+        throttle = Throttle(self.merge_budget)
+        snapshots = [s.deleted.copy() for s in inputs]
+        start = time.perf_counter()
+
+        docs = PostingList.union_all([s.docs - PostingList.from_sorted(d) for s, d in zip(inputs, snapshots)])
+        words = set().union(*(s.postings for s in inputs))
+        postings = {}
+        for word in words:
+            lists = [p for p in (s.get(word) for s in inputs) if p]
+            if lists:
+                merged = lists[0] if len(lists) == 1 else PostingList.union_all(lists)
+                postings[word] = merged
+                throttle.consume(len(merged))
+        merged = Segment(next(self._ids), postings, docs)
+
+        with self.lock:
+            # Deletes that happened while merging
+            for segment, snapshot in zip(inputs, snapshots):
+                for doc_id in segment.deleted:
+                    if doc_id not in snapshot:
+                        merged.delete(doc_id)
+            ids = {s.id for s in inputs}
+            remaining = [s for s in self.segments if s.id not in ids]
+            self.segments = remaining + [merged] if merged.docs else remaining
+            self.generation += 1
+
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - start, stage="segment_merge")
+        metrics.SEGMENT_MERGES.inc()
+        self._publish()
+        return merged
+
+    def merge_pending(self):
+        """Run merges until merge_candidates() is empty; number of merges."""
+        merges = 0
+        while True:
+            candidates = self.merge_candidates()
+            if not candidates:
+                return merges
+            self.merge(candidates)
+            merges += 1
+
+    def start_merging(self):
+        """Background merge thread (idempotent)."""
+        if self._merger is None:
+            self._merger = threading.Thread(target=self._merge_loop, daemon=True, name="docufind-merger")
+            self._merger.start()
+
+    def _merge_loop(self):
+        while True:
+            self._wake.wait(MERGE_INTERVAL)
+            self._wake.clear()
+            try:
+                self.merge_pending()
+            except Exception as e:
+                print(f" Segment merge failed: {e}")
+
+    def _changed(self):
+        self._publish()
+        self._wake.set()
+
+    def _publish(self):
+        if not self.gauges:
+            return
+        segments = self.segments
+        metrics.INDEX_SEGMENTS.set(len(segments))
+        metrics.INDEX_DELETED.set(sum(len(s.deleted) for s in segments))
+
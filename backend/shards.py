@@ -0,0 +1,308 @@
+"""
+Sharded index with scatter-gather query execution.
+
+Documents are hash-partitioned into N shards (crc32(filename) % N). Each
+shard is served by its own process holding only its partition (CORPUS,
+FREQS, INDEX of its documents). The coordinator (main.py) sends every
+query to all shards in parallel, each shard evaluates recherche() and
+scores its hits locally, and the per-shard top-k lists are merged.
+
+IDF is global: at startup every shard reports its document count and
+document frequencies, the coordinator sums them (and subtracts the terms
+of the documents deleted since) and sends the idf of the query terms with
+each query, so "tfidf" scores are comparable across shards ("count"
+scoring needs no statistics). Each shard scores its hits with a sparse
+ScoringMatrix of its documents (counts, or 1 + log tf weighted by the
+idf of the query) when numpy / scipy are installed.
+
+Shards talk through multiprocessing.connection (pickled messages over a
+pipe or a TCP socket):
+- DOCUFIND_SHARDS=N                 : N local worker processes (pipes)
+- DOCUFIND_SHARD_ADDRESSES=h:p,...  : already running shards, e.g. started on
+                                      other machines with
+    DOCUFIND_SHARD_AUTHKEY=secret python shards.py --shard 0 --of 2 --port 7001 --host 0.0.0.0
+  (DOCUFIND_SHARD_AUTHKEY is required on both sides, nodes listen on
+  127.0.0.1 unless --host is given)
+
+Facet filters are applied by every shard on its own documents and the
+facet counts of the shards are summed (see facets.py).
+
+Scores use the same lemma counts and formulas as scoring.py (ties ordered
+by filename), so rankings do not depend on DOCUFIND_SHARDS.
+
+Messages: ("stats",) / ("search", query, terms, k, idf, expansions, filters)
+          / ("document", filename) / ("delete", filename) -> terms of the
+          deleted document, None if the shard did not hold it
+"""
+import argparse
+import heapq
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+import facets
+import scoring
+from content_store import ContentStore
+from segments import SegmentedIndex
+
+SHARD_COUNT = int(os.environ.get("DOCUFIND_SHARDS", "0"))
+SHARD_ADDRESSES = os.environ.get("DOCUFIND_SHARD_ADDRESSES", "")
+# Messages are pickled: only peers knowing this key may connect (no default)
+AUTHKEY = os.environ.get("DOCUFIND_SHARD_AUTHKEY", "").encode()
+SHARD_WEIGHTING = os.environ.get("DOCUFIND_SCORING", "count")
+
+
+def shard_of(filename, n_shards):
+    """Stable shard number of a document (same on every machine)."""
+    return zlib.crc32(filename.encode("utf-8")) % n_shards
+
+
+# -------------------------- SHARD (worker side) --------------------------
+class Shard:
+    """The index of one partition of the documents."""
+
+    def __init__(self, shard_id, n_shards, documents_dir=None):
+        if "search_engine" not in sys.modules:
+            # Imported without sharding, search_engine would load the whole
+            # corpus (e.g. a node started with `python shards.py`)
+            os.environ["DOCUFIND_SHARDS"] = str(max(n_shards, 2))
+        import search_engine as se
+
+        self.se = se
+        self.shard_id = shard_id
+        self.doc_ids = se.DocIds()
+        documents_dir = documents_dir or se.DOCUMENTS_DIR
+        corpus = se.acquisition(
+            documents_dir,
+            keep=lambda filename: shard_of(filename, n_shards) == shard_id,
+        )
+        self.freqs = se.extraction(corpus)
+        # Texts are only kept compressed (see content_store.py)
+        self.corpus = ContentStore(f"{se.CONTENT_STORE_PATH}.shard{shard_id}")
+        self.corpus.clear()
+        self.corpus.update(corpus)
+        self.index = SegmentedIndex(self.doc_ids)
+        self.index.add_documents(self.freqs)
+        self.index.start_merging()
+        self.facets = facets.FacetIndex()
+        self.facets.index_files(self.doc_ids, documents_dir, self.freqs)
+        # The idf of "tfidf" is the coordinator's (global): only 1 + log tf is precomputed
+        self.weighting = "logtf" if SHARD_WEIGHTING == "tfidf" else "count"
+        self.scorer = (scoring.ScoringMatrix.from_freqs(self.freqs, self.doc_ids, self.weighting)
+                       if scoring.available() else None)
+
+    def stats(self):
+        return {
+            "docs": len(self.freqs),
+            "df": {term: len(postings) for term, postings in self.index.items() if postings},
+        }
+
+    def search(self, query, terms, k=None, idf=None, expansions=None, filters=None):
+        """(total hits, [(score, filename)] best first, facet counts) for this shard."""
+        hits = self.se.recherche(query, self.index, expansions)
+        hits, facet_counts = self.facets.apply(hits, filters)
+        if self.scorer is not None and self.weighting == ("count" if idf is None else "logtf"):
+            ids, scores = self.scorer.rank(terms, hits, k=k, weights=idf)
+            top = list(zip(scores.tolist(), self.doc_ids.filenames(ids.tolist())))
+            return len(hits), top, facet_counts
+
+        scored = []
+        for filename in self.doc_ids.filenames(hits):
+            counts = self.freqs[filename]
+            score = 0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    score += tf if idf is None else (1 + math.log(tf)) * idf.get(term, 0.0)
+            scored.append((score, filename))
+
+        key = lambda item: (-item[0], item[1])
+        top = heapq.nsmallest(k, scored, key=key) if k else sorted(scored, key=key)
+        return len(hits), top, facet_counts
+
+    def document(self, filename):
+        return self.corpus.get(filename)
+
+    def delete(self, filename):
+        """Tombstone a document; its terms (for the global df), None if it was not here."""
+        self.corpus.pop(filename, None)
+        counts = self.freqs.pop(filename, None)
+        self.facets.remove(self.doc_ids.get(filename))
+        if not self.index.delete(filename) or counts is None:
+            return None
+        return list(counts)
+
+    def handle(self, message):
+        command, *args = message
+        if command == "stats":
+            return self.stats()
+        if command == "search":
+            return self.search(*args)
+        if command == "document":
+            return self.document(*args)
+        if command == "delete":
+            return self.delete(*args)
+        raise ValueError(f"Unknown shard command: {command}")
+
+
+def serve_connection(shard, conn):
+    """Answer the messages of one coordinator until it disconnects."""
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        try:
+            conn.send(("ok", shard.handle(message)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+    conn.close()
+
+
+def run_local_worker(shard_id, n_shards, documents_dir, conn):
+    """Entry point of a local worker process (pipe to the coordinator)."""
+    shard = Shard(shard_id, n_shards, documents_dir)
+    serve_connection(shard, conn)
+
+
+def require_authkey():
+    if not AUTHKEY:
+        raise RuntimeError("DOCUFIND_SHARD_AUTHKEY must be set for shards reached over TCP "
+                           "(unpickling messages from an unauthenticated peer runs its code)")
+
+
+def serve_forever(shard_id, n_shards, port, host="127.0.0.1", documents_dir=None):
+    """Standalone shard node: accept coordinators on host:port."""
+    require_authkey()
+    shard = Shard(shard_id, n_shards, documents_dir)
+    print(f"✔️ Shard {shard_id}/{n_shards} ready on {host}:{port} ({len(shard.corpus)} documents)")
+    with Listener((host, port), authkey=AUTHKEY) as listener:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=serve_connection, args=(shard, conn), daemon=True).start()
+
+
+# -------------------------- COORDINATOR --------------------------
+class ShardedIndex:
+    """Fans queries out to every shard and merges their top-k."""
+
+    def __init__(self, connections, processes=()):
+        self.connections = connections
+        self.locks = [threading.Lock() for _ in connections]
+        self.processes = list(processes)
+        self.pool = ThreadPoolExecutor(max_workers=len(connections), thread_name_prefix="docufind-shard")
+
+        # Global statistics for consistent IDF
+        self.stats_lock = threading.Lock()
+        self.total_docs = 0
+        self.df = {}
+        for stats in self.scatter(("stats",)):
+            self.total_docs += stats["docs"]
+            for term, df in stats["df"].items():
+                self.df[term] = self.df.get(term, 0) + df
+
+    @classmethod
+    def spawn(cls, n_shards, documents_dir=None):
+        """Start n_shards local worker processes."""
+        ctx = multiprocessing.get_context("spawn")
+        connections, processes = [], []
+        for shard_id in range(n_shards):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(
+                target=run_local_worker, args=(shard_id, n_shards, documents_dir, child),
+                name=f"docufind-shard-{shard_id}", daemon=True,
+            )
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+        return cls(connections, processes)
+
+    @classmethod
+    def connect(cls, addresses):
+        """Connect to running shard nodes ("host:port,host:port", in shard order)."""
+        require_authkey()
+        connections = []
+        for address in addresses.split(","):
+            host, port = address.strip().rsplit(":", 1)
+            connections.append(Client((host, int(port)), authkey=AUTHKEY))
+        return cls(connections)
+
+    def _call(self, i, message):
+        with self.locks[i]:
+            self.connections[i].send(message)
+            status, payload = self.connections[i].recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard {i} failed: {payload}")
+        return payload
+
+    def scatter(self, message):
+        """Send `message` to every shard in parallel, return their answers."""
+        futures = [self.pool.submit(self._call, i, message) for i in range(len(self.connections))]
+        return [f.result() for f in futures]
+
+    def idf(self, terms):
+        n = max(self.total_docs, 1)
+        return {t: math.log(n / self.df[t]) for t in set(terms) if self.df.get(t)}
+
+    def search(self, query, terms, k=None, weighting=SHARD_WEIGHTING, expansions=None, filters=None):
+        """(total hits, [(filename, score)] best first, facet counts) over all shards."""
+        idf = self.idf(terms) if weighting == "tfidf" else None
+        answers = self.scatter(("search", query, terms, k, idf, expansions, filters))
+
+        total = sum(hits for hits, _, _ in answers)
+        merged = heapq.merge(*(top for _, top, _ in answers), key=lambda item: (-item[0], item[1]))
+        ranked = [(filename, score) for score, filename in merged]
+        counts = facets.merge_counts(c for _, _, c in answers)
+        return total, ranked[:k] if k else ranked, counts
+
+    def document(self, filename):
+        """Text of a document, asked to the shard that owns it."""
+        return self._call(shard_of(filename, len(self.connections)), ("document", filename))
+
+    def delete(self, filename):
+        """Tombstone a document on the shard that owns it and drop it from the global statistics."""
+        terms = self._call(shard_of(filename, len(self.connections)), ("delete", filename))
+        if terms is None:
+            return False
+        with self.stats_lock:
+            self.total_docs -= 1
+            for term in terms:
+                df = self.df.get(term, 0) - 1
+                if df > 0:
+                    self.df[term] = df
+                else:
+                    self.df.pop(term, None)
+        return True
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+        for process in self.processes:
+            process.join(timeout=5)
+        self.pool.shutdown(wait=False)
+
+
+def coordinator():
+    """ShardedIndex from the environment, or None when sharding is off."""
+    if SHARD_ADDRESSES:
+        return ShardedIndex.connect(SHARD_ADDRESSES)
+    if SHARD_COUNT > 1:
+        return ShardedIndex.spawn(SHARD_COUNT)
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one DocuFind shard")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--of", type=int, required=True, help="number of shards")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (0.0.0.0: all)")
+    parser.add_argument("--documents", default=None, help="documents folder")
+    args = parser.parse_args()
+    serve_forever(args.shard, args.of, args.port, args.host, args.documents)
@@ -0,0 +1,136 @@
+"""
+"More like this": documents closest to a given one (/similar/{filename}).
+
+Computed once per index generation, off the request path:
+- document vectors: TF-IDF ((1 + log tf) * log(N / df)) over the indexed
+  lemmas (stopwords excluded, see token_filters.py), L2-normalized rows
+  of a sparse documents x terms matrix
+- optional truncated SVD (DOCUFIND_SIMILAR_DIMS > 0, scipy svds): dense
+  LSA projection, so that documents sharing related words get close
+  even without common terms
+- neighbour table: cosine similarity of every document with all the
+  others, by blocks of rows, and the NEIGHBOURS best kept per document
+  (argpartition). A request is then a row lookup.
+
+Exact all-pairs in blocks is fine for the corpus sizes of DocuFind (the
+cost is paid in the background); an approximate structure would only be
+worth it far beyond. numpy / scipy are optional, as for scoring.py.
+"""
+import os
+
+try:
+    import numpy as np
+    from scipy import sparse
+    from scipy.sparse.linalg import svds
+except ImportError:
+    np = sparse = svds = None
+
+SVD_DIMS = int(os.environ.get("DOCUFIND_SIMILAR_DIMS", "0"))
+NEIGHBOURS = int(os.environ.get("DOCUFIND_SIMILAR_NEIGHBOURS", "20"))
+BLOCK_ROWS = 256
+
+
+def available():
+    return sparse is not None
+
+
+def tfidf_matrix(freqs, filenames, keep):
+    """L2-normalized TF-IDF rows (one per filename) over the kept words."""
+    vocab, rows, cols, data = {}, [], [], []
+    for row, filename in enumerate(filenames):
+        for word, count in freqs[filename].items():
+            if keep(word):
+                rows.append(row)
+                cols.append(vocab.setdefault(word, len(vocab)))
+                data.append(count)
+
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), (rows, cols)),
+        shape=(len(filenames), len(vocab)),
+    )
+    df = np.bincount(matrix.indices, minlength=len(vocab))
+    idf = np.log(max(len(filenames), 1) / np.maximum(df, 1))
+    matrix.data = (1.0 + np.log(matrix.data)) * idf[matrix.indices]
+    return normalize(matrix)
+
+
+def normalize(vectors):
+    """Unit rows (all-zero rows stay zero)."""
+    if sparse.issparse(vectors):
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        return sparse.diags(1.0 / np.where(norms > 0, norms, 1.0)) @ vectors
+    norms = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(norms > 0, norms, 1.0)[:, None]
+
+
+def project(matrix, dims):
+    """Truncated SVD: dense (documents x dims) LSA vectors."""
+    dims = min(dims, min(matrix.shape) - 1)
+    if dims < 1:
+        return matrix
+    u, s, _ = svds(matrix, k=dims)
+    return normalize(u * s)
+
+
+def neighbour_table(vectors, k):
+    """(ids, scores): the k most similar other documents of each row, best first."""
+    n = vectors.shape[0]
+    k = min(k, n - 1)
+    ids = np.zeros((n, max(k, 0)), dtype=np.int32)
+    scores = np.zeros((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return ids, scores
+
+    transposed = vectors.T.tocsc() if sparse.issparse(vectors) else vectors.T
+    for start in range(0, n, BLOCK_ROWS):
+        end = min(start + BLOCK_ROWS, n)
+        sims = vectors[start:end] @ transposed
+        sims = sims.toarray() if sparse.issparse(sims) else np.asarray(sims)
+        rows = np.arange(end - start)
+        sims[rows, start + rows] = -np.inf           # not its own neighbour
+
+        best = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(sims, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        ids[start:end] = np.take_along_axis(best, order, axis=1)
+        scores[start:end] = np.take_along_axis(best_scores, order, axis=1)
+    return ids, scores
+
+
+class SimilarDocuments:
+    """Precomputed neighbour table of a set of documents."""
+
+    def __init__(self, filenames, ids, scores):
+        self.filenames = filenames
+        self.rows = {filename: row for row, filename in enumerate(filenames)}
+        self.ids = ids
+        self.scores = scores
+
+    @classmethod
+    def build(cls, freqs, keep, dims=SVD_DIMS, k=NEIGHBOURS):
+        """From {filename: Counter of lemmas} (search_engine.FREQS)."""
+        filenames = sorted(freqs)
+        vectors = tfidf_matrix(freqs, filenames, keep)
+        if dims > 0:
+            vectors = project(vectors, dims)
+        ids, scores = neighbour_table(vectors, k)
+        return cls(filenames, ids, scores)
+
+    def __contains__(self, filename):
+        return filename in self.rows
+
+    def similar(self, filename, k=None, exclude=()):
+        """[(filename, cosine similarity)] best first (None for an unknown document)."""
+        row = self.rows.get(filename)
+        if row is None:
+            return None
+        results = []
+        for doc, score in zip(self.ids[row], self.scores[row]):
+            if score <= 0:
+                break
+            name = self.filenames[doc]
+            if name not in exclude:
+                results.append((name, float(score)))
+            if k and len(results) >= k:
+                break
+        return results
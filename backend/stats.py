@@ -0,0 +1,191 @@
+"""
+Corpus-level and per-document statistics for the admin dashboard.
+
+Counting over the whole word_frequencies table on every page load does not
+scale, so the indexers keep these small tables up to date as they write:
+- corpus_stats   : one row (documents, indexed words, unique words)
+- document_stats : one row per document
+- term_stats     : one row per word (needed to know when a word appears
+                   for the first time / disappears from the corpus)
+"""
+
+
+# -------------------------- SUMMARY TABLES --------------------------
+def init_stats_tables(conn):
+    """
+    Create the summary tables if needed.
+    Returns True when they did not exist yet (old database).
+    """
+    cursor = conn.cursor()
+    existed = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'corpus_stats'"
+    ).fetchone() is not None
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS corpus_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_docs INTEGER NOT NULL DEFAULT 0,
+            total_words INTEGER NOT NULL DEFAULT 0,
+            unique_words INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_stats (
+            document_id INTEGER PRIMARY KEY,
+            filename TEXT,
+            word_count INTEGER NOT NULL DEFAULT 0,
+            occurrences INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS term_stats (
+            word TEXT PRIMARY KEY,
+            doc_count INTEGER NOT NULL DEFAULT 0,
+            occurrences INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO corpus_stats (id) VALUES (1)")
+    conn.commit()
+
+    return not existed
+
+
+def ensure_stats(conn):
+    """
+    Create the summary tables and fill them once from the existing
+    word_frequencies table if the database predates them.
+    """
+    if init_stats_tables(conn):
+        rebuild_stats(conn)
+
+
+# -------------------------- INCREMENTAL UPDATES --------------------------
+def record_document(cursor, doc_id, filename, counts):
+    """
+    Account for a freshly indexed document.
+    `counts` must be exactly the {word: count} pairs written to
+    word_frequencies for this document.
+    """
+    cursor.executemany(
+        "INSERT OR IGNORE INTO term_stats (word) VALUES (?)",
+        [(w,) for w in counts],
+    )
+    new_words = cursor.rowcount if counts else 0
+
+    cursor.executemany("""
+        UPDATE term_stats
+        SET doc_count = doc_count + 1, occurrences = occurrences + ?
+        WHERE word = ?
+    """, [(c, w) for w, c in counts.items()])
+
+    cursor.execute("""
+        INSERT OR REPLACE INTO document_stats (document_id, filename, word_count, occurrences)
+        VALUES (?, ?, ?, ?)
+    """, (doc_id, filename, len(counts), sum(counts.values())))
+
+    cursor.execute("""
+        UPDATE corpus_stats
+        SET total_docs = total_docs + 1,
+            total_words = total_words + ?,
+            unique_words = unique_words + ?
+        WHERE id = 1
+    """, (len(counts), new_words))
+
+
+def forget_document(cursor, doc_id):
+    """
+    Remove a document from the statistics.
+    Must be called BEFORE its word_frequencies rows are deleted.
+    """
+    row = cursor.execute(
+        "SELECT 1 FROM document_stats WHERE document_id = ?", (doc_id,)
+    ).fetchone()
+    if row is None:
+        return
+
+    words = cursor.execute(
+        "SELECT word, count FROM word_frequencies WHERE document_id = ?", (doc_id,)
+    ).fetchall()
+
+    cursor.executemany("""
+        UPDATE term_stats
+        SET doc_count = doc_count - 1, occurrences = occurrences - ?
+        WHERE word = ?
+    """, [(c, w) for w, c in words])
+
+    cursor.executemany(
+        "DELETE FROM term_stats WHERE word = ? AND doc_count <= 0",
+        [(w,) for w, _ in words],
+    )
+    vanished = cursor.rowcount if words else 0
+
+    cursor.execute("DELETE FROM document_stats WHERE document_id = ?", (doc_id,))
+    cursor.execute("""
+        UPDATE corpus_stats
+        SET total_docs = total_docs - 1,
+            total_words = total_words - ?,
+            unique_words = unique_words - ?
+        WHERE id = 1
+    """, (len(words), vanished))
+
+
+def reset_stats(cursor):
+    """Empty the statistics (used together with a full reindex)."""
+    cursor.execute("DELETE FROM document_stats")
+    cursor.execute("DELETE FROM term_stats")
+    cursor.execute("""
+        UPDATE corpus_stats
+        SET total_docs = 0, total_words = 0, unique_words = 0
+        WHERE id = 1
+    """)
+
+
+# -------------------------- FULL REBUILD --------------------------
+def rebuild_stats(conn):
+    """
+    Recompute every summary table from documents / word_frequencies.
+    Scans the whole word_frequencies table: admin action only.
+    """
+    cursor = conn.cursor()
+    reset_stats(cursor)
+
+    cursor.execute("""
+        INSERT INTO document_stats (document_id, filename, word_count, occurrences)
+        SELECT d.id, d.filename, COUNT(w.word), COALESCE(SUM(w.count), 0)
+        FROM documents d
+        LEFT JOIN word_frequencies w ON d.id = w.document_id
+        GROUP BY d.id
+    """)
+    cursor.execute("""
+        INSERT INTO term_stats (word, doc_count, occurrences)
+        SELECT word, COUNT(*), SUM(count)
+        FROM word_frequencies
+        GROUP BY word
+    """)
+    cursor.execute("""
+        UPDATE corpus_stats
+        SET total_docs = (SELECT COUNT(*) FROM document_stats),
+            total_words = (SELECT COALESCE(SUM(word_count), 0) FROM document_stats),
+            unique_words = (SELECT COUNT(*) FROM term_stats)
+        WHERE id = 1
+    """)
+    conn.commit()
+
+
+# -------------------------- READERS --------------------------
+def corpus_overview(cursor):
+    """Return (total_docs, total_words, unique_words)."""
+    row = cursor.execute(
+        "SELECT total_docs, total_words, unique_words FROM corpus_stats WHERE id = 1"
+    ).fetchone()
+    return row if row else (0, 0, 0)
+
+
+def document_overview(cursor):
+    """Return [(doc_id, filename, occurrences, word_count)] sorted by size."""
+    cursor.execute("""
+        SELECT document_id, filename, occurrences, word_count
+        FROM document_stats
+        ORDER BY occurrences DESC
+    """)
+    return cursor.fetchall()
@@ -0,0 +1,44 @@
+"""
+Tests of the backend modules. Run from backend/:
+    python -m pytest tests
+The modules are imported as the API imports them (backend/ on sys.path).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DOCUMENTS = {
+    "jardin.txt": "Le jardin fleuri accueille des abeilles et des papillons.",
+    "montagne.txt": "La montagne enneigée domine la vallée et le glacier.",
+}
+
+
+@pytest.fixture(scope="session")
+def engine(tmp_path_factory):
+    """
+    search_engine loaded from a small corpus in a temporary folder (the
+    working directory of the rest of the session: its databases are
+    relative paths). Skipped without spaCy's French model.
+    """
+    spacy = pytest.importorskip("spacy")
+    if not spacy.util.is_package("fr_core_news_sm"):
+        pytest.skip("fr_core_news_sm is not installed")
+    root = tmp_path_factory.mktemp("docufind")
+    documents = root / "documents"
+    documents.mkdir()
+    for name, text in DOCUMENTS.items():
+        (documents / name).write_text(text, encoding="utf-8")
+    previous = os.getcwd()
+    os.chdir(root)
+    os.environ["DOCUFIND_DOCUMENTS_DIR"] = str(documents)
+    try:
+        for name in ("paths", "search_engine"):
+            sys.modules.pop(name, None)
+        import search_engine
+        yield search_engine
+    finally:
+        os.environ.pop("DOCUFIND_DOCUMENTS_DIR", None)
+        os.chdir(previous)
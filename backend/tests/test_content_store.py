@@ -0,0 +1,144 @@
+import random
+import sqlite3
+
+import pytest
+
+import content_store
+from content_store import ContentStore
+
+
+def texts(n, size=300):
+    return {f"doc_{i:03}.txt": f"Texte numéro {i} — " + "réseau neuronal " * (size // 16) for i in range(n)}
+
+
+@pytest.fixture(params=["zlib", "zstd"])
+def store(request, tmp_path):
+    if request.param == "zstd" and content_store.zstandard is None:
+        pytest.skip("zstandard not installed")
+    store = ContentStore(str(tmp_path / "content.db"), codec=request.param, cache_blocks=2)
+    yield store
+    store.close()
+
+
+def test_round_trip_across_blocks(store, monkeypatch):
+    monkeypatch.setattr(content_store, "BLOCK_SIZE", 1024)
+    corpus = texts(40)
+    store.update(corpus)
+    assert len(store) == 40
+    assert store.conn.execute("SELECT COUNT(*) FROM content_blocks").fetchone()[0] > 1
+    assert dict(store.items()) == corpus
+    assert list(store) == sorted(corpus)
+    assert store.raw_bytes() == sum(len(t.encode("utf-8")) for t in corpus.values())
+    assert store.compressed_bytes() < store.raw_bytes()
+
+
+def test_mapping_interface(store):
+    store["a.txt"] = "premier"
+    store["a.txt"] = "second"
+    assert store["a.txt"] == "second" and "a.txt" in store
+    assert store.get("missing.txt") is None and "missing.txt" not in store
+    with pytest.raises(KeyError):
+        store["missing.txt"]
+    del store["a.txt"]
+    assert len(store) == 0
+    with pytest.raises(KeyError):
+        del store["a.txt"]
+    store.update([("b.txt", "")])
+    assert store["b.txt"] == ""
+
+
+def test_unused_blocks_are_dropped(store):
+    store.update({"a.txt": "un", "b.txt": "deux"})
+    store.update({"c.txt": "trois"})
+    store.pop("c.txt")
+    assert store.conn.execute("SELECT COUNT(*) FROM content_blocks").fetchone()[0] == 1
+    store.update({"a.txt": "un bis", "b.txt": "deux bis"})
+    assert store.conn.execute("SELECT COUNT(*) FROM content_blocks").fetchone()[0] == 1
+    store.clear()
+    assert len(store) == 0 and store.compressed_bytes() == 0
+
+
+def test_reopened_store_reads_the_same_texts(tmp_path):
+    path = str(tmp_path / "content.db")
+    corpus = texts(10)
+    first = ContentStore(path, codec="zlib")
+    first.update(corpus)
+    first.close()
+    second = ContentStore(path, codec="zlib")
+    assert dict(second.items()) == corpus
+    second.close()
+
+
+def test_shared_connection_is_committed_by_the_caller(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "content.db"))
+    ContentStore(conn, codec="zlib").update({"a.txt": "texte"})
+    conn.rollback()
+    assert ContentStore(conn, codec="zlib").get("a.txt") is None
+
+
+def test_migrate_documents_column(tmp_path):
+    path = str(tmp_path / "search_engine.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, filename TEXT, content TEXT)")
+    conn.executemany("INSERT INTO documents (filename, content) VALUES (?, ?)",
+                     [("a.txt", "texte a"), ("b.txt", "texte b"), ("c.txt", None)])
+    conn.commit()
+    conn.close()
+
+    assert content_store.migrate_documents_column(path) == 2
+    assert content_store.migrate_documents_column(path) == 0
+    store = ContentStore(path)
+    assert dict(store.items()) == {"a.txt": "texte a", "b.txt": "texte b"}
+    store.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM documents WHERE content IS NOT NULL").fetchone()[0] == 0
+    conn.close()
+
+
+def test_migrate_without_documents_table(tmp_path):
+    assert content_store.migrate_documents_column(str(tmp_path / "empty.db")) == 0
+
+
+def varied_texts(names, seed):
+    rng = random.Random(seed)
+    words = ["réseau", "neurone", "donnée", "modèle", "calcul", "graphe", "vecteur", "matrice", "noyau"]
+    return {name: " ".join(rng.choice(words) + str(rng.randrange(1000)) for _ in range(300)) for name in names}
+
+
+def replace_most_of_a_block(store):
+    """One block of 10 texts, then 4 and 3 of them replaced: 3 live texts left in it."""
+    names = [f"doc_{i}.txt" for i in range(10)]
+    store.update(varied_texts(names, seed=1))
+    store.update(varied_texts(names[:4], seed=2))
+    store.update(varied_texts(names[4:7], seed=3))
+    return dict(varied_texts(names, seed=1), **varied_texts(names[:4], seed=2), **varied_texts(names[4:7], seed=3))
+
+
+def block_bytes(store):
+    return store.conn.execute("SELECT SUM(size) FROM content_blocks").fetchone()[0]
+
+
+def test_sparse_blocks_are_compacted(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(content_store, "BLOCK_SIZE", 1 << 20)
+    uncompacted = ContentStore(str(tmp_path / "uncompacted.db"), codec=store.codec)
+    monkeypatch.setattr(content_store, "COMPACT_RATIO", 0.0)
+    expected = replace_most_of_a_block(uncompacted)
+    monkeypatch.setattr(content_store, "COMPACT_RATIO", 0.5)
+    assert replace_most_of_a_block(store) == expected
+
+    # No dead text left in the blocks: 10 texts stored instead of 17
+    assert dict(store.items()) == dict(uncompacted.items()) == expected
+    assert store.raw_bytes() == block_bytes(store) < block_bytes(uncompacted)
+    assert store.compressed_bytes() < 0.8 * uncompacted.compressed_bytes()
+    uncompacted.close()
+
+
+def test_deletes_compact_too(store, monkeypatch):
+    monkeypatch.setattr(content_store, "BLOCK_SIZE", 1 << 20)
+    corpus = varied_texts([f"doc_{i}.txt" for i in range(4)], seed=4)
+    store.update(corpus)
+    before = store.compressed_bytes()
+    for name in list(corpus)[:3]:
+        del store[name]
+    assert store.compressed_bytes() < before / 2
+    assert list(store.items()) == [("doc_3.txt", corpus["doc_3.txt"])]
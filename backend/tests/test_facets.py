@@ -0,0 +1,14 @@
+import pytest
+
+import facets
+
+
+def test_parse_filters_splits_repeated_and_comma_separated_values():
+    filters = facets.parse_filters(type=["PDF, docx", "txt"], size=None, month=["2024-06"], pages=[" , "])
+    assert filters == {"type": ["pdf", "docx", "txt"], "month": ["2024-06"], "pages": []}
+
+
+def test_parse_filters_rejects_unresolved_defaults():
+    # e.g. a Query() object, when an endpoint is called as a function without its parameters
+    with pytest.raises(TypeError):
+        facets.parse_filters(type=object())
@@ -0,0 +1,43 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("scipy")
+
+
+@pytest.fixture
+def collection(engine, tmp_path):
+    import named_collections
+    root = tmp_path / "biologie"
+    (root / "documents").mkdir(parents=True)
+    (root / "documents" / "abeille.txt").write_text("Les abeilles butinent les fleurs du jardin.", encoding="utf-8")
+    (root / "documents" / "fourmi.txt").write_text("La fourmi transporte une feuille.", encoding="utf-8")
+    collection = named_collections.Collection("biologie", str(root))
+    collection.refresh()
+    return collection
+
+
+def found(collection, query):
+    _, ranked, _ = collection.search(query, [query])
+    return [filename for filename, _ in ranked]
+
+
+def test_first_scorer_is_built_then_rebuilt_in_the_background(collection):
+    scorer = collection.scorer()
+    assert scorer is not None and collection._scorer_generation == collection.generation
+
+    documents = os.path.join(collection.root, "documents")
+    with open(os.path.join(documents, "papillon.txt"), "w", encoding="utf-8") as f:
+        f.write("Le papillon se pose sur une fleur, le papillon s'envole.")
+    with collection._scorer_building:
+        collection.refresh()
+        # The request thread does not rebuild: the previous matrix serves
+        assert collection.scorer() is scorer
+        assert found(collection, "fleur") == ["abeille.txt", "papillon.txt"]
+        assert found(collection, "papillon") == ["papillon.txt"]
+
+    collection.build_scorer()
+    assert collection.scorer() is not scorer
+    assert collection._scorer_generation == collection.generation
+    assert found(collection, "papillon") == ["papillon.txt"]
@@ -0,0 +1,115 @@
+import random
+import sqlite3
+
+import pytest
+
+import near_duplicates
+from near_duplicates import NearDuplicateIndex, signature, similarity
+
+WORDS = [f"mot{i}" for i in range(500)]
+
+
+def text(seed, n=400):
+    rng = random.Random(seed)
+    return [rng.choice(WORDS) for _ in range(n)]
+
+
+def edited(words, every):
+    """A copy with one word out of `every` replaced."""
+    return [w if i % every else "changé" for i, w in enumerate(words)]
+
+
+BASE = text(1)
+DOCS = {
+    "rapport.txt": " ".join(BASE),
+    "rapport_v2.txt": " ".join(edited(BASE, 200)),      # ~97% of the shingles shared
+    "rapport_v3.txt": " ".join(edited(BASE, 100)),
+    "autre.txt": " ".join(text(2)),
+}
+
+
+@pytest.fixture
+def index():
+    index = NearDuplicateIndex(threshold=0.8)
+    for filename, content in DOCS.items():
+        index.add(filename, content)
+    return index
+
+
+def test_signature_estimates_jaccard_similarity():
+    assert signature("") is None
+    assert signature("un deux") == signature("UN  deux !")      # shorter than a shingle
+    same = signature(DOCS["rapport.txt"])
+    assert len(same) == near_duplicates.NUM_PERM
+    assert similarity(same, signature(DOCS["rapport.txt"])) == 1.0
+    assert similarity(same, signature(DOCS["rapport_v2.txt"])) > 0.9
+    assert similarity(same, signature(DOCS["autre.txt"])) < 0.1
+
+
+def test_numpy_and_python_signatures_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    with_numpy = signature(DOCS["rapport.txt"])
+    monkeypatch.setattr(near_duplicates, "np", None)
+    assert signature(DOCS["rapport.txt"]) == with_numpy
+
+
+def test_near_duplicates_are_grouped(index):
+    group = ["rapport.txt", "rapport_v2.txt", "rapport_v3.txt"]
+    assert index.groups() == {filename: group for filename in group}
+    assert index.representative("rapport_v3.txt") == "rapport.txt"
+    assert index.representative("autre.txt") == "autre.txt"
+    assert index.redundant() == 2
+    found = index.duplicates_of("rapport.txt")
+    assert [f for f, _ in found] == ["rapport_v2.txt", "rapport_v3.txt"]    # closest first
+    assert found[0][1] >= found[1][1] >= 0.8
+    assert index.duplicates_of("autre.txt") == [] and index.duplicates_of("unknown.txt") == []
+
+
+def test_threshold_decides_which_candidates_are_grouped():
+    words = text(3)
+    loose = " ".join(edited(words, 40))                          # ~88% of the shingles shared
+    sim = similarity(signature(" ".join(words)), signature(loose))
+    assert 0.6 < sim < 0.9
+
+    for threshold, grouped in ((0.9, False), (sim, True)):
+        index = NearDuplicateIndex(threshold=threshold)
+        index.add("a.txt", " ".join(words))
+        index.add("b.txt", loose)
+        assert bool(index.groups()) == grouped
+        assert bool(index.duplicates_of("a.txt")) == grouped
+
+
+def test_remove_and_replace_update_the_groups(index):
+    index.remove("rapport_v2.txt")
+    index.remove("missing.txt")
+    assert index.groups()["rapport.txt"] == ["rapport.txt", "rapport_v3.txt"]
+    assert "rapport_v2.txt" not in index.signatures
+    assert all("rapport_v2.txt" not in bucket for bucket in index.buckets.values())
+
+    # Re-adding a document replaces its previous signature
+    index.add("rapport_v3.txt", DOCS["autre.txt"])
+    assert index.groups() == {"autre.txt": ["autre.txt", "rapport_v3.txt"],
+                              "rapport_v3.txt": ["autre.txt", "rapport_v3.txt"]}
+    index.remove("autre.txt")
+    assert index.groups() == {} and index.redundant() == 0
+
+    # An empty text has no signature
+    index.add("rapport.txt", "")
+    assert "rapport.txt" not in index.signatures
+
+
+def test_groups_stored_by_the_reindex(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "search_engine.db"))
+    near_duplicates.init_tables(conn)
+    for filename, content in DOCS.items():
+        near_duplicates.save_signature(conn, filename, signature(content))
+    assert near_duplicates.rebuild_groups(conn) == 1
+    [(group_id, members)] = near_duplicates.load_groups(conn)
+    assert group_id == "rapport.txt"
+    assert [f for f, _ in members] == ["rapport.txt", "rapport_v2.txt", "rapport_v3.txt"]
+    assert all(0.8 <= s <= 1.0 for _, s in members)
+
+    near_duplicates.forget(conn, "rapport_v2.txt")
+    near_duplicates.forget(conn, "rapport_v3.txt")
+    assert near_duplicates.load_groups(conn) == []
+    conn.close()
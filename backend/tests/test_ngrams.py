@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("Levenshtein")
+
+from ngrams import TrigramIndex, fold, max_edits
+
+TERMS = ["géologie", "geologie", "géographie", "neurone", "neuronal", "pneu", "réseau", "résumé"]
+
+
+@pytest.fixture
+def index():
+    return TrigramIndex(TERMS)
+
+
+def test_fold_drops_accents_and_case():
+    assert fold("Géologie") == "geologie"
+    assert fold("ÉTÉ") == "ete"
+
+
+def test_accent_insensitive_returns_every_spelling(index):
+    assert index.accent_insensitive("geologie") == ["géologie", "geologie"]
+    assert index.accent_insensitive("GÉOLOGIE") == ["géologie", "geologie"]
+    assert index.accent_insensitive("geolog") == []
+
+
+def test_substring_matches_inside_terms(index):
+    assert index.substring("neur") == ["neurone", "neuronal"]
+    assert index.substring("eu") == ["neurone", "neuronal", "pneu"]      # shorter than a trigram
+    assert index.substring("SEAU") == ["réseau"]
+    assert index.substring("") == []
+    assert index.substring("xyz") == []
+
+
+def test_fuzzy_tolerates_typos_by_word_length(index):
+    assert max_edits("pneu") == 1 and max_edits("neu") == 0 and max_edits("geologies") == 2
+    # Closest first, then by term; 8 letters allow 2 typos
+    assert index.fuzzy("neuronne") == [("neurone", 1), ("neuronal", 2)]
+    assert index.fuzzy("neurone", edits=1) == [("neurone", 0)]
+    assert index.fuzzy("geolgie") == [("geologie", 1), ("géologie", 1)]
+    assert index.fuzzy("resume") == [("résumé", 0)]
+    assert index.fuzzy("neu") == []                      # too short: exact only
+    assert index.fuzzy("pneu", edits=0) == [("pneu", 0)]
+
+
+def test_terms_added_later_are_found(index):
+    index.add(["volcan", "géologie"])
+    assert len(index) == len(TERMS) + 1
+    assert index.substring("olca") == ["volcan"]
+    assert index.fuzzy("volkan") == [("volcan", 1)]
@@ -0,0 +1,89 @@
+import re
+
+import pytest
+
+pytest.importorskip("scipy")
+
+import passages
+from postings import DocIds, PostingList
+
+
+@pytest.mark.parametrize("n_words, size, overlap, expected", [
+    (10, 4, 2, [(0, 4), (2, 6), (4, 8), (6, 10)]),           # last window ends on the last word
+    (11, 4, 2, [(0, 4), (2, 6), (4, 8), (6, 10), (8, 11)]),  # shorter last window, still overlapping
+    (9, 4, 1, [(0, 4), (3, 7), (6, 9)]),
+    (3, 4, 2, [(0, 3)]),                                     # shorter than one window
+    (0, 4, 2, []),
+    (3, 2, 5, [(0, 2), (1, 3)]),                             # overlap >= size: step of one word
+])
+def test_windows(n_words, size, overlap, expected):
+    assert passages.windows(n_words, size, overlap) == expected
+
+
+def add(index, filename, text, page_starts=None):
+    words = [m.span() for m in re.finditer(r"\w+", text)]
+    lemmas = [(i, text[start:end]) for i, (start, end) in enumerate(words)]
+    index.add(filename, words, lemmas, page_starts)
+
+
+@pytest.fixture
+def matrix(monkeypatch):
+    windows = passages.windows
+    monkeypatch.setattr(passages, "windows", lambda n_words: windows(n_words, size=4, overlap=2))
+    index = passages.PassageIndex()
+    doc_ids = DocIds(["b.txt", "a.txt", "c.txt", "d.txt"])
+    # Passages of 4 words: [0-4) [2-6) [4-8) ...
+    add(index, "b.txt", "x x lac lac x x x x lac lac")
+    add(index, "a.txt", "lac lac x x x x lac lac")
+    add(index, "c.txt", "lac x x x x x x x x x x lac lac lac")
+    add(index, "d.txt", "rien ici", page_starts=[0, 5])
+    return doc_ids, index.matrix(doc_ids)
+
+
+def ranked(doc_ids, matrix, terms, hits, k=10):
+    [(ids, scores, best)] = matrix.rank_batch([terms], [PostingList(doc_ids.add(f) for f in hits)], k)
+    return [(doc_ids.name(i), s, matrix.span(p) if p >= 0 else None)
+            for i, s, p in zip(ids.tolist(), scores.tolist(), best.tolist())]
+
+
+def test_document_scores_as_its_best_passage(matrix):
+    doc_ids, matrix = matrix
+    result = ranked(doc_ids, matrix, ["lac"], ["a.txt", "b.txt", "c.txt", "d.txt"])
+    # c.txt has the most "lac" overall, but not in one passage
+    assert [(f, s) for f, s, _ in result] == [("c.txt", 3), ("a.txt", 2), ("b.txt", 2), ("d.txt", 0)]
+    assert result[-1][2] is None
+
+
+def test_tied_passages_keep_the_first_one(matrix):
+    doc_ids, matrix = matrix
+    text = "x x lac lac x x x x lac lac"
+    [(_, _, (start, end, page))] = ranked(doc_ids, matrix, ["lac"], ["b.txt"])
+    # [0-4) and [2-6) both hold "lac lac", as does the last one: the first wins
+    assert (start, end, page) == (0, len("x x lac lac"), None)
+    assert text[start:end].split() == ["x", "x", "lac", "lac"]
+
+
+def test_ties_between_documents_are_ordered_by_filename_and_k_cuts_after(matrix):
+    doc_ids, matrix = matrix
+    assert [f for f, _, _ in ranked(doc_ids, matrix, ["lac"], ["b.txt", "a.txt"], k=1)] == ["a.txt"]
+    assert [f for f, _, _ in ranked(doc_ids, matrix, ["lac"], ["b.txt", "a.txt"], k=2)] == ["a.txt", "b.txt"]
+
+
+def test_candidates_restrict_the_documents_and_pages_are_kept(matrix):
+    doc_ids, matrix = matrix
+    assert ranked(doc_ids, matrix, ["lac"], ["b.txt"], k=None)[0][0] == "b.txt"
+    assert [f for f, _, _ in ranked(doc_ids, matrix, ["lac"], [])] == []
+    [(filename, score, (start, end, page))] = ranked(doc_ids, matrix, ["ici"], ["d.txt"])
+    assert (filename, score, start, end, page) == ("d.txt", 1, 0, len("rien ici"), 1)
+
+
+def test_removed_documents_are_not_ranked(monkeypatch):
+    index = passages.PassageIndex()
+    doc_ids = DocIds()
+    add(index, "a.txt", "lac bleu")
+    add(index, "b.txt", "lac vert")
+    index.remove("a.txt")
+    index.remove("missing.txt")
+    matrix = index.matrix(doc_ids)
+    assert len(index) == 1
+    assert [f for f, _, _ in ranked(doc_ids, matrix, ["lac"], ["a.txt", "b.txt"])] == ["b.txt"]
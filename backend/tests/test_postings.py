@@ -0,0 +1,88 @@
+import random
+from array import array
+
+import pytest
+
+import postings
+from postings import DocIds, EMPTY, PostingList
+
+
+def test_doc_ids_are_dense_and_stable():
+    doc_ids = DocIds(["a.txt", "b.pdf"])
+    assert doc_ids.add("c.docx") == 2
+    assert doc_ids.add("a.txt") == 0
+    assert doc_ids.get("b.pdf") == 1
+    assert doc_ids.get("missing.txt") is None
+    assert doc_ids.name(2) == "c.docx"
+    assert doc_ids.filenames(PostingList([2, 0])) == ["a.txt", "c.docx"]
+    assert len(doc_ids) == 3 and "c.docx" in doc_ids
+
+
+def test_posting_list_is_sorted_and_unique():
+    p = PostingList([5, 1, 3, 1, 5])
+    assert list(p) == [1, 3, 5]
+    assert p.ids.typecode == "I"
+    assert 3 in p and 4 not in p
+    assert p.nbytes == 3 * p.ids.itemsize
+    assert not EMPTY and len(EMPTY) == 0
+
+
+@pytest.mark.parametrize("small, large", [
+    ([], [1, 2, 3]),
+    ([2], list(range(100))),
+    ([0, 50, 99, 1000], list(range(100))),          # galloping
+    ([1, 3, 5, 7], [2, 3, 4, 5, 6]),                # linear
+])
+def test_boolean_operations_match_sets(small, large):
+    a, b = PostingList(small), PostingList(large)
+    assert list(a & b) == sorted(set(small) & set(large))
+    assert list(b & a) == sorted(set(small) & set(large))
+    assert list(a | b) == sorted(set(small) | set(large))
+    assert list(a - b) == sorted(set(small) - set(large))
+    assert list(b - a) == sorted(set(large) - set(small))
+
+
+def test_gallop_intersect_matches_set_intersection():
+    rng = random.Random(7)
+    for _ in range(200):
+        large = sorted(rng.sample(range(5000), rng.randint(0, 2000)))
+        small = sorted(rng.sample(range(5000), rng.randint(0, 50)))
+        expected = sorted(set(small) & set(large))
+        assert list(postings.gallop_intersect(array("I", small), array("I", large))) == expected
+
+
+def test_union_all_and_merge_all_agree():
+    rng = random.Random(3)
+    lists = [PostingList(rng.sample(range(1000), rng.randint(0, 100))) for _ in range(12)] + [EMPTY]
+    expected = sorted(set().union(*(set(p) for p in lists)))
+    assert list(PostingList.union_all(lists)) == expected
+    assert list(PostingList.merge_all(lists)) == expected
+    assert PostingList.union_all([EMPTY]) == EMPTY
+    assert PostingList.merge_all([PostingList([4, 2])]) == PostingList([2, 4])
+
+
+def test_results_are_new_arrays():
+    a = PostingList([1, 2])
+    assert (a | EMPTY).ids is not a.ids
+    assert (a - EMPTY).ids is not a.ids
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_set_and_numpy_paths_match_sets(use_numpy, monkeypatch):
+    if use_numpy:
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(postings, "NUMPY_MIN", 0)
+    else:
+        monkeypatch.setattr(postings, "np", None)
+    rng = random.Random(11)
+    for _ in range(100):
+        x = set(rng.sample(range(3000), rng.randint(1, 600)))
+        y = set(rng.sample(range(3000), rng.randint(1, 600)))
+        z = set(rng.sample(range(3000), rng.randint(1, 600)))
+        a, b, c = PostingList(x), PostingList(y), PostingList(z)
+        for result in (a & b, a | b, a - b, PostingList.union_all([a, b, c])):
+            assert result.ids.typecode == "I"
+        assert list(a & b) == sorted(x & y)
+        assert list(a | b) == sorted(x | y)
+        assert list(a - b) == sorted(x - y)
+        assert list(PostingList.union_all([a, b, c])) == sorted(x | y | z)
@@ -0,0 +1,113 @@
+import hashlib
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import raw_files
+from raw_files import RangeNotSatisfiable, parse_range
+
+CONTENT = bytes(range(256)) * 1000          # 256000 bytes, several read chunks
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "document.pdf"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+@pytest.fixture
+def client(path):
+    app = FastAPI()
+
+    @app.get("/raw")
+    def raw(request: Request):
+        return raw_files.file_response(path, request.headers)
+
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("items=0-10", None),
+    ("bytes=0-99,200-299", None),
+    ("bytes=a-b", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=900-5000", (900, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=50-10", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 1000)
+
+
+def test_full_file(client, path):
+    response = client.get("/raw")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.headers["cache-control"] == raw_files.CACHE_CONTROL
+    assert int(response.headers["content-length"]) == len(CONTENT)
+
+
+def test_byte_ranges(client):
+    response = client.get("/raw", headers={"Range": "bytes=70000-200000"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[70000:200001]
+    assert response.headers["content-range"] == f"bytes 70000-200000/{len(CONTENT)}"
+
+    response = client.get("/raw", headers={"Range": "bytes=-10"})
+    assert response.status_code == 206 and response.content == CONTENT[-10:]
+
+    response = client.get("/raw", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_conditional_requests(client, path):
+    etag = client.get("/raw").headers["etag"]
+    assert client.get("/raw", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/raw", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/raw", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    mtime = os.stat(path).st_mtime
+    assert client.get("/raw", headers={"If-Modified-Since": formatdate(mtime + 60, usegmt=True)}).status_code == 304
+    assert client.get("/raw", headers={"If-Modified-Since": formatdate(mtime - 60, usegmt=True)}).status_code == 200
+    assert client.get("/raw", headers={"If-Modified-Since": "not a date"}).status_code == 200
+
+
+def test_if_range(client):
+    etag = client.get("/raw").headers["etag"]
+    response = client.get("/raw", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206 and response.content == CONTENT[:10]
+    response = client.get("/raw", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200 and response.content == CONTENT
+
+
+def test_modified_file_gets_a_new_etag(client, path):
+    etag = client.get("/raw").headers["etag"]
+    with open(path, "ab") as f:
+        f.write(b"more")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    response = client.get("/raw", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    response = raw_files.file_response(str(path), {})
+    assert response.status_code == 200 and response.headers["content-length"] == "0"
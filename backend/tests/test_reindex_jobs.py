@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+import lemmatizer
+import reindex_jobs
+
+
+def test_resume_retries_the_files_that_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(lemmatizer, "lemmatisation", lambda text: text.lower().split())
+    documents = tmp_path / "documents"
+    documents.mkdir()
+    (documents / "a.txt").write_text("premier document", encoding="utf-8")
+    (documents / "b.txt").write_text("second document", encoding="utf-8")
+    db_path = str(tmp_path / "search_engine.db")
+
+    conn = sqlite3.connect(db_path)
+    reindex_jobs.init_tables(conn)
+    job_id = conn.execute("INSERT INTO reindex_jobs (status, created_at) VALUES ('queued', ?)",
+                          (time.time(),)).lastrowid
+    conn.commit()
+    # Checkpoint of an interrupted run: a.txt done, b.txt failed
+    stage_conn = reindex_jobs.open_staging(reindex_jobs.staging_path(db_path, job_id))
+    stage_conn.executemany("INSERT INTO job_files VALUES (?, ?, ?)",
+                           [("a.txt", "done", None), ("b.txt", "error", "OSError()")])
+    stage_conn.commit()
+    stage_conn.close()
+
+    reindex_jobs.run(job_id, db_path, str(documents))
+
+    job = reindex_jobs.get_job(conn, job_id)
+    assert job["status"] == "completed"
+    assert (job["done_files"], job["failed_files"]) == (2, 0)
+    assert [f for f, in conn.execute("SELECT filename FROM documents")] == ["b.txt"]
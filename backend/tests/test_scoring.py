@@ -0,0 +1,64 @@
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+
+import scoring
+from postings import DocIds, PostingList
+
+FREQS = {
+    "a.txt": Counter({"réseau": 3, "donnée": 1}),
+    "b.txt": Counter({"réseau": 1}),
+    "c.txt": Counter({"donnée": 4, "modèle": 2}),
+}
+
+
+def ranked(doc_ids, result):
+    ids, scores = result
+    return list(zip(doc_ids.filenames(ids.tolist()), scores.tolist()))
+
+
+@pytest.mark.parametrize("weighting", ["count", "tfidf"])
+def test_rank_matches_per_document_sums(weighting):
+    doc_ids = DocIds()
+    matrix = scoring.ScoringMatrix.from_freqs(FREQS, doc_ids, weighting)
+    result = ranked(doc_ids, matrix.rank(["réseau", "donnée"]))
+    assert sorted(f for f, _ in result) == ["a.txt", "b.txt", "c.txt"]
+    expected = matrix.count_scores(["réseau", "donnée"], [FREQS[f] for f, _ in result])
+    assert np.allclose([s for _, s in result], expected)
+
+
+def test_ties_are_ordered_by_filename_and_k_keeps_them_stable():
+    doc_ids = DocIds(["z.txt", "y.txt", "x.txt"])
+    freqs = {name: Counter({"mot": 1}) for name in ("z.txt", "y.txt", "x.txt")}
+    matrix = scoring.ScoringMatrix.from_freqs(freqs, doc_ids)
+    assert [f for f, _ in ranked(doc_ids, matrix.rank(["mot"]))] == ["x.txt", "y.txt", "z.txt"]
+    assert [f for f, _ in ranked(doc_ids, matrix.rank(["mot"], k=2))] == ["x.txt", "y.txt"]
+
+
+def test_changes_rank_new_and_modified_documents_with_their_current_counts():
+    doc_ids = DocIds()
+    matrix = scoring.ScoringMatrix.from_freqs(FREQS, doc_ids)
+    current = dict(FREQS, **{"b.txt": Counter({"réseau": 7}), "d.txt": Counter({"réseau": 5})})
+    changes = scoring.Changes(matrix, current.items(), doc_ids)
+    assert sorted(doc_ids.filenames(changes.ids.tolist())) == ["b.txt", "d.txt"]
+
+    hits = PostingList(doc_ids.get(f) for f in ("a.txt", "b.txt", "d.txt"))
+    expected = [("b.txt", 7), ("d.txt", 5), ("a.txt", 3)]
+    assert ranked(doc_ids, matrix.rank(["réseau"], hits, changes=changes)) == expected
+    assert ranked(doc_ids, matrix.rank(["réseau"], changes=changes)) == expected
+    [batch] = matrix.rank_batch([["réseau"]], [hits], k=None, changes=changes)
+    assert ranked(doc_ids, batch) == expected
+
+    # Same ranking as a matrix rebuilt from the current counts
+    rebuilt = scoring.ScoringMatrix.from_freqs(current, doc_ids)
+    assert ranked(doc_ids, rebuilt.rank(["réseau"], hits)) == expected
+
+
+def test_stale_matrix_without_changes_only_knows_its_documents():
+    doc_ids = DocIds()
+    matrix = scoring.ScoringMatrix.from_freqs(FREQS, doc_ids)
+    new = doc_ids.add("d.txt")
+    assert new not in matrix.rank(["réseau"], PostingList([new, 0]))[0]
@@ -0,0 +1,49 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("scipy")
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="module")
+def api(engine):
+    import main
+    main.get_scorer()
+    # No context manager: the startup tasks (background refresh...) stay off
+    return main, TestClient(main.app), engine.DOCUMENTS_DIR
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def filenames(results):
+    return [r["filename"] for r in results]
+
+
+def test_refreshed_documents_are_found_before_the_new_matrix(api):
+    main, client, documents = api
+    write(os.path.join(documents, "volcan.txt"), "Le volcan crache de la lave. Le volcan gronde.")
+    write(os.path.join(documents, "montagne.txt"), "La montagne abrite un volcan endormi.")
+    future = time.time() + 5
+    os.utime(os.path.join(documents, "montagne.txt"), (future, future))
+
+    # While the next matrix is being built, searches use the previous one
+    with main._scorer_lock:
+        indexed, _ = main.search_engine.refresh()
+        assert indexed == ["montagne.txt", "volcan.txt"]
+
+        found = client.get("/search", params={"query": "volcan"}).json()
+        assert filenames(found["results"]) == ["volcan.txt", "montagne.txt"]
+
+        batch = client.post("/search/batch", json={"queries": ["volcan", "abeille"], "snippets": False}).json()
+        assert filenames(batch["results"][0]["results"]) == ["volcan.txt", "montagne.txt"]
+        assert filenames(batch["results"][1]["results"]) == ["jardin.txt"]
+
+        # The old counts of montagne.txt are gone
+        assert client.get("/search", params={"query": "glacier"}).json()["results"] == []
@@ -0,0 +1,97 @@
+from collections import Counter
+
+from postings import DocIds, PostingList
+from segments import Bitmap, SegmentedIndex
+
+
+def docs(*names, words="alpha beta"):
+    return {name: Counter(words.split()) for name in names}
+
+
+def ids(index, word):
+    return index.doc_ids.filenames(index.get(word, PostingList()))
+
+
+def test_bitmap():
+    bitmap = Bitmap()
+    assert bitmap.add(3) and bitmap.add(17)
+    assert not bitmap.add(3)
+    assert 17 in bitmap and 4 not in bitmap and 1000 not in bitmap
+    assert list(bitmap) == [3, 17] and len(bitmap) == 2
+    copy = bitmap.copy()
+    copy.add(5)
+    assert 5 not in bitmap and len(copy) == 3
+
+
+def test_lookup_spans_segments():
+    index = SegmentedIndex(DocIds(), gauges=False)
+    index.add_documents(docs("a.txt", "b.txt"))
+    index.add_documents(docs("c.txt", words="beta gamma"))
+    assert len(index.segments) == 2
+    assert ids(index, "alpha") == ["a.txt", "b.txt"]
+    assert ids(index, "beta") == ["a.txt", "b.txt", "c.txt"]
+    assert "gamma" in index and "delta" not in index
+    assert index.get("delta") is None
+    assert sorted(index) == ["alpha", "beta", "gamma"] and len(index) == 3
+
+
+def test_reindexed_document_replaces_its_previous_version():
+    index = SegmentedIndex(DocIds(), gauges=False)
+    index.add_documents(docs("a.txt", "b.txt"))
+    generation = index.generation
+    index.add_documents(docs("a.txt", words="gamma"))
+    assert index.generation > generation
+    assert ids(index, "alpha") == ["b.txt"]
+    assert ids(index, "gamma") == ["a.txt"]
+    assert index.live_documents() == 2
+
+
+def test_delete_tombstones_then_merge_drops():
+    index = SegmentedIndex(DocIds(), merge_factor=2, merge_budget=0, gauges=False)
+    index.add_documents(docs("a.txt", "b.txt", "c.txt"))
+    assert index.delete("b.txt")
+    assert not index.delete("b.txt") and not index.delete("unknown.txt")
+    assert ids(index, "alpha") == ["a.txt", "c.txt"]
+
+    # 1 deleted out of 3 >= EXPUNGE_RATIO: the segment is rewritten alone
+    assert index.merge_pending() >= 1
+    [segment] = index.segments
+    assert len(segment.deleted) == 0 and list(segment.docs) == [0, 2]
+    assert ids(index, "beta") == ["a.txt", "c.txt"]
+
+
+def test_merge_of_a_full_tier():
+    index = SegmentedIndex(DocIds(), merge_factor=2, merge_budget=0, gauges=False)
+    index.add_documents(docs("a.txt", words="alpha"))
+    index.add_documents(docs("b.txt", words="beta"))
+    index.add_documents(docs("c.txt", words="alpha gamma"))
+    before = {word: ids(index, word) for word in index}
+
+    index.merge_pending()
+    assert len(index.segments) < 3
+    assert {word: ids(index, word) for word in index} == before
+    assert index.live_documents() == 3
+
+
+def test_all_deleted_segment_disappears():
+    index = SegmentedIndex(DocIds(), gauges=False)
+    index.add_documents(docs("a.txt"))
+    index.delete("a.txt")
+    index.merge_pending()
+    assert index.segments == [] and len(index) == 0
+
+
+def test_live_postings_are_cached_until_the_next_delete():
+    index = SegmentedIndex(DocIds(), gauges=False)
+    index.add_documents(docs("a.txt", "b.txt", "c.txt", "d.txt"))
+    [segment] = index.segments
+    assert segment.get("alpha") is segment.postings["alpha"]       # no tombstones: no copy
+
+    index.delete("b.txt")
+    live = segment.get("alpha")
+    assert segment.get("alpha") is live
+    assert ids(index, "alpha") == ["a.txt", "c.txt", "d.txt"]
+
+    index.delete("c.txt")
+    assert segment.get("alpha") is not live
+    assert ids(index, "alpha") == ["a.txt", "d.txt"]
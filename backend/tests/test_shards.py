@@ -0,0 +1,64 @@
+import multiprocessing
+import threading
+
+import pytest
+
+pytest.importorskip("scipy")
+
+import shards
+
+TEXTS = {
+    "a.txt": "Le volcan gronde, le volcan fume au-dessus de la vallée.",
+    "b.txt": "La vallée verte du volcan.",
+    "c.txt": "Une vallée calme.",
+    "d.txt": "Le glacier recouvre la vallée.",
+}
+
+
+@pytest.fixture(params=["count", "tfidf"])
+def sharded(request, engine, tmp_path, monkeypatch):
+    """One shard behind a pipe, served by a thread, and its coordinator."""
+    monkeypatch.setattr(shards, "SHARD_WEIGHTING", request.param)
+    for name, text in TEXTS.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    shard = shards.Shard(0, 1, str(tmp_path))
+    parent, child = multiprocessing.Pipe()
+    threading.Thread(target=shards.serve_connection, args=(shard, child), daemon=True).start()
+    index = shards.ShardedIndex([parent])
+    yield shard, index, request.param
+    index.close()
+
+
+def loop_scores(shard, *args):
+    scorer, shard.scorer = shard.scorer, None
+    try:
+        return shard.search(*args)
+    finally:
+        shard.scorer = scorer
+
+
+def test_matrix_scores_match_the_per_hit_loop(sharded):
+    shard, index, weighting = sharded
+    assert shard.scorer is not None
+    terms = ["vallée", "volcan"]
+    idf = index.idf(terms) if weighting == "tfidf" else None
+    for k in (None, 2):
+        total, top, _ = shard.search("vallée", terms, k, idf)
+        expected_total, expected, _ = loop_scores(shard, "vallée", terms, k, idf)
+        assert total == expected_total == 4
+        assert [f for _, f in top] == [f for _, f in expected]
+        assert [s for s, _ in top] == pytest.approx([s for s, _ in expected])
+    assert [f for _, f in top] == ["a.txt", "b.txt"]
+
+
+def test_delete_updates_the_global_statistics(sharded):
+    shard, index, _ = sharded
+    assert index.total_docs == 4 and index.df["volcan"] == 2 and index.df["glacier"] == 1
+    before = index.idf(["vallée", "volcan"])
+
+    assert index.delete("d.txt")
+    assert not index.delete("d.txt") and not index.delete("unknown.txt")
+    assert index.total_docs == 3 and "glacier" not in index.df and index.df["vallée"] == 3
+    assert index.df == shard.stats()["df"]
+    assert index.idf(["vallée", "volcan"])["volcan"] < before["volcan"]
+    assert [f for f, _ in index.search("vallée", ["vallée"])[1]] == ["a.txt", "b.txt", "c.txt"]
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+
+import pytest
+
+import stats
+import token_filters
+from token_filters import TokenFilter
+
+DOCUMENTS = {
+    "a.txt": {"réseau": 4, "neurone": 2, "le": 9, "un": 3, "ia": 1},
+    "b.txt": {"réseau": 1, "donnée": 5, "le": 2, "au": 1},
+    "c.txt": {"donnée": 2, "ia": 6, "modèle": 3},
+}
+
+
+def build_database(path, token_filter):
+    """Indexed database as the admin reindex writes it (documents + filtered counts + stats)."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT UNIQUE)")
+    conn.execute("""
+        CREATE TABLE word_frequencies (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, document_id INTEGER, word TEXT, count INTEGER
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX idx_unique_word_per_doc ON word_frequencies (document_id, word)")
+    stats.init_stats_tables(conn)
+    token_filters.init_tables(conn)
+    cursor = conn.cursor()
+    for filename, counts in DOCUMENTS.items():
+        cursor.execute("INSERT INTO documents (filename) VALUES (?)", (filename,))
+        token_filters.write_document(cursor, cursor.lastrowid, filename, counts, token_filter)
+    token_filters.record_filter(cursor, token_filter)
+    conn.commit()
+    return conn
+
+
+def snapshot(conn):
+    return {
+        "word_frequencies": sorted(conn.execute("SELECT document_id, word, count FROM word_frequencies")),
+        "term_stats": sorted(conn.execute("SELECT word, doc_count, occurrences FROM term_stats")),
+        "document_stats": sorted(conn.execute(
+            "SELECT document_id, filename, word_count, occurrences FROM document_stats")),
+        "corpus_stats": conn.execute(
+            "SELECT total_docs, total_words, unique_words FROM corpus_stats").fetchall(),
+    }
+
+
+def test_token_filter():
+    token_filter = TokenFilter({"le", "un"}, min_length=3)
+    assert token_filter.keep("réseau")
+    assert not token_filter.keep("le") and not token_filter.keep("ia")
+    assert token_filter.apply({"réseau": 2, "un": 1, "ia": 4}) == {"réseau": 2}
+    assert token_filter.terms(["le", "réseau", "ia", "réseau"]) == ["réseau", "réseau"]
+    assert token_filter == TokenFilter(["un", "le"], 3)
+    assert token_filter != TokenFilter({"le", "un"}, 2)
+
+
+@pytest.mark.parametrize("before, after", [
+    (TokenFilter({"le", "un", "au"}, 3), TokenFilter({"le", "donnée"}, 3)),     # stopwords edited
+    (TokenFilter({"le", "un", "au"}, 3), TokenFilter({"le", "un", "au"}, 2)),   # shorter words allowed
+    (TokenFilter(set(), 1), TokenFilter({"réseau", "le"}, 4)),                   # both at once
+])
+def test_sync_database_matches_a_full_reindex(tmp_path, before, after):
+    synced = build_database(str(tmp_path / "synced.db"), before)
+    removed, added = token_filters.sync_database(synced, after)
+
+    vocabulary = {w for counts in DOCUMENTS.values() for w in counts}
+    assert sorted(removed) == sorted(w for w in vocabulary if before.keep(w) and not after.keep(w))
+    assert sorted(added) == sorted(w for w in vocabulary if not before.keep(w) and after.keep(w))
+
+    reindexed = build_database(str(tmp_path / "reindexed.db"), after)
+    assert snapshot(synced) == snapshot(reindexed)
+    assert token_filters.applied_filter(synced) == after
+
+
+def test_sync_database_without_changes(tmp_path):
+    token_filter = TokenFilter({"le"}, 3)
+    conn = build_database(str(tmp_path / "search_engine.db"), token_filter)
+    before = snapshot(conn)
+    assert token_filters.sync_database(conn, token_filter) == ([], [])
+    assert snapshot(conn) == before
+
+
+def test_sync_database_records_an_unknown_filter(tmp_path):
+    conn = build_database(str(tmp_path / "search_engine.db"), TokenFilter({"le"}, 3))
+    conn.execute("DELETE FROM applied_filter")
+    conn.commit()
+    before = snapshot(conn)
+    assert token_filters.sync_database(conn, TokenFilter(set(), 1)) == ([], [])
+    assert snapshot(conn) == before
+    assert token_filters.applied_filter(conn) == TokenFilter(set(), 1)
+
+
+def test_current_reloads_an_edited_stopwords_file(tmp_path):
+    path = str(tmp_path / "stopwords.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("le\nLa\n\n")
+    first = token_filters.current(path)
+    assert first.stopwords == {"le", "la"}
+    assert token_filters.current(path) is first
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("le\nréseau\n")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+    assert token_filters.current(path).stopwords == {"le", "réseau"}
+
+    missing = token_filters.current(str(tmp_path / "missing.txt"))
+    assert missing.stopwords == token_filters.DEFAULT_STOPWORDS
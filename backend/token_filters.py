@@ -0,0 +1,203 @@
+"""
+Stopword / minimum-length filters, applied on top of the stored lemmas.
+
+Lemmatization (spaCy) is the expensive part of indexing and does not
+depend on the stopword list, so documents are lemmatized once and their
+unfiltered lemma counts are kept: FREQS and the in-memory index in the
+API, the lemma_counts table in SQLite. The filters are a derived layer:
+
+- API: query words rejected by the filter match nothing and do not score
+  (recherche / ranking). current() re-reads stopwords.txt when its mtime
+  changes, so an edit is live on the next query.
+- SQLite: word_frequencies and the statistics tables hold the filtered
+  counts. sync_database() compares the filter they were built with
+  (applied_filter) to the current one and only rewrites the rows of the
+  words whose status changed: seconds instead of a full reindex.
+"""
+import json
+import os
+import threading
+
+import stats
+
+STOPWORDS_FILE = "stopwords.txt"
+MIN_LENGTH = int(os.environ.get("DOCUFIND_MIN_WORD_LENGTH", "3"))
+DEFAULT_STOPWORDS = {"le", "la", "les", "un", "une", "et", "de", "du", "des", "à", "au", "aux"}
+
+
+# -------------------------- FILTER --------------------------
+class TokenFilter:
+    """Which lemmas are indexed: not a stopword and at least `min_length` long."""
+
+    def __init__(self, stopwords=(), min_length=MIN_LENGTH):
+        self.stopwords = frozenset(stopwords)
+        self.min_length = min_length
+
+    def keep(self, word):
+        return len(word) >= self.min_length and word not in self.stopwords
+
+    def apply(self, counts):
+        """Filtered {word: count}."""
+        return {w: c for w, c in counts.items() if self.keep(w)}
+
+    def terms(self, words):
+        return [w for w in words if self.keep(w)]
+
+    def __eq__(self, other):
+        return (isinstance(other, TokenFilter) and self.stopwords == other.stopwords
+                and self.min_length == other.min_length)
+
+    def __hash__(self):
+        return hash((self.stopwords, self.min_length))
+
+
+def load_stopwords(path=STOPWORDS_FILE):
+    if not os.path.exists(path):
+        return set(DEFAULT_STOPWORDS)
+    with open(path, "r", encoding="utf-8") as f:
+        return {w.strip().lower() for w in f.read().splitlines() if w.strip()}
+
+
+_current = {}               # path -> (mtime, filter)
+_current_lock = threading.Lock()
+
+
+def current(path=STOPWORDS_FILE):
+    """
+    Filter of the current stopwords.txt (or of another stopwords file, e.g.
+    a collection's), reloaded when the file changes.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    with _current_lock:
+        cached = _current.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _current[path] = (mtime, TokenFilter(load_stopwords(path)))
+        return cached[1]
+
+
+# -------------------------- DATABASE --------------------------
+def init_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS lemma_counts (
+            document_id INTEGER,
+            word TEXT,
+            count INTEGER,
+            PRIMARY KEY (document_id, word)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lemma_counts_word ON lemma_counts (word)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS applied_filter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            stopwords TEXT,
+            min_length INTEGER
+        )
+    """)
+    conn.commit()
+
+
+def applied_filter(conn):
+    """Filter word_frequencies was built with (None if unknown)."""
+    row = conn.execute("SELECT stopwords, min_length FROM applied_filter WHERE id = 1").fetchone()
+    return TokenFilter(json.loads(row[0]), row[1]) if row else None
+
+
+def record_filter(cursor, token_filter):
+    cursor.execute(
+        "INSERT OR REPLACE INTO applied_filter (id, stopwords, min_length) VALUES (1, ?, ?)",
+        (json.dumps(sorted(token_filter.stopwords)), token_filter.min_length),
+    )
+
+
+def write_document(cursor, doc_id, filename, counts, token_filter):
+    """
+    Store the lemma counts of a new document and its filtered
+    word_frequencies rows and statistics. Returns the filtered counts.
+    """
+    cursor.executemany(
+        "INSERT OR REPLACE INTO lemma_counts (document_id, word, count) VALUES (?, ?, ?)",
+        [(doc_id, w, c) for w, c in counts.items()],
+    )
+    indexed = token_filter.apply(counts)
+    cursor.executemany(
+        "INSERT INTO word_frequencies (document_id, word, count) VALUES (?, ?, ?)",
+        [(doc_id, w, c) for w, c in indexed.items()],
+    )
+    stats.record_document(cursor, doc_id, filename, indexed)
+    return indexed
+
+
+def forget_document(cursor, doc_id):
+    cursor.execute("DELETE FROM lemma_counts WHERE document_id = ?", (doc_id,))
+
+
+def sync_database(conn, token_filter=None):
+    """
+    Bring word_frequencies and the statistics in line with `token_filter`
+    (the current stopwords.txt by default), touching only the words whose
+    status changed. Returns (removed words, added words).
+    """
+    token_filter = token_filter or current()
+    init_tables(conn)
+    previous = applied_filter(conn)
+    cursor = conn.cursor()
+    if previous is None or previous == token_filter:
+        # Unknown (database indexed before lemma_counts): nothing to derive from
+        record_filter(cursor, token_filter)
+        conn.commit()
+        return [], []
+
+    vocabulary = [w for (w,) in cursor.execute("SELECT DISTINCT word FROM lemma_counts")]
+    removed = [w for w in vocabulary if previous.keep(w) and not token_filter.keep(w)]
+    added = [w for w in vocabulary if not previous.keep(w) and token_filter.keep(w)]
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS changed_words (word TEXT PRIMARY KEY, added INTEGER)")
+    cursor.execute("DELETE FROM changed_words")
+    cursor.executemany("INSERT INTO changed_words VALUES (?, 0)", [(w,) for w in removed])
+    cursor.executemany("INSERT INTO changed_words VALUES (?, 1)", [(w,) for w in added])
+
+    cursor.execute("""
+        DELETE FROM word_frequencies
+        WHERE word IN (SELECT word FROM changed_words WHERE added = 0)
+    """)
+    cursor.execute("""
+        INSERT INTO word_frequencies (document_id, word, count)
+        SELECT l.document_id, l.word, l.count
+        FROM lemma_counts l
+        JOIN documents d ON d.id = l.document_id
+        WHERE l.word IN (SELECT word FROM changed_words WHERE added = 1)
+    """)
+
+    # ---- Statistics of the changed words and of the documents containing them
+    cursor.execute("DELETE FROM term_stats WHERE word IN (SELECT word FROM changed_words)")
+    cursor.execute("""
+        INSERT INTO term_stats (word, doc_count, occurrences)
+        SELECT word, COUNT(*), SUM(count)
+        FROM word_frequencies
+        WHERE word IN (SELECT word FROM changed_words WHERE added = 1)
+        GROUP BY word
+    """)
+    cursor.execute("""
+        UPDATE document_stats
+        SET word_count = (SELECT COUNT(*) FROM word_frequencies w
+                          WHERE w.document_id = document_stats.document_id),
+            occurrences = (SELECT COALESCE(SUM(count), 0) FROM word_frequencies w
+                           WHERE w.document_id = document_stats.document_id)
+        WHERE document_id IN (
+            SELECT DISTINCT document_id FROM lemma_counts
+            WHERE word IN (SELECT word FROM changed_words)
+        )
+    """)
+    cursor.execute("""
+        UPDATE corpus_stats
+        SET total_words = (SELECT COALESCE(SUM(word_count), 0) FROM document_stats),
+            unique_words = (SELECT COUNT(*) FROM term_stats)
+        WHERE id = 1
+    """)
+
+    record_filter(cursor, token_filter)
+    conn.commit()
+    return removed, added
@@ -0,0 +1,64 @@
+"""
+Deleted documents shared between the admin dashboard and the API.
+
+The dashboard runs in its own process: when it deletes a document it
+appends a row to the `tombstones` table. The row id is a generation
+number, so the API only has to compare MAX(id) with the last generation
+it applied (one lookup on the primary key) before each search, and reads
+the new rows when it changed. Applying a tombstone marks the document as
+deleted in the API (set lookup per hit, segment tombstone bitmap); the
+postings themselves go away at the next segment merge or full reindex.
+"""
+import sqlite3
+import threading
+
+
+def init_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tombstones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def record(cursor, filename):
+    """Tombstone a deleted document (committed with the caller's delete)."""
+    init_table(cursor.connection)
+    cursor.execute("INSERT INTO tombstones (filename) VALUES (?)", (filename,))
+
+
+def current_generation(cursor):
+    row = cursor.execute("SELECT MAX(id) FROM tombstones").fetchone()
+    return row[0] or 0
+
+
+class TombstoneWatcher:
+    """Applies the tombstones written by other processes (see poll)."""
+
+    def __init__(self, db_path, on_delete):
+        self.on_delete = on_delete
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        init_table(self.conn)
+        self.conn.commit()
+        # Documents deleted before startup are not in the folder anymore
+        self.generation = current_generation(self.conn.cursor())
+
+    def poll(self):
+        """Apply the tombstones newer than the last poll; their filenames."""
+        with self.lock:
+            cursor = self.conn.cursor()
+            if current_generation(cursor) == self.generation:
+                return []
+            rows = cursor.execute(
+                "SELECT id, filename FROM tombstones WHERE id > ? ORDER BY id", (self.generation,)
+            ).fetchall()
+            for generation, filename in rows:
+                self.on_delete(filename)
+                self.generation = generation
+            return [filename for _, filename in rows]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,97 @@
+"""
+Wildcard terms in queries: "neuro*", "r?seau", "*ique".
+
+`*` matches any run of characters and `?` exactly one. A pattern is
+resolved against the term dictionary kept sorted (binary search, bisect):
+
+- literal prefix ("neuro*", "ne?ro*")   : range scan of the sorted terms
+- leading wildcard ("*ique")            : range scan of the sorted
+                                          reversed terms (reverse index)
+- both                                  : the smaller of the two ranges
+- neither ("*euro*")                    : terms containing the longest
+                                          literal piece (trigram index,
+                                          see ngrams.py) or a full scan
+Every candidate is then checked against the pattern. A pattern expands to
+at most `limit` terms, the most frequent ones, so that "a*" cannot turn
+into a union of thousands of posting lists.
+"""
+import heapq
+import re
+import threading
+from bisect import bisect_left
+
+WILDCARDS = "*?"
+# Last possible character of a term, for the end of a prefix range
+MAX_CHAR = "\U0010ffff"
+
+
+def is_pattern(word):
+    return any(c in word for c in WILDCARDS)
+
+
+def compile_pattern(pattern):
+    return re.compile("".join(
+        ".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern
+    ) + r"\Z")
+
+
+def prefix_range(terms, prefix):
+    """(lo, hi) slice of the sorted `terms` starting with `prefix`."""
+    return bisect_left(terms, prefix), bisect_left(terms, prefix + MAX_CHAR)
+
+
+class TermDictionary:
+    """Sorted terms and sorted reversed terms of the index."""
+
+    def __init__(self, terms=()):
+        self.lock = threading.Lock()
+        self.known = set()
+        self.terms = []
+        self.reversed = []
+        self.add(terms)
+
+    def add(self, terms):
+        """Merge the new terms into both sorted lists."""
+        new = sorted(set(terms) - self.known)
+        if not new:
+            return
+        with self.lock:
+            self.known.update(new)
+            self.terms = list(heapq.merge(self.terms, new))
+            self.reversed = list(heapq.merge(self.reversed, sorted(t[::-1] for t in new)))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def candidates(self, pattern, substring=None):
+        """Terms that may match `pattern` (a superset, to be checked)."""
+        first = min(pattern.find(c) for c in WILDCARDS if c in pattern)
+        last = max(pattern.rfind(c) for c in WILDCARDS)
+        prefix, suffix = pattern[:first], pattern[last + 1:]
+        terms, reversed_terms = self.terms, self.reversed
+
+        ranges = []
+        if prefix:
+            lo, hi = prefix_range(terms, prefix)
+            ranges.append((hi - lo, terms[lo:hi]))
+        if suffix:
+            lo, hi = prefix_range(reversed_terms, suffix[::-1])
+            ranges.append((hi - lo, [t[::-1] for t in reversed_terms[lo:hi]]))
+        if ranges:
+            return min(ranges, key=lambda r: r[0])[1]
+
+        piece = max(re.split(r"[*?]", pattern), key=len)
+        if substring is not None and len(piece) >= 3:
+            return substring(piece)
+        return terms
+
+    def expand(self, pattern, frequency=None, limit=None, substring=None):
+        """
+        Terms matching `pattern`; with `frequency(term)` and `limit`, only
+        the `limit` most frequent ones.
+        """
+        regex = compile_pattern(pattern)
+        matches = [t for t in self.candidates(pattern, substring) if regex.match(t)]
+        if limit is not None and len(matches) > limit:
+            matches = heapq.nlargest(limit, matches, key=frequency) if frequency else matches[:limit]
+        return matches
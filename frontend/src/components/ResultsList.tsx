@@ -31,7 +31,7 @@ export default function ResultsList({ results }: { results: any[] }) {
         <div key={index} className="google-card">
 
           <Link
-            to={`/view/${item.filename}`}
+            to={`/view/${item.filename}${item.page ? `?page=${item.page}` : ""}`}
             className="google-title"
             target="_blank"
             rel="noopener noreferrer"
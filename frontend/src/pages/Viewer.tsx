@@ -1,10 +1,13 @@
 import { useEffect, useState } from "react";
-import { useParams, Link } from "react-router-dom";
+import { useParams, useSearchParams, Link } from "react-router-dom";
 import { getDocument, getRawFileUrl } from "../services/api";
 import "./Viewer.css";
 
 export default function Viewer() {
   const { filename } = useParams<{ filename: string }>();
+  // Page of the search hit (PDF results), opened directly in the viewer
+  const [searchParams] = useSearchParams();
+  const page = searchParams.get("page");
   const [doc, setDoc] = useState<any>(null);
   const [loading, setLoading] = useState(true);
 
@@ -59,7 +62,7 @@ export default function Viewer() {
 
       {/* PDF Viewer */}
       {isPDF && (
-        <iframe src={rawUrl} className="viewer-pdf"></iframe>
+        <iframe src={page ? `${rawUrl}#page=${page}` : rawUrl} className="viewer-pdf"></iframe>
       )}
     </div>
   );